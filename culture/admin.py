@@ -1,36 +1,37 @@
 from django.contrib import admin
+from session1.related import RelatedModelAdmin, RelatedTabularInline
 from .models import ExhibitAuthorMapping, ExhibitProxy, OrganizationProxy, ExhibitionProxy, OrderToCreateExhibition, OrderExhibitionFromAuthors, OrderExhibitionToExhibit, OrderToReturn
 
 
-class ExhibitAuthorMappingInline(admin.TabularInline):
+class ExhibitAuthorMappingInline(RelatedTabularInline):
     model = ExhibitAuthorMapping
     extra = 0
     readonly_fields = ['owner', 'order_to_create', 'order_to_get', 'order_to_provide', 'order_to_return']
 
 
 @admin.register(OrganizationProxy)
-class OrganizationAdmin(admin.ModelAdmin):
+class OrganizationAdmin(RelatedModelAdmin):
     pass
 
 @admin.register(ExhibitionProxy)
-class ExhibitionAdmin(admin.ModelAdmin):
+class ExhibitionAdmin(RelatedModelAdmin):
     pass
 
 @admin.register(OrderToCreateExhibition)
-class OrderToCreateExhibitionAdmin(admin.ModelAdmin):
+class OrderToCreateExhibitionAdmin(RelatedModelAdmin):
     inlines = [ExhibitAuthorMappingInline]
 
 @admin.register(OrderExhibitionFromAuthors)
-class OrderExhibitionFromAuthorsAdmin(admin.ModelAdmin):
+class OrderExhibitionFromAuthorsAdmin(RelatedModelAdmin):
     inlines = [ExhibitAuthorMappingInline]
 
 @admin.register(OrderExhibitionToExhibit)
-class OrderExhibitionToExhibitAdmin(admin.ModelAdmin):
+class OrderExhibitionToExhibitAdmin(RelatedModelAdmin):
     inlines = [ExhibitAuthorMappingInline]
 
 @admin.register(OrderToReturn)
-class OrderToReturnAdmin(admin.ModelAdmin):
+class OrderToReturnAdmin(RelatedModelAdmin):
     inlines = [ExhibitAuthorMappingInline]
 
 
-admin.site.register(ExhibitProxy)
+admin.site.register(ExhibitProxy, RelatedModelAdmin)
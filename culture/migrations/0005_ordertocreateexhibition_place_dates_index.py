@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 14:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('culture', '0004_alter_exhibitauthormapping_options'),
+        ('session1', '0011_event_space_date_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ordertocreateexhibition',
+            index=models.Index(fields=['place', 'date_start', 'date_end'], name='culture_order_place_dates_idx'),
+        ),
+    ]
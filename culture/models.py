@@ -2,6 +2,7 @@ from django.db import models
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from session1.models import Exhibits, ExhibitOwnerProxy, Organization, Exhibition, Prostranstvo
+from session1.occupancy import check_bookings, exhibition_bookings
 from django.core.exceptions import ValidationError
 from typing import Any, Type
 
@@ -68,6 +69,11 @@ class OrderToCreateExhibition(models.Model):
     class Meta:
         verbose_name = 'Приказ о проведении выставки'
         verbose_name_plural = 'Приказы о проведении выставок'
+        indexes = [
+            models.Index(fields=['place', 'date_start', 'date_end'], name='culture_order_place_dates_idx'),
+        ]
+
+    str_select_related = ('exhibition',)
 
     def __str__(self) -> str:
         """
@@ -77,6 +83,22 @@ class OrderToCreateExhibition(models.Model):
         """
         return f'Приказ о проведении ({self.date_created}, {self.exhibition})'
 
+    def clean(self) -> None:
+        """
+        Валидация данных приказа.
+
+        Проверяет, что выставка заканчивается не раньше начала и что пространство не занято
+        мероприятиями, студиями или другими выставками. Если выставка, пространство или даты
+        не заполнены, проверки пропускаются: об этом сообщает проверка полей.
+        """
+        if self.date_start is None or self.date_end is None:
+            return
+        if self.date_end < self.date_start:
+            raise ValidationError('Дата окончания выставки раньше даты начала')
+        if self.exhibition_id is None or self.place_id is None:
+            return
+        check_bookings(exhibition_bookings(self, self.exhibition.name))
+
 
 class OrderExhibitionFromAuthors(models.Model):
     """
@@ -89,6 +111,8 @@ class OrderExhibitionFromAuthors(models.Model):
     date_getting = models.DateTimeField('Дата получения экспонатов')
     creation_order = models.ForeignKey(OrderToCreateExhibition, verbose_name='Приказ о проведении выставки', on_delete=models.CASCADE)
 
+    str_select_related = ('creation_order__exhibition',)
+
     def __str__(self) -> str:
         """
         Строковое представление приказа о получении экспонатов.
@@ -122,6 +146,8 @@ class OrderExhibitionToExhibit(models.Model):
     date_to_provide = models.DateTimeField('Дата передачи')
     order_to_create_exhibit = models.ForeignKey(OrderToCreateExhibition, verbose_name='Приказ о проведении выставки', on_delete=models.CASCADE)
 
+    str_select_related = ('order_to_create_exhibit__exhibition',)
+
     def __str__(self) -> str:
         """
         Строковое представление акта передачи экспонатов.
@@ -179,6 +205,8 @@ class OrderToReturn(models.Model):
                 if not len(self.order_to_create.orderexhibitionfromauthors_set.all()):
                     raise ValidationError('Нет акта приема передачи')
     
+    str_select_related = ('order_to_create__exhibition',)
+
     def __str__(self) -> str:
         """
         Строковое представление акта возврата экспонатов.
@@ -1,4 +1,6 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from .models import (
@@ -11,7 +13,7 @@ from .models import (
     OrderToReturn,
     ExhibitAuthorMapping
 )
-from session1.models import Prostranstvo, Exhibits, Exhibition
+from session1.models import Prostranstvo, Exhibits, Exhibition, ExhibitOwnerProxy
 
 class OrganizationProxyTests(TestCase):
     def setUp(self):
@@ -58,6 +60,17 @@ class OrderToCreateExhibitionTests(TestCase):
         expected_str = f'Приказ о проведении ({self.order.date_created}, {self.exhibition})'
         self.assertEqual(str(self.order), expected_str)
 
+    def test_clean_without_exhibition_and_dates(self):
+        order = OrderToCreateExhibition(date_created=timezone.now(), place=self.prostranstvo)
+        with self.assertRaises(ValidationError) as context:
+            order.full_clean()
+        self.assertIn('exhibition', context.exception.message_dict)
+        self.assertIn('date_start', context.exception.message_dict)
+        order.date_start = order.date_end = timezone.now()
+        with self.assertRaises(ValidationError) as context:
+            order.full_clean()
+        self.assertEqual(list(context.exception.message_dict), ['exhibition'])
+
 class OrderExhibitionFromAuthorsTests(TestCase):
     def setUp(self):
         self.prostranstvo = Prostranstvo.objects.create(name="Тестовое Пространство")
@@ -200,3 +213,56 @@ class ExhibitAuthorMappingTests(TestCase):
         )
         with self.assertRaises(ValidationError):
             mapping.clean()
+
+
+class AdminQueryBudgetTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='admin'))
+        prostranstvo = Prostranstvo.objects.create(name="Тестовое Пространство")
+        for number in range(3):
+            self.organization = OrganizationProxy.objects.create(name=f"Организация {number}")
+            self.exhibition = ExhibitionProxy.objects.create(name=f"Выставка {number}", ex_type="Внешняя")
+            self.order_create = OrderToCreateExhibition.objects.create(
+                date_created=timezone.now(),
+                exhibition=self.exhibition,
+                date_start=timezone.now(),
+                date_end=timezone.now() + timezone.timedelta(days=10),
+                place=prostranstvo
+            )
+            for exhibit_number in range(3):
+                self.exhibit = Exhibits.objects.create(
+                    name=f"Экспонат {number}-{exhibit_number}",
+                    owner=ExhibitOwnerProxy.objects.get(org=self.organization)
+                )
+                ExhibitAuthorMapping.objects.create(exhibit=self.exhibit, order_to_create=self.order_create)
+            self.order_get = OrderExhibitionFromAuthors.objects.create(date_getting=timezone.now(), creation_order=self.order_create)
+            self.order_provide = OrderExhibitionToExhibit.objects.create(
+                date_to_provide=timezone.now(), order_to_create_exhibit=self.order_create
+            )
+            self.order_return = OrderToReturn.objects.create(date_return=timezone.now(), order_to_create=self.order_create)
+
+    def assertPageQueries(self, number, url):
+        with self.assertNumQueries(number):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_changelists(self):
+        for model, number in [
+            (OrganizationProxy, 5), (ExhibitionProxy, 5), (OrderToCreateExhibition, 5), (OrderExhibitionFromAuthors, 5),
+            (OrderExhibitionToExhibit, 5), (OrderToReturn, 5), (ExhibitProxy, 5)
+        ]:
+            with self.subTest(model=model.__name__):
+                self.assertPageQueries(number, reverse(f'admin:culture_{model._meta.model_name}_changelist'))
+
+    def test_change_forms(self):
+        for model, pk, number in [
+            (OrganizationProxy, self.organization.pk, 6),
+            (ExhibitionProxy, self.exhibition.pk, 6),
+            (OrderToCreateExhibition, self.order_create.pk, 10),
+            (OrderExhibitionFromAuthors, self.order_get.pk, 9),
+            (OrderExhibitionToExhibit, self.order_provide.pk, 9),
+            (OrderToReturn, self.order_return.pk, 9),
+            (ExhibitProxy, self.exhibit.pk, 7),
+        ]:
+            with self.subTest(model=model.__name__):
+                self.assertPageQueries(number, reverse(f'admin:culture_{model._meta.model_name}_change', args=[pk]))
@@ -1,30 +1,31 @@
 from django.contrib import admin
 from .models import ProstranstvoProxy, EventProxy, MoneyEventProxy, EventTypeProxy, LocationProxy
 from session1.models import Location, EventMoneyRelation
+from session1.related import RelatedModelAdmin, RelatedTabularInline
 
 
-class LocationInline(admin.TabularInline):
+class LocationInline(RelatedTabularInline):
     model = ProstranstvoProxy.location_set.through
     extra = 0
 
 
-class MoneyEventRelationInline(admin.TabularInline):
+class MoneyEventRelationInline(RelatedTabularInline):
     model = EventMoneyRelation
     extra = 0
 
 
 @admin.register(ProstranstvoProxy)
-class AdminProstranstvo(admin.ModelAdmin):
+class AdminProstranstvo(RelatedModelAdmin):
     inlines = [LocationInline]
     pass
 
 
 @admin.register(EventProxy)
-class EventProxyAdmin(admin.ModelAdmin):
+class EventProxyAdmin(RelatedModelAdmin):
     pass
 
-admin.site.register([EventTypeProxy, LocationProxy])
+admin.site.register([EventTypeProxy, LocationProxy], RelatedModelAdmin)
 
 @admin.register(MoneyEventProxy)
-class MoneyEventProxyAdmin(admin.ModelAdmin):
+class MoneyEventProxyAdmin(RelatedModelAdmin):
     inlines = [MoneyEventRelationInline]
\ No newline at end of file
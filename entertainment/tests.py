@@ -1,5 +1,8 @@
+from datetime import date, time
+from django.contrib.auth.models import User
 from django.test import TestCase
-from session1.models import Prostranstvo, Event, EventType, MoneyEvent, Location
+from django.urls import reverse
+from session1.models import Prostranstvo, Event, EventType, MoneyEvent, Location, EventMoneyRelation
 from .models import (
     ProstranstvoProxy,
     EventProxy,
@@ -93,3 +96,43 @@ class LocationProxyTest(TestCase):
         meta = LocationProxy._meta
         self.assertEqual(meta.verbose_name, "Локация")
         self.assertEqual(meta.verbose_name_plural, "Локации")
+
+
+class AdminQueryBudgetTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='admin'))
+        event_type = EventType.objects.create(name="Концерт")
+        for number in range(3):
+            self.prostranstvo = Prostranstvo.objects.create(name=f"Зал {number}", volume=100, loc=True)
+            self.event = Event.objects.create(
+                date=date(2030, 1, number + 1), name=f"Концерт {number}", type=event_type, time_started=time(18, 0),
+                time_end=time(21, 0), users_amount=10, spaces=self.prostranstvo, is_money=True
+            )
+            self.money_event = MoneyEvent.objects.create(event=self.event)
+            for _ in range(3):
+                self.location = Location.objects.create(type="Партер", row=2, amount=5)
+                self.location.space.add(self.prostranstvo)
+                EventMoneyRelation.objects.create(space=self.location, cost=500, money_event=self.money_event)
+
+    def assertPageQueries(self, number, url):
+        with self.assertNumQueries(number):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_changelists(self):
+        for model, number in [
+            (ProstranstvoProxy, 5), (EventProxy, 5), (EventTypeProxy, 5), (LocationProxy, 6), (MoneyEventProxy, 5)
+        ]:
+            with self.subTest(model=model.__name__):
+                self.assertPageQueries(number, reverse(f'admin:entertainment_{model._meta.model_name}_changelist'))
+
+    def test_change_forms(self):
+        for model, pk, number in [
+            (ProstranstvoProxy, self.prostranstvo.pk, 9),
+            (EventProxy, self.event.pk, 8),
+            (EventTypeProxy, self.event.type_id, 6),
+            (LocationProxy, self.location.pk, 8),
+            (MoneyEventProxy, self.money_event.pk, 11),
+        ]:
+            with self.subTest(model=model.__name__):
+                self.assertPageQueries(number, reverse(f'admin:entertainment_{model._meta.model_name}_change', args=[pk]))
@@ -1,3 +1,4 @@
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -112,6 +113,23 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'static'
 
+# Background file imports (session1.FileUpload)
+
+FILE_IMPORT_ASYNC = True
+FILE_IMPORT_WORKERS = 2
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Цены билетов и абонементов сбрасываются сигналами, поэтому кэш должен быть общим
+# для всех процессов сервера (LocMemCache у каждого процесса свой).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': Path(tempfile.gettempdir()) / 'nto-cache',
+    }
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -1,4 +1,9 @@
 from django.contrib import admin
 from .models import FileUpload
 
-admin.site.register(FileUpload)
\ No newline at end of file
+
+@admin.register(FileUpload)
+class FileUploadAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'file', 'status', 'rows_processed', 'rows_total', 'finished_at']
+    list_filter = ['status', 'type']
+    readonly_fields = ['status', 'rows_total', 'rows_processed', 'errors', 'started_at', 'finished_at']
@@ -0,0 +1,527 @@
+import csv
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Callable, Iterator, List, Optional, Tuple
+from xml.etree import ElementTree
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import OperationalError, connections, models, transaction
+from django.utils import timezone
+import pandas
+from openpyxl import load_workbook
+
+
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_WRITE_ATTEMPTS = 5
+IMPORT_ERRORS_LIMIT = 1000
+
+ODS_MIMETYPE = b'application/vnd.oasis.opendocument.spreadsheet'
+ODS_OFFICE = 'urn:oasis:names:tc:opendocument:xmlns:office:1.0'
+ODS_TABLE = 'urn:oasis:names:tc:opendocument:xmlns:table:1.0'
+ODS_TEXT = 'urn:oasis:names:tc:opendocument:xmlns:text:1.0'
+ODS_MAX_COLUMNS = 100
+
+XLS_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+_executor = None
+_executor_lock = Lock()
+
+
+def read_excel_rows(path: str) -> Iterator[list]:
+    """
+    Потоково читает строки Excel-файла (xlsx).
+
+    Книга открывается в режиме только для чтения, первая строка листа считается заголовком.
+
+    Args:
+        path (str): Путь к файлу.
+
+    Yields:
+        list: Строка листа.
+    """
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(min_row=2, values_only=True):
+            yield list(row)
+    finally:
+        workbook.close()
+
+
+def read_xls_rows(path: str) -> Iterator[list]:
+    """
+    Читает строки Excel-файла старого формата (xls) через pandas и xlrd.
+
+    xlrd не умеет читать лист потоково, поэтому лист загружается целиком одним вызовом
+    pandas.read_excel, а строки отдаются пачками по IMPORT_CHUNK_SIZE, чтобы не держать
+    в памяти второй копии листа в виде списков. Первая строка листа считается заголовком.
+
+    Args:
+        path (str): Путь к файлу.
+
+    Yields:
+        list: Строка листа.
+    """
+    frame = pandas.read_excel(path, engine='xlrd', header=None, skiprows=1, dtype=object)
+    for start in range(0, len(frame), IMPORT_CHUNK_SIZE):
+        chunk = frame.iloc[start:start + IMPORT_CHUNK_SIZE]
+        yield from chunk.where(chunk.notna(), None).values.tolist()
+
+
+def read_csv_rows(path: str) -> Iterator[list]:
+    """
+    Потоково читает строки CSV-файла модулем csv.
+
+    Разделитель (запятая, точка с запятой или табуляция) определяется по строке заголовка,
+    которая пропускается.
+
+    Args:
+        path (str): Путь к файлу.
+
+    Yields:
+        list: Строка файла.
+    """
+    with open(path, newline='', encoding='utf-8-sig') as file:
+        header = file.readline()
+        delimiter = max(',;\t', key=header.count)
+        reader = csv.reader(file, delimiter=delimiter)
+        for row in reader:
+            yield [value if value != '' else None for value in row]
+
+
+def read_parquet_rows(path: str, columns: int) -> Iterator[list]:
+    """
+    Потоково читает строки Parquet-файла через pyarrow.
+
+    Читаются только первые columns столбцов, остальные столбцы не распаковываются.
+
+    Args:
+        path (str): Путь к файлу.
+        columns (int): Количество читаемых столбцов.
+
+    Yields:
+        list: Строка файла.
+    """
+    try:
+        from pyarrow import parquet
+    except ImportError:
+        raise ValidationError('Для загрузки Parquet-файлов установите пакет pyarrow')
+    parquet_file = parquet.ParquetFile(path)
+    names = parquet_file.schema_arrow.names[:columns]
+    for batch in parquet_file.iter_batches(batch_size=IMPORT_CHUNK_SIZE, columns=names):
+        yield from map(list, zip(*(column.to_pylist() for column in batch.columns)))
+
+
+def _ods_cell_value(cell):
+    """
+    Возвращает значение ячейки ODS-таблицы.
+    """
+    value_type = cell.get(f'{{{ODS_OFFICE}}}value-type')
+    if value_type in ('float', 'percentage', 'currency'):
+        value = float(cell.get(f'{{{ODS_OFFICE}}}value'))
+        return int(value) if value.is_integer() else value
+    if value_type == 'boolean':
+        return cell.get(f'{{{ODS_OFFICE}}}boolean-value') == 'true'
+    if value_type == 'date':
+        return cell.get(f'{{{ODS_OFFICE}}}date-value')
+    if value_type is None:
+        return None
+    return '\n'.join(''.join(paragraph.itertext()) for paragraph in cell.iter(f'{{{ODS_TEXT}}}p'))
+
+
+def read_ods_rows(path: str) -> Iterator[list]:
+    """
+    Потоково читает строки первого листа ODS-файла.
+
+    content.xml разбирается через iterparse, обработанные строки сразу удаляются из дерева,
+    поэтому память не растет с размером файла. Первая строка считается заголовком.
+    Пустые строки внутри листа отдаются как пустые списки.
+
+    Args:
+        path (str): Путь к файлу.
+
+    Yields:
+        list: Строка листа.
+    """
+    with zipfile.ZipFile(path) as archive, archive.open('content.xml') as content:
+        header = True
+        empty = 0
+        for event, element in ElementTree.iterparse(content, events=('end',)):
+            if element.tag == f'{{{ODS_TABLE}}}table':
+                return
+            if element.tag != f'{{{ODS_TABLE}}}table-row':
+                continue
+            row = []
+            for cell in element:
+                repeat = int(cell.get(f'{{{ODS_TABLE}}}number-columns-repeated', 1))
+                row.extend([_ods_cell_value(cell)] * min(repeat, ODS_MAX_COLUMNS))
+            while row and row[-1] is None:
+                row.pop()
+            repeat = int(element.get(f'{{{ODS_TABLE}}}number-rows-repeated', 1))
+            element.clear()
+            if header:
+                header = False
+                continue
+            if not row:
+                empty += repeat
+                continue
+            # Пустые строки отдаются только перед заполненными, чтобы сохранить нумерацию строк;
+            # хвост из пустых строк до конца листа не читается.
+            for _ in range(empty):
+                yield []
+            empty = 0
+            for _ in range(repeat):
+                yield row
+
+
+def detect_format(path: str) -> str:
+    """
+    Определяет формат файла по сигнатуре и расширению.
+
+    Args:
+        path (str): Путь к файлу.
+
+    Returns:
+        str: Один из форматов 'xlsx', 'xls', 'ods', 'parquet', 'csv'.
+
+    Raises:
+        ValidationError: Если формат файла не поддерживается.
+    """
+    with open(path, 'rb') as file:
+        head = file.read(8)
+    if head[:4] == b'PAR1':
+        return 'parquet'
+    if head == XLS_SIGNATURE:
+        return 'xls'
+    if head[:4] == b'PK\x03\x04':
+        with zipfile.ZipFile(path) as archive:
+            names = set(archive.namelist())
+            if 'mimetype' in names and archive.read('mimetype').strip() == ODS_MIMETYPE:
+                return 'ods'
+            if 'xl/workbook.xml' in names:
+                return 'xlsx'
+    elif path.lower().endswith(('.csv', '.tsv', '.txt')) or b'\x00' not in head:
+        return 'csv'
+    raise ValidationError('Неподдерживаемый формат файла, загрузите xlsx, xls, ods, csv или parquet')
+
+
+def read_rows(path: str, columns: int) -> Iterator[Tuple[int, list]]:
+    """
+    Потоково читает строки файла любого поддерживаемого формата.
+
+    Пустые строки пропускаются, каждая строка обрезается либо дополняется до columns значений.
+    Строки нумеруются так же, как в таблице: первая строка данных идет под номером 2.
+
+    Args:
+        path (str): Путь к файлу.
+        columns (int): Количество столбцов, которые нужны модели.
+
+    Yields:
+        Tuple[int, list]: Номер строки и сама строка.
+    """
+    file_format = detect_format(path)
+    if file_format == 'parquet':
+        rows = read_parquet_rows(path, columns)
+    else:
+        rows = {
+            'xlsx': read_excel_rows,
+            'xls': read_xls_rows,
+            'ods': read_ods_rows,
+            'csv': read_csv_rows
+        }[file_format](path)
+    for number, row in enumerate(rows, start=2):
+        if all(value is None for value in row):
+            continue
+        yield number, (row + [None] * columns)[:columns]
+
+
+def read_chunks(path: str, columns: int, chunk_size: int = IMPORT_CHUNK_SIZE) -> Iterator[Tuple[List[int], List[list]]]:
+    """
+    Потоково читает файл и возвращает строки пачками.
+
+    В памяти находится не больше одной пачки строк.
+
+    Args:
+        path (str): Путь к файлу.
+        columns (int): Количество столбцов, которые нужны модели.
+        chunk_size (int): Количество строк в пачке.
+
+    Yields:
+        Tuple[List[int], List[list]]: Номера строк пачки и сами строки.
+    """
+    numbers, chunk = [], []
+    for number, row in read_rows(path, columns):
+        numbers.append(number)
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield numbers, chunk
+            numbers, chunk = [], []
+    if chunk:
+        yield numbers, chunk
+
+
+def upload_field(model, name: str) -> models.Field:
+    """
+    Возвращает поле модели, в которое попадает столбец файла.
+
+    Args:
+        model: Модель из type_mappings.
+        name (str): Имя поля, для связанных моделей - путь через '__' (например 'owner__studio__name').
+
+    Returns:
+        models.Field: Поле модели.
+    """
+    *relations, name = name.split('__')
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    return model._meta.get_field(name)
+
+
+def validate_chunk(model, numbers: List[int], chunk: List[list], seen: Optional[dict] = None) -> Tuple[List[list], List[Tuple[int, str]]]:
+    """
+    Проверяет и приводит к типам полей модели пачку строк.
+
+    Проверки выполняются над столбцами DataFrame целиком: заполненность обязательных полей,
+    приведение чисел, неотрицательность, длина строк (max_length) и повторы строк в файле.
+    Пустые значения полей со значением по умолчанию заменяются этим значением.
+
+    Args:
+        model: Модель из type_mappings с атрибутом upload_fields.
+        numbers (List[int]): Номера строк пачки.
+        chunk (List[list]): Строки пачки.
+        seen (Optional[dict]): Ключи уже проверенных строк файла {ключ: номер строки};
+            дополняется ключами пачки. Если не передан, повторы не проверяются.
+
+    Returns:
+        Tuple[List[list], List[Tuple[int, str]]]: Приведенные строки без ошибок и список ошибок (номер строки, текст).
+    """
+    names = model.upload_fields
+    fields = [upload_field(model, name) for name in names]
+    frame = pandas.DataFrame(chunk, index=numbers, columns=range(len(fields)), dtype=object)
+    problems = []
+    for column, field in enumerate(fields):
+        missing = frame[column].isna()
+        text = frame[column].where(~missing, '').astype(str).str.strip()
+        missing |= text == ''
+        if isinstance(field, models.IntegerField):
+            values = pandas.to_numeric(text.where(~missing), errors='coerce')
+            invalid = ~missing & (values.isna() | (values % 1 != 0))
+            if isinstance(field, (models.PositiveIntegerField, models.PositiveSmallIntegerField, models.PositiveBigIntegerField)):
+                invalid |= values < 0
+            problems.append((invalid, f'Поле «{field.verbose_name}» должно быть целым неотрицательным числом'))
+            values = values.astype(object).where(~missing & ~invalid, None).map(lambda value: value if value is None else int(value))
+        else:
+            values = text.where(~missing, None)
+            if field.max_length:
+                problems.append((
+                    text.str.len() > field.max_length,
+                    f'Поле «{field.verbose_name}» длиннее {field.max_length} символов'
+                ))
+        if field.has_default():
+            values = values.where(~missing, field.get_default())
+        elif not field.blank:
+            problems.append((missing, f'Не заполнено поле «{field.verbose_name}»'))
+        frame[column] = values
+
+    errors = [(number, message) for invalid, message in problems for number in frame.index[invalid]]
+    if seen is not None:
+        unique = [column for column, field in enumerate(fields) if field.unique and '__' not in names[column]]
+        keys = pandas.Series(list(map(tuple, frame[unique or list(frame.columns)].values.tolist())), index=frame.index)
+        repeated = keys.duplicated() | keys.map(seen.__contains__).astype(bool)
+        for number, key in keys[~repeated].items():
+            seen[key] = number
+        errors.extend((number, f'Строка повторяет строку {seen[key]}') for number, key in keys[repeated].items())
+    invalid_rows = {number for number, _ in errors}
+    rows = [row for number, row in zip(frame.index, frame.values.tolist()) if number not in invalid_rows]
+    return rows, sorted(errors)
+
+
+def format_errors(errors: List[Tuple[int, str]], limit: int = IMPORT_ERRORS_LIMIT) -> str:
+    """
+    Формирует текстовый отчет об ошибках по строкам.
+
+    Args:
+        errors (List[Tuple[int, str]]): Ошибки (номер строки, текст).
+        limit (int): Максимальное количество выводимых ошибок.
+
+    Returns:
+        str: Отчет, по одной ошибке в строке.
+    """
+    lines = [f'Строка {number}: {message}' for number, message in errors[:limit]]
+    if len(errors) > limit:
+        lines.append(f'... и еще {len(errors) - limit} ошибок')
+    return '\n'.join(lines)
+
+
+def count_rows(path: str) -> Optional[int]:
+    """
+    Возвращает количество строк данных в файле, если его можно узнать без чтения всего файла.
+
+    Для xlsx используется размер листа, для Parquet - метаданные файла.
+
+    Args:
+        path (str): Путь к файлу.
+
+    Returns:
+        Optional[int]: Количество строк без заголовка либо None, если оно заранее неизвестно.
+    """
+    file_format = detect_format(path)
+    if file_format == 'xlsx':
+        workbook = load_workbook(path, read_only=True)
+        try:
+            max_row = workbook.active.max_row
+        finally:
+            workbook.close()
+        return max_row - 1 if max_row else None
+    if file_format == 'parquet':
+        try:
+            from pyarrow import parquet
+        except ImportError:
+            return None
+        return parquet.ParquetFile(path).metadata.num_rows
+    return None
+
+
+def validate_file(path: str, model, progress: Optional[Callable[[int], None]] = None) -> List[Tuple[int, str]]:
+    """
+    Проверяет весь файл до записи в базу.
+
+    Args:
+        path (str): Путь к файлу.
+        model: Модель из type_mappings.
+        progress (Optional[Callable[[int], None]]): Функция, получающая количество проверенных строк.
+
+    Returns:
+        List[Tuple[int, str]]: Ошибки (номер строки, текст).
+    """
+    errors = []
+    seen = dict()
+    processed = 0
+    for numbers, chunk in read_chunks(path, len(model.upload_fields)):
+        errors.extend(validate_chunk(model, numbers, chunk, seen)[1])
+        processed += len(chunk)
+        if progress:
+            progress(processed)
+    return errors
+
+
+def write_file(path: str, model) -> int:
+    """
+    Записывает проверенный файл в базу одной транзакцией.
+
+    Если база занята другой загрузкой (SQLite блокирует файл целиком), транзакция повторяется
+    с нарастающей паузой.
+
+    Args:
+        path (str): Путь к файлу.
+        model: Модель из type_mappings с методом upload_chunk.
+
+    Returns:
+        int: Количество записанных строк.
+    """
+    for attempt in range(IMPORT_WRITE_ATTEMPTS):
+        try:
+            rows = 0
+            with transaction.atomic():
+                for numbers, chunk in read_chunks(path, len(model.upload_fields)):
+                    model.upload_chunk(validate_chunk(model, numbers, chunk)[0])
+                    rows += len(chunk)
+            return rows
+        except OperationalError:
+            if attempt == IMPORT_WRITE_ATTEMPTS - 1:
+                raise
+            time.sleep(0.1 * (attempt + 1))
+
+
+def import_file(path: str, model) -> int:
+    """
+    Проверяет файл и загружает его в модель: либо весь файл целиком, либо ничего.
+
+    Args:
+        path (str): Путь к файлу.
+        model: Модель из type_mappings с методом upload_chunk.
+
+    Returns:
+        int: Количество загруженных строк.
+
+    Raises:
+        ValidationError: Если в файле есть ошибки; сообщение содержит отчет по строкам.
+    """
+    errors = validate_file(path, model)
+    if errors:
+        raise ValidationError(format_errors(errors))
+    return write_file(path, model)
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Возвращает пул потоков для фоновой загрузки файлов.
+
+    Размер пула задается настройкой FILE_IMPORT_WORKERS.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'FILE_IMPORT_WORKERS', 2),
+                thread_name_prefix='file-import'
+            )
+        return _executor
+
+
+def schedule_import(upload_id: int) -> None:
+    """
+    Ставит загрузку файла в очередь.
+
+    При FILE_IMPORT_ASYNC = False загрузка выполняется сразу в текущем потоке.
+
+    Args:
+        upload_id (int): Идентификатор FileUpload.
+    """
+    if getattr(settings, 'FILE_IMPORT_ASYNC', True):
+        get_executor().submit(run_import, upload_id, True)
+    else:
+        run_import(upload_id)
+
+
+def run_import(upload_id: int, close_connection: bool = False) -> None:
+    """
+    Выполняет загрузку файла и сохраняет ее ход в FileUpload.
+
+    Загрузка начинается, только если файл еще ожидает обработки, поэтому один файл
+    не загружается дважды. Сначала весь файл проверяется (rows_processed показывает
+    количество проверенных строк); при ошибках в errors записывается отчет по строкам
+    и в базу ничего не пишется. Иначе файл записывается одной транзакцией.
+
+    Args:
+        upload_id (int): Идентификатор FileUpload.
+        close_connection (bool): Закрыть соединение с базой после загрузки (для фоновых потоков).
+    """
+    from .models import FileUpload, type_mappings
+
+    uploads = FileUpload.objects.filter(pk=upload_id)
+    try:
+        if not uploads.filter(status=FileUpload.PENDING).update(status=FileUpload.RUNNING, started_at=timezone.now()):
+            return
+        upload = uploads.get()
+        try:
+            uploads.update(rows_total=count_rows(upload.file.path))
+            model = type_mappings[upload.type]
+            errors = format_errors(validate_file(
+                upload.file.path,
+                model,
+                progress=lambda processed: uploads.update(rows_processed=processed)
+            ))
+            if not errors:
+                write_file(upload.file.path, model)
+        except Exception as e:
+            errors = str(e)
+        uploads.update(
+            status=FileUpload.FAILED if errors else FileUpload.DONE,
+            errors=errors,
+            finished_at=timezone.now()
+        )
+    finally:
+        if close_connection:
+            connections.close_all()
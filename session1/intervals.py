@@ -0,0 +1,93 @@
+from typing import Any, Iterable, List, Tuple
+
+
+class IntervalTree:
+    """
+    Статическое центрированное дерево отрезков для поиска пересечений.
+
+    Дерево строится один раз по набору закрытых отрезков [start, end] и отвечает на запрос
+    "какие отрезки пересекаются с [start, end]" за O(log n + k), где k - размер ответа.
+    Подходит для любых сравнимых границ: дат, времени, чисел.
+
+    Атрибуты:
+        center: Точка разбиения узла.
+        by_start (list): Отрезки, содержащие center, по возрастанию начала.
+        by_end (list): Те же отрезки по убыванию конца.
+        left (IntervalTree): Отрезки, целиком лежащие левее center.
+        right (IntervalTree): Отрезки, целиком лежащие правее center.
+    """
+    def __init__(self, intervals: Iterable[Tuple[Any, Any, Any]]):
+        """
+        Строит дерево.
+
+        Args:
+            intervals (Iterable[Tuple[Any, Any, Any]]): Отрезки (начало, конец, значение).
+        """
+        intervals = list(intervals)
+        self.center = None
+        self.by_start = []
+        self.by_end = []
+        self.left = self.right = None
+        if not intervals:
+            return
+        starts = sorted(start for start, _, _ in intervals)
+        self.center = starts[len(starts) // 2]
+        left, right = [], []
+        for interval in intervals:
+            if interval[1] < self.center:
+                left.append(interval)
+            elif interval[0] > self.center:
+                right.append(interval)
+            else:
+                self.by_start.append(interval)
+        self.by_end = sorted(self.by_start, key=lambda interval: interval[1], reverse=True)
+        self.by_start.sort(key=lambda interval: interval[0])
+        if left:
+            self.left = IntervalTree(left)
+        if right:
+            self.right = IntervalTree(right)
+
+    def __len__(self) -> int:
+        """
+        Количество отрезков в дереве.
+        """
+        return len(self.by_start) + (len(self.left) if self.left is not None else 0) + (len(self.right) if self.right is not None else 0)
+
+    def overlap(self, start, end) -> List[Any]:
+        """
+        Ищет отрезки, пересекающиеся с [start, end] (границы включаются).
+
+        Args:
+            start: Начало отрезка запроса.
+            end: Конец отрезка запроса.
+
+        Returns:
+            List[Any]: Значения найденных отрезков.
+        """
+        found = []
+        nodes = [self]
+        while nodes:
+            node = nodes.pop()
+            if node.center is None:
+                continue
+            if end < node.center:
+                for interval in node.by_start:
+                    if interval[0] > end:
+                        break
+                    found.append(interval[2])
+                if node.left is not None:
+                    nodes.append(node.left)
+            elif start > node.center:
+                for interval in node.by_end:
+                    if interval[1] < start:
+                        break
+                    found.append(interval[2])
+                if node.right is not None:
+                    nodes.append(node.right)
+            else:
+                found.extend(interval[2] for interval in node.by_start)
+                if node.left is not None:
+                    nodes.append(node.left)
+                if node.right is not None:
+                    nodes.append(node.right)
+        return found
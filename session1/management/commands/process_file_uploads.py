@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from session1.imports import run_import
+from session1.models import FileUpload
+
+
+class Command(BaseCommand):
+    """
+    Команда для загрузки файлов, оставшихся в очереди.
+
+    Нужна, если процесс сервера был остановлен до того, как фоновые потоки обработали файлы.
+    """
+    help = 'Загружает файлы FileUpload, ожидающие обработки'
+
+    def handle(self, *args, **options):
+        for upload_id in FileUpload.objects.filter(status=FileUpload.PENDING).order_by('id').values_list('id', flat=True):
+            run_import(upload_id)
+            upload = FileUpload.objects.get(pk=upload_id)
+            self.stdout.write(f'{upload}: {upload.status}, обработано строк: {upload.rows_processed}')
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.3 on 2026-10-18 13:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session1', '0008_alter_exhibitownerproxy_options'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exhibits',
+            name='name',
+            field=models.CharField(db_index=True, max_length=200, verbose_name='Наименование'),
+        ),
+        migrations.AlterField(
+            model_name='prostranstvo',
+            name='name',
+            field=models.CharField(db_index=True, max_length=200, verbose_name='Наименование'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.3 on 2026-10-18 13:58
+
+from django.db import migrations, models
+
+
+def mark_existing_done(apps, schema_editor):
+    FileUpload = apps.get_model('session1', 'FileUpload')
+    FileUpload.objects.update(status='Готово')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session1', '0009_import_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileupload',
+            name='errors',
+            field=models.TextField(blank=True, default='', verbose_name='Ошибки'),
+        ),
+        migrations.AddField(
+            model_name='fileupload',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Окончание загрузки'),
+        ),
+        migrations.AddField(
+            model_name='fileupload',
+            name='rows_processed',
+            field=models.PositiveIntegerField(default=0, verbose_name='Обработано строк'),
+        ),
+        migrations.AddField(
+            model_name='fileupload',
+            name='rows_total',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Всего строк'),
+        ),
+        migrations.AddField(
+            model_name='fileupload',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Начало загрузки'),
+        ),
+        migrations.AddField(
+            model_name='fileupload',
+            name='status',
+            field=models.CharField(choices=[('Ожидает', 'Ожидает'), ('Выполняется', 'Выполняется'), ('Готово', 'Готово'), ('Ошибка', 'Ошибка')], db_index=True, default='Ожидает', max_length=20, verbose_name='Состояние'),
+        ),
+        migrations.RunPython(mark_existing_done, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.3 on 2026-10-18 14:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session1', '0010_fileupload_progress'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['spaces', 'date'], name='session1_event_space_date_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.3 on 2026-10-18 14:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session1', '0011_event_space_date_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='eventmoneyrelation',
+            index=models.Index(fields=['money_event', 'space'], name='session1_price_event_space_idx'),
+        ),
+    ]
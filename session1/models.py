@@ -1,9 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from django.db.models.signals import post_save, m2m_changed
 from django.dispatch import receiver
-import pandas
 from django.core.exceptions import ValidationError
-from typing import Any, Type
+from typing import Any, List, Type
+from .imports import schedule_import
+from .occupancy import check_bookings, event_bookings
 
 
 types = []
@@ -34,6 +35,8 @@ class Location(models.Model):
         """
         return self.row * self.amount
 
+    str_prefetch_related = ('space',)
+
     def __str__(self) -> str:
         """
         Строковое представление локации.
@@ -71,7 +74,7 @@ class Prostranstvo(models.Model):
         description (TextField): Описание пространства.
         loc (BooleanField): Наличие локаций в пространстве.
     """
-    name = models.CharField('Наименование', max_length=200)
+    name = models.CharField('Наименование', max_length=200, db_index=True)
     volume = models.PositiveIntegerField('Вместимость', default=1)
     description = models.TextField('Описание', default='')
     loc = models.BooleanField(default=False, verbose_name='Есть ли локации?')
@@ -112,6 +115,8 @@ class Prostranstvo(models.Model):
         """
         return self.name
     
+    upload_fields = ('name', 'volume', 'description')
+
     @staticmethod
     def upload_excel(value: list) -> None:
         """
@@ -120,10 +125,31 @@ class Prostranstvo(models.Model):
         Args:
             value (list): Список значений для создания или получения пространства.
         """
-        try:
-            Prostranstvo.objects.get(name=value[0], volume=value[1], description=value[2])
-        except Prostranstvo.DoesNotExist:
-            Prostranstvo.objects.create(name=value[0], volume=value[1], description=value[2])
+        Prostranstvo.upload_chunk([value])
+
+    @staticmethod
+    def upload_chunk(values: List[list]) -> None:
+        """
+        Статический метод для загрузки пачки строк из загружаемого файла.
+
+        Повторяющиеся строки отбрасываются, существующие пространства ищутся одним запросом,
+        новые создаются одним bulk_create.
+
+        Args:
+            values (List[list]): Строки вида [наименование, вместимость, описание].
+        """
+        rows = dict.fromkeys(
+            (str(value[0]), int(value[1]), '' if value[2] is None else str(value[2]))
+            for value in values
+        )
+        existing = set(
+            Prostranstvo.objects.filter(name__in={name for name, _, _ in rows})
+            .values_list('name', 'volume', 'description')
+        )
+        Prostranstvo.objects.bulk_create([
+            Prostranstvo(name=name, volume=volume, description=description)
+            for name, volume, description in rows if (name, volume, description) not in existing
+        ])
 
 
 class Event(models.Model):
@@ -151,16 +177,29 @@ class Event(models.Model):
     is_money = models.BooleanField('Платно?', default=False)
     description = models.TextField(default='', verbose_name='Описание')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['spaces', 'date'], name='session1_event_space_date_idx'),
+        ]
+
     def clean(self) -> None:
         """
         Валидация данных мероприятия.
 
-        Проверяет вместимость пространства и корректность времени проведения.
+        Проверяет вместимость пространства, корректность времени проведения
+        и то, что пространство не занято другим мероприятием, студией или выставкой.
+        Если дата, время, пространство или количество посетителей не заполнены, проверки
+        пропускаются: об этом сообщает проверка полей.
         """
+        if None in (self.date, self.time_started, self.time_end, self.spaces_id, self.users_amount):
+            return
         if self.spaces.volume < self.users_amount:
             raise ValidationError('В этом пространстве не хватает мест, выберите другое')
         if self.time_started > self.time_end:
             raise ValidationError('Время начало позже времени конца')
+        check_bookings(event_bookings(self))
+
+    str_select_related = ('spaces',)
 
     def __str__(self) -> str:
         """
@@ -183,6 +222,8 @@ class MoneyEvent(models.Model):
     """
     event = models.ForeignKey(Event, on_delete=models.CASCADE, verbose_name='Мероприятие')
 
+    str_select_related = ('event__spaces',)
+
     def __str__(self) -> str:
         """
         Строковое представление платного мероприятия.
@@ -228,6 +269,14 @@ class EventMoneyRelation(models.Model):
     cost = models.PositiveIntegerField('Цена за место')
     money_event = models.ForeignKey(MoneyEvent, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['money_event', 'space'], name='session1_price_event_space_idx'),
+        ]
+
+    str_select_related = ('space',)
+    str_prefetch_related = ('space__space',)
+
     def __str__(self) -> str:
         """
         Строковое представление связи мероприятия с локацией.
@@ -258,6 +307,8 @@ class Studio(models.Model):
         verbose_name = 'Студия'
         verbose_name_plural = 'Студии'
     
+    upload_fields = ('name', 'description')
+
     @staticmethod
     def upload_excel(value: list) -> None:
         """
@@ -266,10 +317,43 @@ class Studio(models.Model):
         Args:
             value (list): Список значений для создания или получения студии.
         """
-        try:
-            Studio.objects.get(name=value[0], description=value[1])
-        except Studio.DoesNotExist:
-            Studio.objects.create(name=value[0], description=value[1])
+        Studio.upload_chunk([value])
+
+    @staticmethod
+    def upload_chunk(values: List[list]) -> None:
+        """
+        Статический метод для загрузки пачки строк студий из загружаемого файла.
+
+        Существующие студии ищутся одним запросом по названию, новые создаются одним bulk_create
+        вместе с их записями ExhibitOwnerProxy.
+
+        Args:
+            values (List[list]): Строки вида [наименование, описание].
+        """
+        rows = dict()
+        for value in values:
+            rows.setdefault(str(value[0]), '' if value[1] is None else str(value[1]))
+        Studio.create_missing(rows)
+
+    @staticmethod
+    def create_missing(rows: dict) -> dict:
+        """
+        Создает студии, которых еще нет в базе.
+
+        Args:
+            rows (dict): Словарь {наименование: описание}.
+
+        Returns:
+            dict: Словарь {наименование: Studio} для всех переданных студий.
+        """
+        studios = {studio.name: studio for studio in Studio.objects.filter(name__in=rows.keys())}
+        created = Studio.objects.bulk_create([
+            Studio(name=name, description=description)
+            for name, description in rows.items() if name not in studios
+        ])
+        ExhibitOwnerProxy.objects.bulk_create([ExhibitOwnerProxy(studio=studio) for studio in created])
+        studios.update((studio.name, studio) for studio in created)
+        return studios
     
     def __str__(self) -> str:
         """
@@ -291,6 +375,8 @@ class ProstrSutdioMapping(models.Model):
     studio = models.ForeignKey(Studio, on_delete=models.CASCADE, null=True)
     prostr = models.ForeignKey(Prostranstvo, on_delete=models.CASCADE, null=True)
 
+    str_select_related = ('studio', 'prostr')
+
     def __str__(self) -> str:
         """
         Строковое представление связи студии с пространством.
@@ -320,6 +406,8 @@ class Teacher(models.Model):
         """
         return self.full_name
     
+    upload_fields = ('full_name',)
+
     @staticmethod
     def upload_excel(value: list) -> None:
         """
@@ -328,10 +416,19 @@ class Teacher(models.Model):
         Args:
             value (list): Список значений для создания или получения преподавателя.
         """
-        try:
-            Teacher.objects.get(full_name=value[0])
-        except Teacher.DoesNotExist:
-            Teacher.objects.create(full_name=value[0])
+        Teacher.upload_chunk([value])
+
+    @staticmethod
+    def upload_chunk(values: List[list]) -> None:
+        """
+        Статический метод для загрузки пачки строк преподавателей из загружаемого файла.
+
+        Args:
+            values (List[list]): Строки вида [ФИО].
+        """
+        names = dict.fromkeys(str(value[0]) for value in values)
+        existing = set(Teacher.objects.filter(full_name__in=names).values_list('full_name', flat=True))
+        Teacher.objects.bulk_create([Teacher(full_name=name) for name in names if name not in existing])
 
 
 class Exhibition(models.Model):
@@ -390,6 +487,8 @@ class ExhibitOwnerProxy(models.Model):
     org = models.ForeignKey(Organization, on_delete=models.CASCADE, null=True)
     studio = models.ForeignKey(Studio, on_delete=models.CASCADE, null=True)
 
+    str_select_related = ('org', 'studio')
+
     def __str__(self) -> str:
         """
         Строковое представление владельца экспоната.
@@ -414,9 +513,11 @@ class Exhibits(models.Model):
         name (CharField): Наименование экспоната.
         owner (ForeignKey): Связь с моделью ExhibitOwnerProxy.
     """
-    name = models.CharField('Наименование', max_length=200)
+    name = models.CharField('Наименование', max_length=200, db_index=True)
     owner = models.ForeignKey(ExhibitOwnerProxy, verbose_name='Владелец', on_delete=models.CASCADE)
 
+    upload_fields = ('name', 'owner__studio__name')
+
     @staticmethod
     def upload_excel(value: list) -> None:
         """
@@ -425,11 +526,37 @@ class Exhibits(models.Model):
         Args:
             value (list): Список значений для создания или получения экспоната.
         """
-        own, _ = Studio.objects.get_or_create(name=value[1])
-        try:
-            Exhibits.objects.get(name=value[0], owner=own)
-        except Exhibits.DoesNotExist:
-            Exhibits.objects.create(name=value[0], owner=own)
+        Exhibits.upload_chunk([value])
+
+    @staticmethod
+    def upload_chunk(values: List[list]) -> None:
+        """
+        Статический метод для загрузки пачки строк экспонатов из загружаемого файла.
+
+        Владельцем экспоната становится студия из второго столбца, отсутствующие студии создаются.
+
+        Args:
+            values (List[list]): Строки вида [наименование, студия-владелец].
+        """
+        rows = dict.fromkeys((str(value[0]), str(value[1])) for value in values)
+        studios = Studio.create_missing(dict.fromkeys((studio for _, studio in rows), ''))
+        owners = dict()
+        for owner in ExhibitOwnerProxy.objects.filter(studio__in=studios.values()).order_by('-id'):
+            owners.setdefault(owner.studio_id, owner.id)
+        owners.update(
+            (owner.studio_id, owner.id)
+            for owner in ExhibitOwnerProxy.objects.bulk_create([
+                ExhibitOwnerProxy(studio=studio) for studio in studios.values() if studio.id not in owners
+            ])
+        )
+        existing = set(
+            Exhibits.objects.filter(name__in={name for name, _ in rows}, owner__in=owners.values())
+            .values_list('name', 'owner')
+        )
+        Exhibits.objects.bulk_create([
+            Exhibits(name=name, owner_id=owners[studios[studio].id])
+            for name, studio in rows if (name, owners[studios[studio].id]) not in existing
+        ])
     
     def __str__(self) -> str:
         """
@@ -444,14 +571,35 @@ class FileUpload(models.Model):
     """
     Модель для хранения загруженных файлов.
 
+    Файл загружается в фоновом потоке, ход загрузки сохраняется в полях модели.
+
     Атрибуты:
         type (CharField): Тип файла (Пространство, Экспонат, Студия, Преподаватель).
         file (FileField): Сам файл.
-    """
+        status (CharField): Состояние загрузки.
+        rows_total (PositiveIntegerField): Количество строк в файле, если оно известно заранее.
+        rows_processed (PositiveIntegerField): Количество обработанных строк.
+        errors (TextField): Ошибки загрузки.
+        started_at (DateTimeField): Время начала загрузки.
+        finished_at (DateTimeField): Время окончания загрузки.
+    """
+    PENDING = 'Ожидает'
+    RUNNING = 'Выполняется'
+    DONE = 'Готово'
+    FAILED = 'Ошибка'
+
     type = models.CharField(
         choices=[('Пространство', 'Пространство'), ('Экспонат', 'Экспонат'), ('Студия', 'Студия'), ('Преподаватель', 'Преподаватель')],
         max_length=200, verbose_name='Тип файла')
     file = models.FileField('Файл')
+    status = models.CharField(
+        choices=[(PENDING, PENDING), (RUNNING, RUNNING), (DONE, DONE), (FAILED, FAILED)],
+        max_length=20, default=PENDING, verbose_name='Состояние', db_index=True)
+    rows_total = models.PositiveIntegerField('Всего строк', null=True, blank=True)
+    rows_processed = models.PositiveIntegerField('Обработано строк', default=0)
+    errors = models.TextField('Ошибки', default='', blank=True)
+    started_at = models.DateTimeField('Начало загрузки', null=True, blank=True)
+    finished_at = models.DateTimeField('Окончание загрузки', null=True, blank=True)
 
     def __str__(self) -> str:
         """
@@ -479,7 +627,8 @@ def upload_file(sender: Type[FileUpload], instance: FileUpload, created: bool, *
     """
     Сигнал для обработки загруженных файлов после их сохранения.
 
-    Читает данные из Excel и загружает их в соответствующие модели.
+    Ставит загрузку в очередь фоновых задач после фиксации транзакции,
+    поэтому запрос в админ-панели не ждет окончания загрузки.
 
     Args:
         sender (Type[FileUpload]): Отправитель сигнала.
@@ -487,11 +636,9 @@ def upload_file(sender: Type[FileUpload], instance: FileUpload, created: bool, *
         created (bool): Флаг создания.
         **kwargs (Any): Дополнительные аргументы.
     """
-    df = pandas.read_excel(instance.file.path)
     if not created:
         return
-    for val in df.values.tolist():
-        type_mappings[instance.type].upload_excel(val)
+    transaction.on_commit(lambda: schedule_import(instance.pk))
 
 
 @receiver(post_save, sender=Organization)
@@ -0,0 +1,365 @@
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from .intervals import IntervalTree
+
+
+ALL_WEEKDAYS = 0b1111111
+WEEKDAYS = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье']
+CONFLICTS_IN_MESSAGE = 3
+
+
+class Booking(NamedTuple):
+    """
+    Занятость пространства: в период с date_start по date_end в дни недели weekdays
+    с time_start до time_end.
+
+    Атрибуты:
+        kind (str): Источник занятости: 'event', 'studio' или 'exhibition'.
+        pk (Optional[int]): Идентификатор мероприятия, приказа о работе студии или приказа о выставке.
+        space_id (int): Идентификатор пространства.
+        date_start (date): Первый день.
+        date_end (date): Последний день.
+        weekdays (int): Битовая маска дней недели (понедельник - младший бит).
+        time_start (time): Время начала.
+        time_end (time): Время окончания.
+        title (str): Описание для сообщений об ошибках.
+    """
+    kind: str
+    pk: Optional[int]
+    space_id: int
+    date_start: date
+    date_end: date
+    weekdays: int
+    time_start: time
+    time_end: time
+    title: str
+
+    def overlaps(self, other: 'Booking') -> bool:
+        """
+        Проверяет, пересекается ли занятость с другой по датам, дням недели и времени.
+
+        Время сравнивается строго, поэтому занятия встык не пересекаются.
+        """
+        if self.time_start >= other.time_end or other.time_start >= self.time_end:
+            return False
+        start = max(self.date_start, other.date_start)
+        end = min(self.date_end, other.date_end)
+        return start <= end and bool(self.weekdays & other.weekdays & weekdays_between(start, end))
+
+
+def weekdays_between(date_start: date, date_end: date) -> int:
+    """
+    Возвращает маску дней недели, которые встречаются в периоде.
+
+    Args:
+        date_start (date): Начало периода.
+        date_end (date): Конец периода.
+
+    Returns:
+        int: Битовая маска дней недели.
+    """
+    if (date_end - date_start).days >= 6:
+        return ALL_WEEKDAYS
+    mask = 0
+    day = date_start
+    while day <= date_end:
+        mask |= 1 << day.weekday()
+        day += timedelta(days=1)
+    return mask
+
+
+def weekdays_mask(names: Iterable[str]) -> int:
+    """
+    Переводит названия дней недели в битовую маску (понедельник - младший бит).
+
+    Args:
+        names (Iterable[str]): Названия дней недели.
+
+    Returns:
+        int: Битовая маска дней.
+    """
+    mask = 0
+    for name in names:
+        mask |= 1 << WEEKDAYS.index(name)
+    return mask
+
+
+def masks_with_weekday(weekday: int) -> List[int]:
+    """
+    Возвращает все маски дней недели, в которые входит указанный день.
+
+    Масок всего 128, поэтому условие "день входит в маску" записывается как weekdays__in
+    и использует индекс.
+
+    Args:
+        weekday (int): Номер дня недели (0 - понедельник, как date.weekday()).
+
+    Returns:
+        List[int]: Подходящие маски.
+    """
+    return [mask for mask in range(1 << len(WEEKDAYS)) if mask & (1 << weekday)]
+
+
+def event_bookings(event) -> List[Booking]:
+    """
+    Занятость пространства мероприятием.
+
+    Args:
+        event (Event): Мероприятие.
+
+    Returns:
+        List[Booking]: Занятость (пустой список, если пространство не выбрано).
+    """
+    if event.spaces_id is None:
+        return []
+    return [Booking(
+        'event', event.pk, event.spaces_id, event.date, event.date, ALL_WEEKDAYS,
+        event.time_started, event.time_end, f'мероприятие «{event.name}»'
+    )]
+
+
+def studio_bookings(report, space_ids: Iterable[int], day_names: Optional[Iterable[str]], studio_name: str = '') -> List[Booking]:
+    """
+    Занятость пространств студии по приказу о ее работе.
+
+    Маска рабочих дней строится той же функцией weekdays_mask, что и маски ячеек
+    расписания преподавателей (teach).
+
+    Args:
+        report (StudioWorkReport): Приказ о работе студии.
+        space_ids (Iterable[int]): Пространства студии (ProstrSutdioMapping).
+        day_names (Optional[Iterable[str]]): Рабочие дни; None, если дни неизвестны (тогда занятыми считаются все дни).
+        studio_name (str): Название студии для сообщений.
+
+    Returns:
+        List[Booking]: Занятость по каждому пространству студии.
+    """
+    weekdays = ALL_WEEKDAYS if day_names is None else weekdays_mask(day_names)
+    return [
+        Booking(
+            'studio', report.pk, space_id, report.date_studio_work_start, report.date_studio_work_end, weekdays,
+            report.time_start, report.time_end, f'студия «{studio_name}»'
+        )
+        for space_id in space_ids
+    ]
+
+
+def exhibition_bookings(order, exhibition_name: str = '') -> List[Booking]:
+    """
+    Занятость пространства выставкой.
+
+    Выставка занимает пространство непрерывно, поэтому период разбивается на неполный первый день,
+    полные дни и неполный последний день.
+
+    Args:
+        order (OrderToCreateExhibition): Приказ о проведении выставки.
+        exhibition_name (str): Название выставки для сообщений.
+
+    Returns:
+        List[Booking]: Занятость пространства.
+    """
+    start, end = order.date_start, order.date_end
+    if timezone.is_aware(start):
+        start, end = timezone.localtime(start), timezone.localtime(end)
+    title = f'выставка «{exhibition_name}»'
+    slots = []
+    if start.date() == end.date():
+        slots.append((start.date(), start.date(), start.time(), end.time()))
+    else:
+        slots.append((start.date(), start.date(), start.time(), time.max))
+        if (end.date() - start.date()).days > 1:
+            slots.append((start.date() + timedelta(days=1), end.date() - timedelta(days=1), time.min, time.max))
+        slots.append((end.date(), end.date(), time.min, end.time()))
+    return [
+        Booking('exhibition', order.pk, order.place_id, day_start, day_end, ALL_WEEKDAYS, time_start, time_end, title)
+        for day_start, day_end, time_start, time_end in slots
+    ]
+
+
+def load_bookings(date_start: date, date_end: date, space_ids: Optional[Iterable[int]] = None) -> List[Booking]:
+    """
+    Загружает занятость пространств мероприятиями, студиями и выставками за период.
+
+    Модели других приложений берутся через apps.get_model, поэтому модуль не импортирует
+    teach и culture при загрузке. Выполняется пять запросов независимо от длины периода.
+
+    Args:
+        date_start (date): Начало периода.
+        date_end (date): Конец периода.
+        space_ids (Optional[Iterable[int]]): Пространства; по умолчанию - все.
+
+    Returns:
+        List[Booking]: Занятость.
+    """
+    Event = apps.get_model('session1', 'Event')
+    ProstrSutdioMapping = apps.get_model('session1', 'ProstrSutdioMapping')
+    StudioWorkReport = apps.get_model('teach', 'StudioWorkReport')
+    OrderToCreateExhibition = apps.get_model('culture', 'OrderToCreateExhibition')
+    space_ids = None if space_ids is None else set(space_ids)
+
+    events = Event.objects.filter(spaces__isnull=False, date__gte=date_start, date__lte=date_end)
+    mappings = ProstrSutdioMapping.objects.filter(studio__isnull=False, prostr__isnull=False)
+    orders = OrderToCreateExhibition.objects.filter(
+        date_start__lt=timezone.make_aware(datetime.combine(date_end + timedelta(days=1), time.min)),
+        date_end__gte=timezone.make_aware(datetime.combine(date_start, time.min))
+    ).select_related('exhibition')
+    if space_ids is not None:
+        events = events.filter(spaces_id__in=space_ids)
+        mappings = mappings.filter(prostr_id__in=space_ids)
+        orders = orders.filter(place_id__in=space_ids)
+
+    bookings = []
+    for event in events.only('id', 'name', 'spaces_id', 'date', 'time_started', 'time_end'):
+        bookings.extend(event_bookings(event))
+
+    studio_spaces: Dict[int, Set[int]] = dict()
+    for studio_id, space_id in mappings.values_list('studio_id', 'prostr_id'):
+        studio_spaces.setdefault(studio_id, set()).add(space_id)
+    if studio_spaces:
+        for report in StudioWorkReport.objects.filter(
+            studio_id__in=studio_spaces.keys(),
+            date_studio_work_start__lte=date_end,
+            date_studio_work_end__gte=date_start
+        ).select_related('studio').prefetch_related('work_days'):
+            bookings.extend(studio_bookings(
+                report,
+                studio_spaces[report.studio_id],
+                [day.name for day in report.work_days.all()],
+                report.studio.name
+            ))
+
+    for order in orders:
+        bookings.extend(exhibition_bookings(order, order.exhibition.name))
+    return bookings
+
+
+class OccupancyIndex:
+    """
+    Календарь занятости пространств.
+
+    Для каждого пространства строится дерево отрезков дат, поэтому после загрузки
+    (даже за несколько лет) поиск пересечений и свободных пространств идет в памяти.
+
+    Атрибуты:
+        trees (Dict[int, IntervalTree]): Деревья занятости по идентификатору пространства.
+    """
+    def __init__(self, bookings: Iterable[Booking]):
+        """
+        Строит календарь по списку занятости.
+
+        Args:
+            bookings (Iterable[Booking]): Занятость пространств.
+        """
+        by_space: Dict[int, List[Tuple[date, date, Booking]]] = dict()
+        for booking in bookings:
+            by_space.setdefault(booking.space_id, []).append((booking.date_start, booking.date_end, booking))
+        self.trees = {space_id: IntervalTree(intervals) for space_id, intervals in by_space.items()}
+
+    @classmethod
+    def load(cls, date_start: date, date_end: date, space_ids: Optional[Iterable[int]] = None) -> 'OccupancyIndex':
+        """
+        Загружает календарь за период из базы.
+
+        Args:
+            date_start (date): Начало периода.
+            date_end (date): Конец периода.
+            space_ids (Optional[Iterable[int]]): Пространства; по умолчанию - все.
+
+        Returns:
+            OccupancyIndex: Календарь занятости.
+        """
+        return cls(load_bookings(date_start, date_end, space_ids))
+
+    def conflicts(self, booking: Booking) -> List[Booking]:
+        """
+        Ищет занятость, пересекающуюся с указанной.
+
+        Занятость того же объекта (совпадают kind и pk) не считается пересечением.
+
+        Args:
+            booking (Booking): Проверяемая занятость.
+
+        Returns:
+            List[Booking]: Пересекающаяся занятость.
+        """
+        tree = self.trees.get(booking.space_id)
+        if tree is None:
+            return []
+        return [
+            other for other in tree.overlap(booking.date_start, booking.date_end)
+            if not (booking.pk is not None and other.kind == booking.kind and other.pk == booking.pk) and booking.overlaps(other)
+        ]
+
+    def is_free(self, space_id: int, day: date, time_start: time, time_end: time) -> bool:
+        """
+        Проверяет, свободно ли пространство в указанный день и время.
+
+        Args:
+            space_id (int): Идентификатор пространства.
+            day (date): День.
+            time_start (time): Время начала.
+            time_end (time): Время окончания.
+
+        Returns:
+            bool: True, если пространство свободно.
+        """
+        return not self.conflicts(Booking('', None, space_id, day, day, ALL_WEEKDAYS, time_start, time_end, ''))
+
+
+def find_free_spaces(day: date, time_start: time, time_end: time, volume: int = 0, index: Optional[OccupancyIndex] = None) -> list:
+    """
+    Ищет пространства вместимостью не меньше volume, свободные в день day с time_start до time_end.
+
+    Args:
+        day (date): День.
+        time_start (time): Время начала.
+        time_end (time): Время окончания.
+        volume (int): Минимальная вместимость.
+        index (Optional[OccupancyIndex]): Заранее загруженный календарь (например, на год вперед);
+            если не передан, загружается занятость только за этот день.
+
+    Returns:
+        list: Свободные пространства (Prostranstvo) по возрастанию вместимости.
+    """
+    Prostranstvo = apps.get_model('session1', 'Prostranstvo')
+    if index is None:
+        index = OccupancyIndex.load(day, day)
+    return [
+        space for space in Prostranstvo.objects.filter(volume__gte=volume).order_by('volume', 'pk')
+        if index.is_free(space.pk, day, time_start, time_end)
+    ]
+
+
+def check_bookings(bookings: List[Booking]) -> None:
+    """
+    Проверяет, что пространства свободны для указанной занятости.
+
+    Используется в clean() мероприятий, приказов о работе студий и приказов о выставках.
+
+    Args:
+        bookings (List[Booking]): Занятость проверяемого объекта.
+
+    Raises:
+        ValidationError: Если пространство уже занято.
+    """
+    if not bookings:
+        return
+    index = OccupancyIndex.load(
+        min(booking.date_start for booking in bookings),
+        max(booking.date_end for booking in bookings),
+        {booking.space_id for booking in bookings}
+    )
+    conflicts = []
+    for booking in bookings:
+        for other in index.conflicts(booking):
+            if other not in conflicts:
+                conflicts.append(other)
+    if conflicts:
+        details = '; '.join(
+            f'{other.title} ({other.date_start} - {other.date_end}, {other.time_start:%H:%M} - {other.time_end:%H:%M})'
+            for other in conflicts[:CONFLICTS_IN_MESSAGE]
+        )
+        raise ValidationError(f'Пространство занято в это время: {details}')
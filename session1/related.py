@@ -0,0 +1,139 @@
+from typing import Iterable, List, Tuple
+from django.contrib import admin
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.forms.models import ModelChoiceField, ModelChoiceIterator
+
+
+def str_lookups(model: type, prefix: str = '', prefetch: bool = False) -> Tuple[List[str], List[str]]:
+    """
+    Возвращает связи, которые читает __str__ модели.
+
+    Модель перечисляет их в атрибутах str_select_related (внешние ключи, загружаются через
+    select_related) и str_prefetch_related (многие-ко-многим, загружаются через prefetch_related).
+
+    Args:
+        model (type): Модель.
+        prefix (str): Путь к модели от загружаемой модели (например, 'event__').
+        prefetch (bool): Модель загружается через prefetch_related, поэтому все ее связи тоже.
+
+    Returns:
+        Tuple[List[str], List[str]]: Связи для select_related и для prefetch_related.
+    """
+    select = [prefix + lookup for lookup in getattr(model, 'str_select_related', ())]
+    prefetch_lookups = [prefix + lookup for lookup in getattr(model, 'str_prefetch_related', ())]
+    if prefetch:
+        return [], select + prefetch_lookups
+    return select, prefetch_lookups
+
+
+def with_str_related(queryset: models.QuerySet, fields: Iterable[str] = ()) -> models.QuerySet:
+    """
+    Добавляет в запрос связанные объекты, нужные для __str__ объектов запроса.
+
+    Строковое представление многих моделей проходит по внешним ключам (Sale -> Event,
+    MoneyEvent -> Event -> Prostranstvo) или по многим-ко-многим (Location -> Prostranstvo),
+    поэтому без загрузки связей список объектов выполняет запрос на каждую строку.
+
+    Args:
+        queryset (QuerySet): Запрос.
+        fields (Iterable[str]): Поля-связи, объекты которых тоже выводятся строкой
+            (например, поля только для чтения в админ-панели).
+
+    Returns:
+        QuerySet: Запрос с select_related и prefetch_related.
+    """
+    model = queryset.model
+    select, prefetch = str_lookups(model)
+    for name in fields:
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if not field.is_relation or not field.concrete:
+            continue
+        if field.many_to_many:
+            prefetch.append(name)
+            related = str_lookups(field.related_model, f'{name}__', prefetch=True)
+        else:
+            select.append(name)
+            related = str_lookups(field.related_model, f'{name}__')
+        select.extend(related[0])
+        prefetch.extend(related[1])
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+class SharedModelChoiceIterator(ModelChoiceIterator):
+    """
+    Варианты выпадающего списка, загружаемые один раз на поле формы.
+
+    Формы набора (строки inline) получают копии поля из класса формы, и обычный
+    ModelChoiceIterator выполняет запрос для каждой строки. Копии поля разделяют
+    список shared_choices, поэтому варианты загружаются один раз на страницу.
+    """
+    def load(self) -> list:
+        """
+        Загружает варианты либо возвращает уже загруженные.
+
+        Returns:
+            list: Пары (значение, подпись), включая пустой вариант.
+        """
+        choices = self.field.shared_choices
+        if not choices:
+            choices.extend(super().__iter__())
+        return choices
+
+    def __iter__(self):
+        return iter(self.load())
+
+    def __len__(self) -> int:
+        return len(self.load())
+
+    def __bool__(self) -> bool:
+        return bool(self.load())
+
+
+class RelatedQueriesMixin:
+    """
+    Загрузка связанных объектов для списков и форм админ-панели.
+
+    Объекты списка и строк inline загружаются вместе со связями, которые читает их __str__,
+    и со связями полей только для чтения; варианты выпадающих списков внешних ключей -
+    вместе со связями, которые читает __str__ вариантов, и один раз на страницу.
+    """
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        fields = list(self.get_readonly_fields(request))
+        fields.extend(name for name in getattr(self, 'list_display', ()) if isinstance(name, str))
+        return with_str_related(queryset, fields)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if isinstance(formfield, ModelChoiceField):
+            if not db_field.get_limit_choices_to():
+                formfield.iterator = SharedModelChoiceIterator
+                formfield.shared_choices = []
+            formfield.queryset = with_str_related(formfield.queryset)
+        return formfield
+
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_manytomany(db_field, request, **kwargs)
+        if formfield is not None and formfield.queryset is not None:
+            formfield.queryset = with_str_related(formfield.queryset)
+        return formfield
+
+
+class RelatedModelAdmin(RelatedQueriesMixin, admin.ModelAdmin):
+    """
+    ModelAdmin без запросов на каждую строку списка и каждый вариант выпадающего списка.
+    """
+
+
+class RelatedTabularInline(RelatedQueriesMixin, admin.TabularInline):
+    """
+    TabularInline без запросов на каждую строку и каждый вариант выпадающего списка.
+    """
@@ -1,12 +1,26 @@
-from django.test import TestCase
+import copy
+import importlib.util
+import tempfile
+import zipfile
+from unittest import mock, skipUnless
+from io import BytesIO
+import pandas
+from openpyxl import Workbook
 from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.forms import ModelChoiceField
+from django.test import TestCase, override_settings
 from .models import (
     Location, EventType, Prostranstvo, Event, MoneyEvent,
     EventMoneyRelation, Studio, ProstrSutdioMapping, Teacher,
     Exhibition, Organization, ExhibitOwnerProxy, Exhibits, FileUpload
 )
+from .intervals import IntervalTree
+from .occupancy import OccupancyIndex, find_free_spaces
+from .imports import read_chunks, import_file, run_import, detect_format, validate_chunk
+from .related import SharedModelChoiceIterator, with_str_related
 from django.utils import timezone
-from datetime import date, time
+from datetime import date, time, datetime
 
 
 class LocationModelTest(TestCase):
@@ -110,6 +124,15 @@ class EventModelTest(TestCase):
         with self.assertRaises(ValidationError):
             self.event.clean()
 
+    def test_clean_without_date_and_space(self):
+        event = Event(name='Jazz Night', type=self.event_type, time_started=time(18, 0), time_end=time(21, 0), users_amount=10)
+        with self.assertRaises(ValidationError) as context:
+            event.full_clean()
+        self.assertIn('date', context.exception.message_dict)
+        self.assertIn('spaces', context.exception.message_dict)
+        event.date = date.today()
+        event.clean()
+
     def test_str_method(self):
         expected_str = 'Rock Night(Платное, Пространство: Main Hall)'
         self.assertEqual(str(self.event), expected_str)
@@ -199,3 +222,327 @@ class SignalsTest(TestCase):
     def test_studio_signal(self):
         proxy = ExhibitOwnerProxy.objects.get(studio=self.studio)
         self.assertEqual(proxy.studio, self.studio)
+
+
+def excel_file(rows, header=('Наименование', 'Вместимость', 'Описание')):
+    """
+    Формирует содержимое xlsx-файла с заголовком и строками.
+    """
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(list(header))
+    for row in rows:
+        sheet.append(list(row))
+    content = BytesIO()
+    workbook.save(content)
+    return content.getvalue()
+
+
+def ods_file(rows):
+    """
+    Формирует содержимое ods-файла с одним листом.
+    """
+    def cell(value):
+        if value is None:
+            return '<table:table-cell/>'
+        if isinstance(value, int):
+            return f'<table:table-cell office:value-type="float" office:value="{value}"><text:p>{value}</text:p></table:table-cell>'
+        return f'<table:table-cell office:value-type="string"><text:p>{value}</text:p></table:table-cell>'
+
+    table = ''.join(f'<table:table-row>{"".join(map(cell, row))}<table:table-cell table:number-columns-repeated="1000"/></table:table-row>' for row in rows)
+    content = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<office:document-content xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+        'xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0" '
+        'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0">'
+        f'<office:body><office:spreadsheet><table:table table:name="Лист1">{table}'
+        '<table:table-row table:number-rows-repeated="1000"><table:table-cell table:number-columns-repeated="1000"/></table:table-row>'
+        '</table:table></office:spreadsheet></office:body></office:document-content>'
+    )
+    archive = BytesIO()
+    with zipfile.ZipFile(archive, 'w') as ods:
+        ods.writestr('mimetype', 'application/vnd.oasis.opendocument.spreadsheet')
+        ods.writestr('content.xml', content)
+    return archive.getvalue()
+
+
+class ExcelImportTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, rows, **kwargs):
+        return self.write_content(excel_file(rows, **kwargs))
+
+    def write_content(self, content, name='upload.xlsx'):
+        path = f'{self.directory.name}/{name}'
+        with open(path, 'wb') as file:
+            file.write(content)
+        return path
+
+    def test_detect_format(self):
+        self.assertEqual(detect_format(self.write([])), 'xlsx')
+        self.assertEqual(detect_format(self.write_content(ods_file([]), 'upload.ods')), 'ods')
+        self.assertEqual(detect_format(self.write_content(b'PAR1\x00\x00', 'upload.bin')), 'parquet')
+        self.assertEqual(detect_format(self.write_content('ФИО\nИванов\n'.encode(), 'upload.dat')), 'csv')
+        self.assertEqual(detect_format(self.write_content(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'upload.xls')), 'xls')
+        with self.assertRaises(ValidationError):
+            detect_format(self.write_content(b'\x00\x01\x02\x03', 'upload.bin'))
+
+    def test_read_xls_chunks(self):
+        frame = pandas.DataFrame([[f'Зал {number}', number, float('nan')] for number in range(3)], dtype=object)
+        with mock.patch('session1.imports.pandas.read_excel', return_value=frame) as read_excel, \
+                mock.patch('session1.imports.IMPORT_CHUNK_SIZE', 2):
+            path = self.write_content(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'upload.xls')
+            chunks = list(read_chunks(path, 3, chunk_size=2))
+        read_excel.assert_called_once_with(path, engine='xlrd', header=None, skiprows=1, dtype=object)
+        self.assertEqual(chunks, [([2, 3], [['Зал 0', 0, None], ['Зал 1', 1, None]]), ([4], [['Зал 2', 2, None]])])
+
+    def test_read_csv(self):
+        path = self.write_content('Наименование;Вместимость;Описание\nЗал 1;10;\nЗал 2;20;Малый;лишний\n\n'.encode(), 'upload.csv')
+        self.assertEqual(list(read_chunks(path, 3)), [([2, 3], [['Зал 1', '10', None], ['Зал 2', '20', 'Малый']])])
+        import_file(path, Prostranstvo)
+        self.assertEqual(Prostranstvo.objects.get(name='Зал 2').volume, 20)
+
+    def test_read_ods(self):
+        path = self.write_content(ods_file([('ФИО', 'Лишний'), ('Иванов И. И.', 1), (None, None), ('Петров П. П.',)]), 'upload.ods')
+        self.assertEqual(list(read_chunks(path, 2)), [([2, 4], [['Иванов И. И.', 1], ['Петров П. П.', None]])])
+        import_file(path, Teacher)
+        self.assertEqual(Teacher.objects.count(), 2)
+
+    @skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow не установлен')
+    def test_read_parquet(self):
+        import pyarrow
+        from pyarrow import parquet
+        path = f'{self.directory.name}/upload.parquet'
+        parquet.write_table(pyarrow.table({'name': ['Studio A', 'Studio B'], 'description': ['А', None], 'extra': [1, 2]}), path)
+        self.assertEqual(list(read_chunks(path, 2)), [([2, 3], [['Studio A', 'А'], ['Studio B', None]])])
+        import_file(path, Studio)
+        self.assertEqual(Studio.objects.count(), 2)
+
+    def test_read_excel_chunks(self):
+        path = self.write([(f'Зал {number}', number, '') for number in range(5)])
+        chunks = list(read_chunks(path, 3, chunk_size=2))
+        self.assertEqual([len(chunk) for _, chunk in chunks], [2, 2, 1])
+        self.assertEqual(chunks[0], ([2, 3], [['Зал 0', 0, None], ['Зал 1', 1, None]]))
+
+    def test_import_prostranstvo_dedup(self):
+        Prostranstvo.objects.create(name='Зал 1', volume=1, description='')
+        path = self.write([('Зал 1', 1, None), ('Зал 2', 2, 'Малый')])
+        self.assertEqual(import_file(path, Prostranstvo), 2)
+        self.assertEqual(Prostranstvo.objects.filter(name='Зал 1').count(), 1)
+        self.assertEqual(Prostranstvo.objects.get(name='Зал 2').description, 'Малый')
+
+    def test_upload_chunk_queries(self):
+        values = [[f'Преподаватель {number}'] for number in range(500)]
+        with self.assertNumQueries(2):
+            Teacher.upload_chunk(values)
+        with self.assertNumQueries(1):
+            Teacher.upload_chunk(values)
+        self.assertEqual(Teacher.objects.count(), 500)
+
+    def test_import_studio_creates_owner(self):
+        Studio.upload_chunk([['Studio A', 'Описание'], ['Studio A', 'Другое описание'], ['Studio B', None]])
+        self.assertEqual(Studio.objects.count(), 2)
+        self.assertTrue(ExhibitOwnerProxy.objects.filter(studio__name='Studio B').exists())
+
+    def test_import_exhibits(self):
+        Exhibits.upload_chunk([['Exhibit A', 'Studio A'], ['Exhibit A', 'Studio A'], ['Exhibit B', 'Studio B']])
+        Exhibits.upload_chunk([['Exhibit A', 'Studio A']])
+        self.assertEqual(Exhibits.objects.count(), 2)
+        self.assertEqual(Exhibits.objects.get(name='Exhibit B').owner.studio.name, 'Studio B')
+
+    def upload(self, type, content):
+        with override_settings(MEDIA_ROOT=self.directory.name, FILE_IMPORT_ASYNC=False):
+            with self.captureOnCommitCallbacks(execute=True):
+                upload = FileUpload.objects.create(type=type, file=SimpleUploadedFile('upload.xlsx', content))
+        upload.refresh_from_db()
+        return upload
+
+    def test_file_upload_signal(self):
+        upload = self.upload('Преподаватель', excel_file([('Иванов И. И.',), ('Петров П. П.',)], header=('ФИО',)))
+        self.assertEqual(Teacher.objects.count(), 2)
+        self.assertEqual(upload.status, FileUpload.DONE)
+        self.assertEqual((upload.rows_total, upload.rows_processed), (2, 2))
+        self.assertIsNotNone(upload.finished_at)
+
+    def test_file_upload_errors(self):
+        upload = self.upload('Пространство', excel_file([('Зал', 'много', '')]))
+        self.assertEqual(upload.status, FileUpload.FAILED)
+        self.assertIn('Строка 2: Поле «Вместимость» должно быть целым неотрицательным числом', upload.errors)
+        self.assertFalse(Prostranstvo.objects.exists())
+
+    def test_validate_chunk(self):
+        rows, errors = validate_chunk(
+            Prostranstvo,
+            [2, 3, 4, 5, 6, 7],
+            [['Зал 1', '10', None], [None, 5, 'Без названия'], ['Зал 3', -1, ''], ['Зал 4', 2.5, ''], ['З' * 201, 1, ''], ['Зал 6', None, '']],
+            seen=dict()
+        )
+        self.assertEqual(rows, [['Зал 1', 10, ''], ['Зал 6', 1, '']])
+        self.assertEqual([number for number, _ in errors], [3, 4, 5, 6])
+        self.assertIn('Не заполнено поле «Наименование»', errors[0][1])
+        self.assertIn('длиннее 200 символов', errors[3][1])
+
+    def test_validate_duplicates(self):
+        seen = dict()
+        validate_chunk(Teacher, [2], [['Иванов И. И.']], seen)
+        rows, errors = validate_chunk(Teacher, [3, 4], [['Петров П. П.'], ['Иванов И. И.']], seen)
+        self.assertEqual(rows, [['Петров П. П.']])
+        self.assertEqual(errors, [(4, 'Строка повторяет строку 2')])
+
+    def test_import_file_is_all_or_nothing(self):
+        path = self.write([(f'Преподаватель {number}',) for number in range(5)] + [('Преподаватель 0',)], header=('ФИО',))
+        with self.assertRaises(ValidationError) as error:
+            import_file(path, Teacher)
+        self.assertIn('Строка 7: Строка повторяет строку 2', error.exception.messages[0])
+        self.assertFalse(Teacher.objects.exists())
+
+    def test_file_upload_rolls_back_on_write_error(self):
+        upload_chunk = Teacher.upload_chunk
+        calls = []
+
+        def fail_on_second_chunk(values):
+            calls.append(values)
+            if len(calls) == 2:
+                raise ValueError('сбой записи')
+            upload_chunk(values)
+
+        rows = [(f'Преподаватель {number}',) for number in range(1500)]
+        with mock.patch.object(Teacher, 'upload_chunk', side_effect=fail_on_second_chunk):
+            upload = self.upload('Преподаватель', excel_file(rows, header=('ФИО',)))
+        self.assertEqual((upload.status, upload.errors), (FileUpload.FAILED, 'сбой записи'))
+        self.assertFalse(Teacher.objects.exists())
+
+    def test_file_upload_is_queued(self):
+        with override_settings(MEDIA_ROOT=self.directory.name), mock.patch('session1.imports.get_executor') as executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                upload = FileUpload.objects.create(type='Преподаватель', file=SimpleUploadedFile('upload.xlsx', excel_file([])))
+        executor.return_value.submit.assert_called_once_with(run_import, upload.pk, True)
+        self.assertEqual(FileUpload.objects.get(pk=upload.pk).status, FileUpload.PENDING)
+
+    def test_run_import_once(self):
+        upload = self.upload('Преподаватель', excel_file([('Иванов И. И.',)], header=('ФИО',)))
+        Teacher.objects.all().delete()
+        run_import(upload.pk)
+        self.assertFalse(Teacher.objects.exists())
+
+
+class IntervalTreeTest(TestCase):
+    def test_overlap_matches_scan(self):
+        intervals = [(start, start + length, index) for index, (start, length) in enumerate(
+            (start, length) for start in range(0, 200, 7) for length in (0, 3, 25)
+        )]
+        tree = IntervalTree(intervals)
+        self.assertEqual(len(tree), len(intervals))
+        for start, end in [(-5, -1), (0, 0), (10, 12), (50, 120), (199, 300), (250, 260)]:
+            expected = sorted(index for low, high, index in intervals if low <= end and high >= start)
+            self.assertEqual(sorted(tree.overlap(start, end)), expected)
+
+    def test_empty(self):
+        self.assertEqual(IntervalTree([]).overlap(1, 2), [])
+
+
+class OccupancyTest(TestCase):
+    def setUp(self):
+        from culture.models import OrderToCreateExhibition
+        from teach.models import StudioWorkReport, Day
+        self.small = Prostranstvo.objects.create(name='Малый зал', volume=30)
+        self.large = Prostranstvo.objects.create(name='Большой зал', volume=200)
+        self.hall = Prostranstvo.objects.create(name='Выставочный зал', volume=500)
+        event_type = EventType.objects.create(name='Концерт')
+        self.event = Event.objects.create(
+            date=date(2025, 3, 6), name='Концерт', type=event_type, time_started=time(18, 0),
+            time_end=time(20, 0), users_amount=100, spaces=self.large
+        )
+        studio = Studio.objects.create(name='Студия танцев')
+        ProstrSutdioMapping.objects.create(studio=studio, prostr=self.small)
+        self.report = StudioWorkReport.objects.create(
+            date_created=timezone.now(), studio=studio, teacher=Teacher.objects.create(full_name='Иванов И. И.'),
+            date_studio_work_start=date(2024, 9, 1), date_studio_work_end=date(2025, 5, 31),
+            time_start=time(17, 0), time_end=time(19, 0)
+        )
+        self.report.work_days.set([Day.objects.create(name='Четверг')])
+        self.order = OrderToCreateExhibition.objects.create(
+            date_created=timezone.now(), exhibition=Exhibition.objects.create(name='Осенняя выставка', ex_type='Внутренняя'),
+            date_start=timezone.make_aware(datetime(2025, 3, 1, 12, 0)), date_end=timezone.make_aware(datetime(2025, 3, 10, 15, 0)),
+            place=self.hall
+        )
+
+    def test_find_free_spaces(self):
+        with self.assertNumQueries(6):
+            self.assertEqual(find_free_spaces(date(2025, 3, 6), time(18, 30), time(19, 30), volume=20), [])
+        self.assertEqual(find_free_spaces(date(2025, 3, 6), time(19, 0), time(21, 0), volume=20), [self.small])
+        self.assertEqual(find_free_spaces(date(2025, 3, 7), time(18, 30), time(19, 30), volume=100), [self.large])
+        self.assertEqual(find_free_spaces(date(2025, 3, 10), time(15, 0), time(17, 0), volume=300), [self.hall])
+
+    def test_index_over_long_period(self):
+        index = OccupancyIndex.load(date(2020, 1, 1), date(2030, 12, 31))
+        self.assertFalse(index.is_free(self.small.pk, date(2024, 9, 5), time(18, 0), time(18, 30)))
+        self.assertTrue(index.is_free(self.small.pk, date(2024, 9, 6), time(18, 0), time(18, 30)))
+        self.assertTrue(index.is_free(self.small.pk, date(2025, 6, 5), time(18, 0), time(18, 30)))
+        self.assertFalse(index.is_free(self.hall.pk, date(2025, 3, 1), time(23, 0), time(23, 30)))
+        self.assertTrue(index.is_free(self.hall.pk, date(2025, 3, 1), time(10, 0), time(12, 0)))
+
+    def test_event_clean(self):
+        self.event.clean()
+        event = Event(
+            date=date(2025, 3, 6), name='Лекция', type=self.event.type, time_started=time(19, 30),
+            time_end=time(21, 0), users_amount=10, spaces=self.large
+        )
+        with self.assertRaisesMessage(ValidationError, 'мероприятие «Концерт»'):
+            event.clean()
+        event.spaces = self.small
+        event.time_started = time(18, 30)
+        with self.assertRaisesMessage(ValidationError, 'студия «Студия танцев»'):
+            event.clean()
+        event.date = date(2025, 3, 7)
+        event.clean()
+
+    def test_studio_and_exhibition_clean(self):
+        self.report.clean()
+        self.order.clean()
+        ProstrSutdioMapping.objects.create(studio=self.report.studio, prostr=self.hall)
+        with self.assertRaisesMessage(ValidationError, 'выставка «Осенняя выставка»'):
+            self.report.clean()
+        with self.assertRaisesMessage(ValidationError, 'студия «Студия танцев»'):
+            self.order.clean()
+
+
+class StrRelatedTest(TestCase):
+    def setUp(self):
+        event_type = EventType.objects.create(name='Концерт')
+        for number in range(3):
+            hall = Prostranstvo.objects.create(name=f'Зал {number}', volume=100, loc=True)
+            event = Event.objects.create(
+                date=date(2025, 3, 1), name=f'Концерт {number}', type=event_type, time_started=time(18, 0),
+                time_end=time(21, 0), users_amount=10, spaces=hall, is_money=True
+            )
+            money_event = MoneyEvent.objects.create(event=event)
+            for _ in range(2):
+                location = Location.objects.create(type='Партер', row=2, amount=5)
+                location.space.add(hall)
+                EventMoneyRelation.objects.create(space=location, cost=500, money_event=money_event)
+
+    def test_str_without_queries_per_row(self):
+        expected = [str(relation) for relation in EventMoneyRelation.objects.all()]
+        with self.assertNumQueries(2):
+            self.assertEqual([str(relation) for relation in with_str_related(EventMoneyRelation.objects.all())], expected)
+        with self.assertNumQueries(1):
+            [str(money_event) for money_event in with_str_related(MoneyEvent.objects.all())]
+
+    def test_related_fields(self):
+        with self.assertNumQueries(2):
+            for relation in with_str_related(EventMoneyRelation.objects.all(), ['money_event', 'cost', 'unknown']):
+                str(relation.money_event)
+                str(relation.space)
+
+    def test_shared_choices(self):
+        field = ModelChoiceField(Location.objects.all())
+        field.iterator = SharedModelChoiceIterator
+        field.shared_choices = []
+        field.queryset = with_str_related(Location.objects.all())
+        with self.assertNumQueries(2):
+            labels = [[label for _, label in copy.deepcopy(field).choices] for _ in range(3)]
+        self.assertEqual(len(labels[0]), 7)
+        self.assertEqual(labels[0], labels[2])
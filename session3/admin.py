@@ -1,41 +1,82 @@
-from django.contrib import admin
-from .models import Sale, Ticket, TicketAvailable, TicketRow, Report, ReportRow, BareSell
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.exceptions import ValidationError
+from session1.models import Location
+from session1.related import RelatedModelAdmin, RelatedTabularInline, with_str_related
+from .models import Sale, SeatInventory, Ticket, TicketAvailable, TicketRow, Report, ReportRow, BareSell
+from .services import checkout_best_seats
 
 
-class ReportRowInline(admin.TabularInline):
+class ReportRowInline(RelatedTabularInline):
     model = ReportRow
     extra = 0
     readonly_fields = ['event', 'amount', 'cost', 'report', 'description']
 
 
-class BareSellInline(admin.TabularInline):
+class BareSellInline(RelatedTabularInline):
     model = BareSell
     extra = 0
 
 
 @admin.register(Report)
-class ReportAdmin(admin.ModelAdmin):
+class ReportAdmin(RelatedModelAdmin):
     inlines = [ReportRowInline]
 
 
-class TicketInline(admin.TabularInline):
+class TicketInline(RelatedTabularInline):
     model = Ticket
     extra = 0
     readonly_fields = ['cost']
 
 
-class TicketRowInline(admin.TabularInline):
+class TicketRowInline(RelatedTabularInline):
     model = TicketRow
     extra = 0
-    readonly_fields = ['row_number', 'available_numbers', 'location', 'sale']
+    readonly_fields = ['row_number', 'available_numbers', 'location']
 
 
-class TicketAvailableInline(admin.TabularInline):
+class TicketAvailableInline(RelatedTabularInline):
     model = TicketAvailable
     extra = 0
     
 
 
+class BestSeatsForm(ActionForm):
+    seats_count = forms.IntegerField(label='Мест подряд', min_value=1, required=False, initial=2)
+    location = forms.ModelChoiceField(with_str_related(Location.objects.all()), label='Локация', required=False)
+    cost = forms.IntegerField(label='Цена', min_value=0, required=False)
+
+
 @admin.register(Sale)
-class SaleAdmin(admin.ModelAdmin):
-    inlines = [TicketInline, TicketRowInline, BareSellInline]
+class SaleAdmin(RelatedModelAdmin):
+    inlines = [TicketInline, BareSellInline]
+    action_form = BestSeatsForm
+    actions = ['sell_best_seats']
+
+    @admin.action(description='Продать соседние места (лучший ряд)')
+    def sell_best_seats(self, request, queryset):
+        form = self.action_form(request.POST)
+        form.fields['action'].choices = self.get_action_choices(request)
+        if not form.is_valid() or not form.cleaned_data['seats_count']:
+            self.message_user(request, 'Укажите количество мест', messages.ERROR)
+            return
+        location = form.cleaned_data['location']
+        for sale in queryset:
+            try:
+                tickets = checkout_best_seats(
+                    sale,
+                    form.cleaned_data['seats_count'],
+                    location.pk if location else None,
+                    form.cleaned_data['cost']
+                )
+            except ValidationError as e:
+                self.message_user(request, f'{sale}: {" ".join(e.messages)}', messages.ERROR)
+                continue
+            self.message_user(request, f'{sale}: продано мест - {len(tickets)}, ряд {tickets[0].row}, места {tickets[0].column}-{tickets[-1].column}')
+
+
+@admin.register(SeatInventory)
+class SeatInventoryAdmin(RelatedModelAdmin):
+    readonly_fields = ['event', 'version', 'capacity', 'sold']
+    inlines = [TicketRowInline]
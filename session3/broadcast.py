@@ -0,0 +1,152 @@
+import asyncio
+import json
+import threading
+from typing import Dict, Optional, Set
+
+
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+def sse_message(event: str, data: dict, message_id: Optional[int] = None) -> str:
+    """
+    Формирует сообщение в формате text/event-stream.
+
+    Args:
+        event (str): Тип события.
+        data (dict): Данные события, передаются в JSON.
+        message_id (Optional[int]): Идентификатор события (версия карты мест).
+
+    Returns:
+        str: Готовое к отправке сообщение.
+    """
+    lines = [] if message_id is None else [f'id: {message_id}']
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscription:
+    """
+    Подписка одного клиента на изменения карты мест мероприятия.
+
+    Сообщения складываются в asyncio.Queue в цикле событий подписчика, поэтому на клиента
+    не нужен отдельный поток. Если клиент не успевает читать и очередь переполнена, она
+    очищается и в нее кладется None: клиент должен заново загрузить карту мест.
+
+    Атрибуты:
+        inventory_id (int): Идентификатор карты мест (SeatInventory).
+        loop (asyncio.AbstractEventLoop): Цикл событий подписчика.
+        queue (asyncio.Queue): Очередь сообщений.
+        overflowed (bool): Очередь переполнялась, сообщения потеряны.
+    """
+    def __init__(self, inventory_id: int, loop: asyncio.AbstractEventLoop, maxsize: int = SUBSCRIBER_QUEUE_SIZE):
+        self.inventory_id = inventory_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def put(self, message: str) -> None:
+        """
+        Кладет сообщение в очередь. Вызывается только в цикле событий подписчика.
+
+        Args:
+            message (str): Сообщение.
+        """
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self) -> Optional[str]:
+        """
+        Ожидает следующее сообщение.
+
+        Returns:
+            Optional[str]: Сообщение либо None, если сообщения были потеряны.
+        """
+        return await self.queue.get()
+
+
+class SeatBroadcast:
+    """
+    Рассылка изменений карт мест подписчикам внутри процесса.
+
+    Публиковать можно из любого потока (синхронные представления и сигналы под ASGI
+    выполняются в отдельном потоке): сообщение передается в цикл событий каждого подписчика
+    через call_soon_threadsafe. Рассылка работает в пределах одного процесса сервера.
+
+    Атрибуты:
+        subscriptions (Dict[int, Set[Subscription]]): Подписки по идентификатору карты мест.
+            Все продажи мероприятия используют одну карту мест, поэтому подписчики всех его
+            продаж получают одни и те же события.
+    """
+    def __init__(self):
+        self.subscriptions: Dict[int, Set[Subscription]] = dict()
+        self._lock = threading.Lock()
+
+    def subscribe(self, inventory_id: int) -> Subscription:
+        """
+        Подписывается на изменения карты мест. Вызывается из работающего цикла событий.
+
+        Args:
+            inventory_id (int): Идентификатор карты мест.
+
+        Returns:
+            Subscription: Подписка.
+        """
+        subscription = Subscription(inventory_id, asyncio.get_running_loop())
+        with self._lock:
+            self.subscriptions.setdefault(inventory_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """
+        Отменяет подписку.
+
+        Args:
+            subscription (Subscription): Подписка.
+        """
+        with self._lock:
+            subscriptions = self.subscriptions.get(subscription.inventory_id)
+            if subscriptions is None:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self.subscriptions[subscription.inventory_id]
+
+    def has_subscribers(self, inventory_id: int) -> bool:
+        """
+        Проверяет, есть ли подписчики у карты мест.
+        """
+        return inventory_id in self.subscriptions
+
+    def publish(self, inventory_id: int, message: str) -> int:
+        """
+        Отправляет сообщение всем подписчикам карты мест.
+
+        Args:
+            inventory_id (int): Идентификатор карты мест.
+            message (str): Сообщение.
+
+        Returns:
+            int: Количество подписчиков, которым отправлено сообщение.
+        """
+        with self._lock:
+            subscriptions = list(self.subscriptions.get(inventory_id, ()))
+        sent = 0
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, message)
+            except RuntimeError:
+                self.unsubscribe(subscription)
+            else:
+                sent += 1
+        return sent
+
+
+seat_events = SeatBroadcast()
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from session3.models import SalesRollup
+
+
+class Command(BaseCommand):
+    """
+    Команда для пересборки и проверки дневных итогов продаж.
+
+    По умолчанию пересобирает SalesRollup из билетов и обычных продаж и проверяет результат.
+    С флагом --check только сверяет текущие итоги с исходными данными.
+    """
+    help = 'Пересобирает дневные итоги продаж билетов и проверяет их по исходным данным'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить итоги, не пересобирая их'
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            SalesRollup.rebuild()
+            self.stdout.write('Итоги продаж пересобраны')
+
+        expected = {key: total for key, total in SalesRollup.collect().items() if total[0]}
+        actual = {
+            (rollup.event_id, rollup.date, rollup.cost): [rollup.amount, rollup.revenue]
+            for rollup in SalesRollup.objects.filter(amount__gt=0)
+        }
+        mismatches = sorted(
+            key for key in expected.keys() | actual.keys()
+            if expected.get(key) != actual.get(key)
+        )
+        for event_id, day, cost in mismatches:
+            self.stderr.write(
+                f'Мероприятие {event_id}, {day}, цена {cost}: '
+                f'ожидалось {expected.get((event_id, day, cost))}, в итогах {actual.get((event_id, day, cost))}'
+            )
+        if mismatches:
+            raise CommandError(f'Итоги продаж не совпадают с исходными данными: {len(mismatches)} расхождений')
+        self.stdout.write(self.style.SUCCESS(f'Итоги продаж совпадают с исходными данными ({len(actual)} строк)'))
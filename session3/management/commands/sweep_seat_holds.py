@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from session3.models import release_expired_holds
+
+
+class Command(BaseCommand):
+    """
+    Команда для удаления просроченных удержаний мест.
+
+    Запускается периодически (например, раз в минуту из cron): все просроченные удержания
+    удаляются одним запросом, после чего места снова становятся свободными.
+    """
+    help = 'Удаляет просроченные удержания мест'
+
+    def handle(self, *args, **options):
+        released = release_expired_holds()
+        self.stdout.write(self.style.SUCCESS(f'Снято удержаний: {released}'))
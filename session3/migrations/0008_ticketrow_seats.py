@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session3', '0007_alter_baresell_options_alter_reportrow_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticketrow',
+            name='seats',
+            field=models.BinaryField(default=b'', verbose_name='Свободные места'),
+        ),
+        migrations.AlterField(
+            model_name='ticketrow',
+            name='available_numbers',
+            field=models.CharField(default='', max_length=500, verbose_name='Доступные места'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations
+
+
+def available_numbers_to_seats(apps, schema_editor):
+    TicketRow = apps.get_model('session3', 'TicketRow')
+    batch = []
+    for ticket_row in TicketRow.objects.select_related('location').only('id', 'available_numbers', 'location__amount').iterator():
+        # Длина карты задается количеством мест в ряду, а не последним свободным местом,
+        # иначе проданные места в конце ряда не освободятся при возврате билета.
+        seats = bytearray((ticket_row.location.amount + 7) // 8)
+        for number in str(ticket_row.available_numbers).split():
+            if not number.isdigit() or not 1 <= int(number) <= ticket_row.location.amount:
+                continue
+            index, bit = divmod(int(number) - 1, 8)
+            seats[index] |= 1 << bit
+        ticket_row.seats = bytes(seats)
+        batch.append(ticket_row)
+        if len(batch) >= 1000:
+            TicketRow.objects.bulk_update(batch, ['seats'])
+            batch = []
+    TicketRow.objects.bulk_update(batch, ['seats'])
+
+
+def seats_to_available_numbers(apps, schema_editor):
+    TicketRow = apps.get_model('session3', 'TicketRow')
+    batch = []
+    for ticket_row in TicketRow.objects.only('id', 'seats').iterator():
+        ticket_row.available_numbers = ' '.join(
+            str(index * 8 + bit + 1)
+            for index, byte in enumerate(bytes(ticket_row.seats))
+            for bit in range(8)
+            if byte >> bit & 1
+        )
+        batch.append(ticket_row)
+        if len(batch) >= 1000:
+            TicketRow.objects.bulk_update(batch, ['available_numbers'])
+            batch = []
+    TicketRow.objects.bulk_update(batch, ['available_numbers'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session3', '0008_ticketrow_seats'),
+    ]
+
+    operations = [
+        migrations.RunPython(available_numbers_to_seats, seats_to_available_numbers),
+    ]
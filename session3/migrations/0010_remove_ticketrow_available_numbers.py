@@ -0,0 +1,15 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session3', '0009_ticketrow_seats_data'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='ticketrow',
+            name='available_numbers',
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session3', '0010_remove_ticketrow_available_numbers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticketrow',
+            name='version',
+            field=models.PositiveIntegerField(default=0, verbose_name='Версия'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.0.3 on 2026-10-18 13:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+
+
+def fill_sales_rollup(apps, schema_editor):
+    Ticket = apps.get_model('session3', 'Ticket')
+    BareSell = apps.get_model('session3', 'BareSell')
+    SalesRollup = apps.get_model('session3', 'SalesRollup')
+    totals = dict()
+    for queryset in (
+        Ticket.objects.values(event=F('sale__event'), day=TruncDate('sale__date_sell'), price=F('cost')),
+        BareSell.objects.values(event=F('sell__event'), day=TruncDate('sell__date_sell'), price=F('money')),
+    ):
+        for group in queryset.annotate(amount=Count('id')).order_by():
+            key = (group['event'], group['day'], group['price'] or 0)
+            total = totals.setdefault(key, [0, 0])
+            total[0] += group['amount']
+            total[1] += group['amount'] * key[2]
+    SalesRollup.objects.bulk_create([
+        SalesRollup(event_id=event_id, date=day, cost=cost, amount=amount, revenue=revenue)
+        for (event_id, day, cost), (amount, revenue) in totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session1', '0008_alter_exhibitownerproxy_options'),
+        ('session3', '0011_ticketrow_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='День продажи')),
+                ('cost', models.PositiveIntegerField(verbose_name='Цена билета')),
+                ('amount', models.PositiveIntegerField(default=0, verbose_name='Количество проданных билетов')),
+                ('revenue', models.PositiveBigIntegerField(default=0, verbose_name='Выручка')),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='session1.event', verbose_name='Мероприятие')),
+            ],
+            options={
+                'verbose_name': 'Итоги продаж за день',
+                'verbose_name_plural': 'Итоги продаж по дням',
+                'indexes': [models.Index(fields=['date'], name='session3_sa_date_cdcf54_idx')],
+                'unique_together': {('event', 'date', 'cost')},
+            },
+        ),
+        migrations.RunPython(fill_sales_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 14:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session3', '0012_salesrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='seats_version',
+            field=models.PositiveIntegerField(default=0, verbose_name='Версия карты мест'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session1', '0012_eventmoneyrelation_event_space_index'),
+        ('session3', '0013_sale_seats_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatInventory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(default=0, verbose_name='Версия карты мест')),
+                ('event', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='seat_inventory', to='session1.event', verbose_name='Мероприятие')),
+            ],
+            options={
+                'verbose_name': 'Карта мест',
+                'verbose_name_plural': 'Карты мест',
+            },
+        ),
+        migrations.AddField(
+            model_name='ticketrow',
+            name='inventory',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='session3.seatinventory', verbose_name='Карта мест'),
+        ),
+    ]
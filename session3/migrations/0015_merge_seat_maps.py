@@ -0,0 +1,48 @@
+from itertools import zip_longest
+from django.db import migrations
+from django.db.models import Sum
+
+
+def merge_seat_maps(apps, schema_editor):
+    """
+    Объединяет карты мест продаж одного мероприятия в общую карту мероприятия.
+
+    Место свободно в общей карте, только если оно свободно в картах всех продаж (побитовое И);
+    из рядов с одинаковыми локацией и номером остается один. Карты разной длины не обрезаются
+    по короткой: места за концом короткой карты считаются занятыми.
+    """
+    Sale = apps.get_model('session3', 'Sale')
+    SeatInventory = apps.get_model('session3', 'SeatInventory')
+    TicketRow = apps.get_model('session3', 'TicketRow')
+
+    versions = Sale.objects.filter(pk__in=TicketRow.objects.values('sale')).values('event').annotate(version=Sum('seats_version'))
+    SeatInventory.objects.bulk_create([
+        SeatInventory(event_id=item['event'], version=item['version'] or 0) for item in versions
+    ])
+    for inventory_id, event_id in SeatInventory.objects.values_list('pk', 'event_id'):
+        merged = dict()
+        duplicates = []
+        for pk, location_id, row_number, seats in TicketRow.objects.filter(sale__event=event_id).order_by('pk').values_list(
+            'pk', 'location_id', 'row_number', 'seats'
+        ):
+            key = (location_id, row_number)
+            if key not in merged:
+                merged[key] = TicketRow(pk=pk, seats=bytes(seats), inventory_id=inventory_id)
+                continue
+            row = merged[key]
+            row.seats = bytes(left & right for left, right in zip_longest(row.seats, bytes(seats), fillvalue=0))
+            duplicates.append(pk)
+        TicketRow.objects.bulk_update(merged.values(), ['seats', 'inventory'], batch_size=1000)
+        for start in range(0, len(duplicates), 1000):
+            TicketRow.objects.filter(pk__in=duplicates[start:start + 1000]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session3', '0014_seatinventory'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_seat_maps, migrations.RunPython.noop),
+    ]
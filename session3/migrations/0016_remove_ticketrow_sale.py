@@ -0,0 +1,29 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session3', '0015_merge_seat_maps'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='ticketrow',
+            name='sale',
+        ),
+        migrations.AlterField(
+            model_name='ticketrow',
+            name='inventory',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='session3.seatinventory', verbose_name='Карта мест'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='ticketrow',
+            unique_together={('inventory', 'location', 'row_number')},
+        ),
+        migrations.RemoveField(
+            model_name='sale',
+            name='seats_version',
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.3 on 2026-10-18 14:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session1', '0012_eventmoneyrelation_event_space_index'),
+        ('session3', '0016_remove_ticketrow_sale'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row', models.PositiveIntegerField(verbose_name='Номер ряда')),
+                ('column', models.PositiveIntegerField(verbose_name='Номер места')),
+                ('token', models.UUIDField(verbose_name='Идентификатор удержания')),
+                ('expires_at', models.DateTimeField(verbose_name='Удерживается до')),
+                ('inventory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='session3.seatinventory', verbose_name='Карта мест')),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='session1.location', verbose_name='Локация')),
+                ('sale', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='session3.sale', verbose_name='Продажа')),
+            ],
+            options={
+                'verbose_name': 'Удержание места',
+                'verbose_name_plural': 'Удержания мест',
+                'indexes': [models.Index(fields=['expires_at'], name='session3_hold_expires_idx'), models.Index(fields=['token'], name='session3_hold_token_idx')],
+                'unique_together': {('inventory', 'location', 'row', 'column')},
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.0.3 on 2026-10-18 14:39
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_sold_counters(apps, schema_editor):
+    """
+    Заполняет вместимость и количество проданных билетов в картах мест.
+
+    Карты мест создаются и для мероприятий, у которых есть продажи, но нет рядов.
+    """
+    Event = apps.get_model('session1', 'Event')
+    Sale = apps.get_model('session3', 'Sale')
+    SeatInventory = apps.get_model('session3', 'SeatInventory')
+    Ticket = apps.get_model('session3', 'Ticket')
+    BareSell = apps.get_model('session3', 'BareSell')
+
+    existing = set(SeatInventory.objects.values_list('event_id', flat=True))
+    SeatInventory.objects.bulk_create([
+        SeatInventory(event_id=event_id)
+        for event_id in Sale.objects.values_list('event_id', flat=True).distinct()
+        if event_id not in existing
+    ])
+    sold = dict()
+    for queryset, field in ((Ticket.objects, 'sale__event'), (BareSell.objects, 'sell__event')):
+        for event_id, amount in queryset.values_list(field).annotate(amount=Count('id')).order_by():
+            sold[event_id] = sold.get(event_id, 0) + amount
+    capacities = {
+        event_id: users_amount if volume is None else min(users_amount, volume)
+        for event_id, users_amount, volume in Event.objects.filter(seat_inventory__isnull=False).values_list(
+            'pk', 'users_amount', 'spaces__volume'
+        )
+    }
+    inventories = list(SeatInventory.objects.all())
+    for inventory in inventories:
+        inventory.capacity = capacities[inventory.event_id]
+        inventory.sold = sold.get(inventory.event_id, 0)
+    SeatInventory.objects.bulk_update(inventories, ['capacity', 'sold'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session1', '0012_eventmoneyrelation_event_space_index'),
+        ('session3', '0017_seathold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seatinventory',
+            name='capacity',
+            field=models.PositiveIntegerField(default=0, verbose_name='Вместимость'),
+        ),
+        migrations.AddField(
+            model_name='seatinventory',
+            name='sold',
+            field=models.PositiveIntegerField(default=0, verbose_name='Продано билетов'),
+        ),
+        migrations.RunPython(fill_sold_counters, migrations.RunPython.noop),
+    ]
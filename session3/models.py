@@ -1,8 +1,19 @@
-from django.db import models
-from session1.models import Event, Location, EventMoneyRelation
-from django.db.models.signals import post_save
+import logging
+import uuid
+from datetime import date, timedelta
+from django.db import models, transaction, IntegrityError, OperationalError
+from django.db.models import F, Q, Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.core.cache import cache
+from session1.models import Event, Location, EventMoneyRelation, Prostranstvo
+from django.db.models.signals import post_save, pre_save, pre_delete, post_delete
 from django.dispatch import receiver
 from django.core.exceptions import ValidationError
+from .broadcast import seat_events, sse_message
+
+
+logger = logging.getLogger(__name__)
 
 
 class Report(models.Model):
@@ -69,6 +80,100 @@ class ReportRow(models.Model):
         verbose_name_plural = 'Объекты отчета'
 
 
+class SalesRollup(models.Model):
+    """
+    Модель для хранения дневных итогов продаж билетов.
+
+    Строки обновляются инкрементально при создании и удалении билетов и обычных продаж,
+    поэтому отчеты за любой период считаются без обхода всех продаж.
+
+    Атрибуты:
+        event (ForeignKey): Связь с мероприятием.
+        date (DateField): День продажи.
+        cost (PositiveIntegerField): Цена билета.
+        amount (PositiveIntegerField): Количество проданных билетов.
+        revenue (PositiveBigIntegerField): Выручка.
+    """
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, verbose_name='Мероприятие')
+    date = models.DateField('День продажи')
+    cost = models.PositiveIntegerField('Цена билета')
+    amount = models.PositiveIntegerField('Количество проданных билетов', default=0)
+    revenue = models.PositiveBigIntegerField('Выручка', default=0)
+
+    def __str__(self):
+        """
+        Строковое представление итогов продаж.
+
+        Возвращает строку с днем и ценой билета.
+        """
+        return f'Итоги продаж ({self.date}, цена {self.cost})'
+
+    @classmethod
+    def add(cls, event_id, day, cost, amount) -> None:
+        """
+        Прибавляет проданные (либо вычитает возвращенные) билеты к итогам дня.
+
+        Args:
+            event_id (int): Идентификатор мероприятия.
+            day (date): День продажи.
+            cost (int): Цена билета.
+            amount (int): Количество билетов, отрицательное при удалении.
+        """
+        cost = cost or 0
+        updated = cls.objects.filter(event_id=event_id, date=day, cost=cost).update(
+            amount=F('amount') + amount,
+            revenue=F('revenue') + amount * cost
+        )
+        if updated or amount < 0:
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(event_id=event_id, date=day, cost=cost, amount=amount, revenue=amount * cost)
+        except IntegrityError:
+            cls.objects.filter(event_id=event_id, date=day, cost=cost).update(
+                amount=F('amount') + amount,
+                revenue=F('revenue') + amount * cost
+            )
+
+    @classmethod
+    def collect(cls) -> dict:
+        """
+        Считает дневные итоги продаж по исходным билетам и обычным продажам.
+
+        Returns:
+            dict: Словарь {(мероприятие, день, цена): [количество, выручка]}.
+        """
+        totals = dict()
+        for queryset in (
+            Ticket.objects.values(event=F('sale__event'), day=TruncDate('sale__date_sell'), price=F('cost')),
+            BareSell.objects.values(event=F('sell__event'), day=TruncDate('sell__date_sell'), price=F('money')),
+        ):
+            for group in queryset.annotate(amount=Count('id')).order_by():
+                key = (group['event'], group['day'], group['price'] or 0)
+                total = totals.setdefault(key, [0, 0])
+                total[0] += group['amount']
+                total[1] += group['amount'] * key[2]
+        return totals
+
+    @classmethod
+    def rebuild(cls) -> None:
+        """
+        Пересобирает итоги продаж по исходным данным.
+        """
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create([
+                cls(event_id=event_id, date=day, cost=cost, amount=amount, revenue=revenue)
+                for (event_id, day, cost), (amount, revenue) in cls.collect().items()
+            ], batch_size=1000)
+
+    class Meta:
+        verbose_name = 'Итоги продаж за день'
+        verbose_name_plural = 'Итоги продаж по дням'
+        unique_together = ('event', 'date', 'cost')
+        indexes = [models.Index(fields=['date'])]
+
+
 class Sale(models.Model):
     """
     Модель для хранения информации о продажах билетов.
@@ -89,6 +194,8 @@ class Sale(models.Model):
         if not self.event.is_money:
             raise ValidationError('Можно выбирать только платные мероприятия')
 
+    str_select_related = ('event',)
+
     def __str__(self):
         """
         Строковое представление продажи.
@@ -118,11 +225,22 @@ class BareSell(models.Model):
         """
         Валидация обычной продажи.
 
-        Проверяет, что количество проданных билетов не превышает вместимость пространства.
+        Проверяет, что на мероприятие еще остались билеты. Окончательная проверка выполняется
+        при сохранении (SeatInventory.add_sold), поэтому параллельные продажи не превысят вместимость.
         """
-        if self.sell.event.spaces.volume < len(BareSell.objects.filter(sell__event__spaces=self.sell.event.spaces)):
+        if SeatInventory.objects.filter(event__sale=self.sell_id, sold__gte=F('capacity')).exists():
             raise ValidationError('Слишком много билетов продано')
 
+    def save(self, *args, **kwargs):
+        """
+        Сохраняет обычную продажу в одной транзакции с сигналами.
+
+        Счетчик проданных билетов увеличивается в pre_save (sold_counter), поэтому ошибка
+        при записи либо в post_save не должна оставлять увеличенный счетчик.
+        """
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = 'Обычная продажа'
         verbose_name_plural = 'Обычные продажи'
@@ -149,13 +267,34 @@ class Ticket(models.Model):
         """
         Валидация билета.
 
-        Проверяет доступность места в выбранной локации.
+        Проверяет доступность места в выбранной локации и что место не удерживается.
         """
-        print(self.row)
-        s = self.sale.ticketrow_set.all().get(location=self.location, row_number=self.row).available_numbers
-        print(s, self.column, self.row, str(self.column) in s)
-        if not str(self.column) in str(s).split():
+        ticket_row = TicketRow.objects.filter(
+            inventory__event__sale=self.sale_id,
+            location=self.location_id,
+            row_number=self.row
+        ).first()
+        if ticket_row is None or not ticket_row.is_free(self.column):
             raise ValidationError('Место уже занято либо не существует')
+        if SeatHold.active().filter(
+            inventory=ticket_row.inventory_id,
+            location=self.location_id,
+            row=self.row,
+            column=self.column
+        ).exists():
+            raise ValidationError('Место удерживается другим покупателем')
+        if SeatInventory.objects.filter(pk=ticket_row.inventory_id, sold__gte=F('capacity')).exists():
+            raise ValidationError('Слишком много билетов продано')
+
+    def save(self, *args, **kwargs):
+        """
+        Сохраняет билет в одной транзакции с сигналами.
+
+        Счетчик проданных билетов увеличивается в pre_save (sold_counter), а место занимается
+        в post_save (create_ticket). Если место уже занято, откатываются и счетчик, и сам билет.
+        """
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self):
         """
@@ -201,20 +340,224 @@ class TicketAvailable(models.Model):
         verbose_name_plural = 'Доступности билетова'
 
 
+def seats_bitmap(columns: int) -> bytes:
+    """
+    Формирует битовую карту ряда, в которой свободны все места.
+
+    Место с номером n соответствует биту (n - 1) % 8 в байте (n - 1) // 8.
+
+    Args:
+        columns (int): Количество мест в ряду.
+
+    Returns:
+        bytes: Упакованная битовая карта ряда.
+    """
+    full, rest = divmod(columns, 8)
+    return b'\xff' * full + (bytes([(1 << rest) - 1]) if rest else b'')
+
+
+def event_capacity(users_amount, volume) -> int:
+    """
+    Вместимость мероприятия: количество посетителей, но не больше вместимости пространства.
+
+    Args:
+        users_amount (int): Количество посетителей мероприятия.
+        volume (Optional[int]): Вместимость пространства; None, если пространство не выбрано.
+
+    Returns:
+        int: Сколько всего билетов можно продать.
+    """
+    return users_amount if volume is None else min(users_amount, volume)
+
+
+class SeatInventory(models.Model):
+    """
+    Модель карты мест мероприятия.
+
+    Карта создается один раз при первой продаже мероприятия, и все его продажи занимают
+    места в ней, поэтому кассы видят одну и ту же доступность мест. В карте также ведется
+    счетчик проданных билетов (с местами и без), который не может превысить вместимость.
+
+    Атрибуты:
+        event (OneToOneField): Связь с мероприятием.
+        version (PositiveIntegerField): Версия карты мест, увеличивается при каждом изменении мест.
+        capacity (PositiveIntegerField): Вместимость: min(Event.users_amount, Prostranstvo.volume).
+        sold (PositiveIntegerField): Продано билетов (Ticket и BareSell).
+    """
+    event = models.OneToOneField(Event, on_delete=models.CASCADE, related_name='seat_inventory', verbose_name='Мероприятие')
+    version = models.PositiveIntegerField('Версия карты мест', default=0)
+    capacity = models.PositiveIntegerField('Вместимость', default=0)
+    sold = models.PositiveIntegerField('Продано билетов', default=0)
+
+    @classmethod
+    def for_event(cls, event_id: int) -> 'SeatInventory':
+        """
+        Возвращает карту мест мероприятия, создавая ее вместе с рядами при первом обращении.
+
+        Ряды для всех локаций мероприятия создаются одним запросом через bulk_create.
+
+        Args:
+            event_id (int): Идентификатор мероприятия.
+
+        Returns:
+            SeatInventory: Карта мест.
+        """
+        with transaction.atomic():
+            inventory, created = cls.objects.get_or_create(event_id=event_id, defaults={
+                'capacity': lambda: event_capacity(*Event.objects.filter(pk=event_id).values_list('users_amount', 'spaces__volume').get())
+            })
+            if created:
+                TicketRow.objects.bulk_create([
+                    TicketRow(
+                        row_number=row+1,
+                        seats=seats_bitmap(location.amount),
+                        location=location,
+                        inventory=inventory
+                    )
+                    for location in Location.objects.filter(space__event=event_id).distinct()
+                    for row in range(location.row)
+                ])
+        return inventory
+
+    @staticmethod
+    def add_sold(event_id: int, amount: int) -> None:
+        """
+        Прибавляет проданные (либо вычитает возвращенные) билеты к счетчику мероприятия.
+
+        Продажа выполняется одним условным UPDATE: счетчик увеличивается, только если
+        после этого он не превысит вместимость. Блокировка строки на время UPDATE не дает
+        параллельным кассам продать больше мест, чем есть.
+
+        Если возвращается больше билетов, чем учтено в счетчике (счетчик разошелся с билетами),
+        счетчик обнуляется, а расхождение записывается в журнал: возврат билета не блокируется.
+
+        Args:
+            event_id (int): Идентификатор мероприятия.
+            amount (int): Количество билетов, отрицательное при возврате.
+
+        Raises:
+            ValidationError: Если билетов не хватает.
+        """
+        inventory = SeatInventory.objects.filter(event_id=event_id)
+        if amount < 0:
+            if not inventory.filter(sold__gte=-amount).update(sold=F('sold') + amount):
+                for sold in inventory.filter(sold__lt=-amount).values_list('sold', flat=True):
+                    logger.warning(
+                        'Счетчик проданных билетов мероприятия %s (%s) меньше возвращаемых билетов (%s), счетчик обнулен',
+                        event_id, sold, -amount
+                    )
+                inventory.filter(sold__lt=-amount).update(sold=0)
+            return
+        if not inventory.filter(sold__lte=F('capacity') - amount).update(sold=F('sold') + amount):
+            raise ValidationError('Слишком много билетов продано')
+
+    def __str__(self):
+        """
+        Строковое представление карты мест.
+
+        Возвращает строку с идентификатором мероприятия.
+        """
+        return f'Карта мест мероприятия {self.event_id}'
+
+
+    class Meta:
+        verbose_name = 'Карта мест'
+        verbose_name_plural = 'Карты мест'
+
+
 class TicketRow(models.Model):
     """
     Модель для хранения информации о рядах билетов.
 
+    Свободные места ряда хранятся битовой картой: установленный бит означает свободное место.
+
     Атрибуты:
         row_number (PositiveBigIntegerField): Номер ряда.
-        available_numbers (CharField): Доступные номера мест.
+        seats (BinaryField): Битовая карта свободных мест.
+        version (PositiveIntegerField): Номер версии ряда, увеличивается при каждом изменении мест.
         location (ForeignKey): Связь с локацией.
-        sale (ForeignKey): Связь с продажей.
+        inventory (ForeignKey): Связь с картой мест мероприятия.
     """
     row_number = models.PositiveBigIntegerField('Номер ряда')
-    available_numbers = models.CharField(max_length=500, verbose_name='Доступные места')
+    seats = models.BinaryField('Свободные места', default=b'')
+    version = models.PositiveIntegerField('Версия', default=0)
     location = models.ForeignKey(Location, on_delete=models.CASCADE, verbose_name='Локация')
-    sale = models.ForeignKey(Sale, on_delete=models.CASCADE, verbose_name='Продажа')
+    inventory = models.ForeignKey(SeatInventory, on_delete=models.CASCADE, related_name='rows', verbose_name='Карта мест')
+
+    def is_free(self, column) -> bool:
+        """
+        Проверяет, свободно ли место в ряду.
+
+        Args:
+            column (int): Номер места.
+
+        Returns:
+            bool: True, если место существует и не занято.
+        """
+        if column is None or column < 1:
+            return False
+        index, bit = divmod(column - 1, 8)
+        seats = self.seats
+        return index < len(seats) and bool(seats[index] >> bit & 1)
+
+    def reserve(self, column) -> None:
+        """
+        Занимает место в ряду.
+
+        Args:
+            column (int): Номер места.
+
+        Raises:
+            SeatUnavailable: Если место уже занято либо не существует.
+        """
+        if not self.is_free(column):
+            raise SeatUnavailable('Место уже занято либо не существует')
+        index, bit = divmod(column - 1, 8)
+        seats = bytearray(self.seats)
+        seats[index] &= ~(1 << bit) & 0xff
+        self.seats = bytes(seats)
+
+    def release(self, column) -> None:
+        """
+        Освобождает место в ряду.
+
+        Args:
+            column (int): Номер места.
+        """
+        index, bit = divmod(column - 1, 8)
+        seats = bytearray(self.seats)
+        if 0 <= index < len(seats):
+            seats[index] |= 1 << bit
+            self.seats = bytes(seats)
+
+    def free_seats(self, held: int = 0) -> bytes:
+        """
+        Битовая карта свободных мест ряда без удерживаемых мест.
+
+        Args:
+            held (int): Маска удерживаемых мест (место n - бит n - 1).
+
+        Returns:
+            bytes: Битовая карта свободных мест.
+        """
+        seats = bytes(self.seats)
+        if not held:
+            return seats
+        return (int.from_bytes(seats, 'little') & ~held).to_bytes(len(seats), 'little')
+
+    @property
+    def available_numbers(self) -> str:
+        """
+        Свободные места ряда в виде строки номеров через пробел.
+        """
+        seats = self.seats
+        return ' '.join(
+            str(index * 8 + bit + 1)
+            for index, byte in enumerate(seats)
+            for bit in range(8)
+            if byte >> bit & 1
+        )
+    available_numbers.fget.short_description = 'Доступные места'
 
     def __str__(self):
         """
@@ -228,14 +571,323 @@ class TicketRow(models.Model):
     class Meta:
         verbose_name = 'Ряд билетов'
         verbose_name_plural = 'Ряды билетов'
+        unique_together = ('inventory', 'location', 'row_number')
+
+
+class SeatHold(models.Model):
+    """
+    Модель временного удержания места на время оплаты.
+
+    Удерживаемое место не отмечается в битовой карте ряда, но не считается свободным,
+    пока не наступит expires_at. Просроченные удержания удаляются одним запросом
+    (release_expired_holds, команда sweep_seat_holds).
+
+    Атрибуты:
+        inventory (ForeignKey): Связь с картой мест мероприятия.
+        sale (ForeignKey): Связь с продажей.
+        location (ForeignKey): Связь с локацией.
+        row (PositiveIntegerField): Номер ряда.
+        column (PositiveIntegerField): Номер места.
+        token (UUIDField): Идентификатор удержания, общий для мест одного покупателя.
+        expires_at (DateTimeField): Время окончания удержания.
+    """
+    inventory = models.ForeignKey(SeatInventory, on_delete=models.CASCADE, verbose_name='Карта мест')
+    sale = models.ForeignKey(Sale, on_delete=models.CASCADE, verbose_name='Продажа')
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, verbose_name='Локация')
+    row = models.PositiveIntegerField('Номер ряда')
+    column = models.PositiveIntegerField('Номер места')
+    token = models.UUIDField('Идентификатор удержания')
+    expires_at = models.DateTimeField('Удерживается до')
+
+    @staticmethod
+    def active(now=None) -> models.QuerySet:
+        """
+        Удержания, срок которых еще не истек.
+
+        Args:
+            now (datetime): Текущее время; по умолчанию - timezone.now().
+
+        Returns:
+            QuerySet: Действующие удержания.
+        """
+        return SeatHold.objects.filter(expires_at__gt=now or timezone.now())
+
+    def __str__(self):
+        """
+        Строковое представление удержания.
+
+        Возвращает строку с рядом, местом и временем окончания удержания.
+        """
+        return f'Удержание: ряд {self.row}, место {self.column} до {self.expires_at}'
+
+
+    class Meta:
+        verbose_name = 'Удержание места'
+        verbose_name_plural = 'Удержания мест'
+        unique_together = ('inventory', 'location', 'row', 'column')
+        indexes = [
+            models.Index(fields=['expires_at'], name='session3_hold_expires_idx'),
+            models.Index(fields=['token'], name='session3_hold_token_idx'),
+        ]
+
+
+SEAT_UPDATE_ATTEMPTS = 10
+SEAT_HOLD_TIMEOUT = 10 * 60
+TICKET_PRICES_CACHE_TIMEOUT = 5 * 60
+
+
+class SeatMapChanged(Exception):
+    """
+    Исключение, возникающее, если ряд был изменен другой транзакцией во время бронирования.
+    """
+
+
+class SeatUnavailable(ValidationError):
+    """
+    Исключение, возникающее, если место занято, удерживается другим покупателем либо не существует.
+
+    В отличие от остальных ошибок продажи (вместимость, цены) может пройти при выборе других мест,
+    поэтому подбор мест (checkout_best_seats) повторяется только после него.
+    """
+
+
+def _publish_seats(inventory_id: int, location, seats, action: str, expires_at=None) -> None:
+    """
+    Рассылает подписчикам карты мест измененные места после фиксации транзакции.
+
+    Args:
+        inventory_id (int): Идентификатор карты мест.
+        location (Location): Локация либо ее id.
+        seats (list): Список пар (ряд, место).
+        action (str): 'reserved' - места заняты, 'held' - удерживаются, 'released' - освобождены.
+        expires_at (Optional[datetime]): Окончание удержания (для 'held'); клиент освобождает
+            места сам, если не получит событие 'released' (очистка может идти в другом процессе).
+    """
+    version = SeatInventory.objects.filter(pk=inventory_id).values_list('version', flat=True).first()
+    data = {
+        'location': getattr(location, 'pk', location),
+        'action': action,
+        'seats': [[row, column] for row, column in seats],
+        'version': version,
+    }
+    if expires_at is not None:
+        data['expires_at'] = expires_at.isoformat()
+    message = sse_message('seats', data, version)
+    transaction.on_commit(lambda: seat_events.publish(inventory_id, message), robust=True)
+
+
+def _update_seats(sale, location, seats, reserve: bool, hold_token=None, hold_until=None) -> None:
+    """
+    Атомарно занимает, удерживает либо освобождает места продажи в карте мест ее мероприятия.
+
+    Ряды блокируются через select_for_update, а запись выполняется условным UPDATE
+    по номеру версии ряда, поэтому параллельные кассы не затирают изменения друг друга.
+    При конфликте версий транзакция откатывается и повторяется. После изменения
+    увеличивается версия карты мест (SeatInventory.version), а подписчикам карты мест
+    после фиксации транзакции рассылается событие с измененными местами.
+
+    Места, удерживаемые другим покупателем, занять и удержать нельзя. Места, удерживаемые
+    с hold_token, при занятии освобождаются от удержания.
+
+    Args:
+        sale (Sale): Продажа либо ее id.
+        location (Location): Локация либо ее id.
+        seats (list): Список пар (ряд, место).
+        reserve (bool): True - занять места, False - освободить.
+        hold_token (Optional[UUID]): Удержание покупателя.
+        hold_until (Optional[datetime]): Если передано - места не занимаются, а удерживаются
+            с hold_token до этого времени.
+
+    Raises:
+        SeatUnavailable: Если место занято, удерживается либо не существует.
+        ValidationError: Если не удалось дождаться ряда.
+    """
+    seats = list(seats)
+    if len(set(seats)) != len(seats):
+        raise ValidationError('Одно и то же место выбрано несколько раз')
+    row_numbers = {row for row, _ in seats}
+    for attempt in range(SEAT_UPDATE_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                ticket_rows = {
+                    ticket_row.row_number: ticket_row
+                    for ticket_row in TicketRow.objects.select_for_update(of=('self',)).filter(
+                        inventory__event__sale=sale,
+                        location=location,
+                        row_number__in=row_numbers
+                    ).order_by('row_number')
+                }
+                for row, column in seats:
+                    if row not in ticket_rows:
+                        if not reserve:
+                            continue
+                        raise SeatUnavailable('Место уже занято либо не существует')
+                    if hold_until is not None:
+                        if not ticket_rows[row].is_free(column):
+                            raise SeatUnavailable('Место уже занято либо не существует')
+                    elif reserve:
+                        ticket_rows[row].reserve(column)
+                    else:
+                        ticket_rows[row].release(column)
+                if reserve and ticket_rows:
+                    inventory_id = next(iter(ticket_rows.values())).inventory_id
+                    _check_holds(getattr(sale, 'pk', sale), inventory_id, location, seats, hold_token, hold_until)
+                for ticket_row in ticket_rows.values():
+                    updated = TicketRow.objects.filter(
+                        pk=ticket_row.pk,
+                        version=ticket_row.version
+                    ).update(seats=ticket_row.seats, version=F('version') + 1)
+                    if not updated:
+                        raise SeatMapChanged()
+                if ticket_rows:
+                    inventory_id = next(iter(ticket_rows.values())).inventory_id
+                    SeatInventory.objects.filter(pk=inventory_id).update(version=F('version') + 1)
+                    if seat_events.has_subscribers(inventory_id):
+                        action = 'held' if hold_until is not None else 'reserved' if reserve else 'released'
+                        _publish_seats(inventory_id, location, [seat for seat in seats if seat[0] in ticket_rows], action, hold_until)
+                return
+        except (SeatMapChanged, OperationalError):
+            if attempt == SEAT_UPDATE_ATTEMPTS - 1:
+                raise ValidationError('Не удалось забронировать места, попробуйте еще раз')
+
+
+def _check_holds(sale_id: int, inventory_id: int, location, seats, hold_token, hold_until) -> None:
+    """
+    Проверяет удержания мест в заблокированных рядах и обновляет их.
+
+    При занятии мест удаляются удержания с hold_token, при удержании - просроченные
+    удержания этих мест, после чего создаются новые.
+
+    Args:
+        sale_id (int): Идентификатор продажи.
+        inventory_id (int): Идентификатор карты мест.
+        location (Location): Локация либо ее id.
+        seats (list): Список пар (ряд, место).
+        hold_token (Optional[UUID]): Удержание покупателя.
+        hold_until (Optional[datetime]): Время окончания нового удержания.
+
+    Raises:
+        SeatUnavailable: Если место удерживается другим покупателем.
+    """
+    now = timezone.now()
+    holds = SeatHold.objects.filter(inventory=inventory_id, location=location, row__in={row for row, _ in seats})
+    wanted = set(seats)
+    for row, column, token, expires_at in holds.values_list('row', 'column', 'token', 'expires_at'):
+        if (row, column) in wanted and expires_at > now and token != hold_token:
+            raise SeatUnavailable('Место удерживается другим покупателем')
+    seat_filter = Q()
+    for row, column in seats:
+        seat_filter |= Q(row=row, column=column)
+    if hold_until is None:
+        if hold_token is not None:
+            holds.filter(seat_filter, token=hold_token).delete()
+        return
+    holds.filter(seat_filter).delete()
+    SeatHold.objects.bulk_create([
+        SeatHold(
+            inventory_id=inventory_id,
+            sale_id=sale_id,
+            location_id=getattr(location, 'pk', location),
+            row=row,
+            column=column,
+            token=hold_token,
+            expires_at=hold_until
+        )
+        for row, column in seats
+    ])
+
+
+def reserve_seats(sale, location, seats, hold_token=None) -> None:
+    """
+    Бронирует несколько мест одной локации в рамках одной транзакции.
+
+    Либо занимаются все переданные места, либо ни одно.
+
+    Args:
+        sale (Sale): Продажа либо ее id.
+        location (Location): Локация либо ее id.
+        seats (list): Список пар (ряд, место).
+        hold_token (Optional[UUID]): Удержание покупателя: его места можно занять, после чего удержание снимается.
+
+    Raises:
+        ValidationError: Если хотя бы одно место занято, удерживается другим покупателем либо не существует.
+    """
+    _update_seats(sale, location, seats, reserve=True, hold_token=hold_token)
+
+
+def hold_seats(sale, location, seats, hold_token=None, timeout: int = SEAT_HOLD_TIMEOUT) -> uuid.UUID:
+    """
+    Удерживает несколько мест одной локации на время оплаты.
+
+    Args:
+        sale (Sale): Продажа либо ее id.
+        location (Location): Локация либо ее id.
+        seats (list): Список пар (ряд, место).
+        hold_token (Optional[UUID]): Существующее удержание, к которому добавляются места.
+        timeout (int): Длительность удержания в секундах.
+
+    Returns:
+        UUID: Идентификатор удержания.
+
+    Raises:
+        ValidationError: Если хотя бы одно место занято, удерживается либо не существует.
+    """
+    hold_token = hold_token or uuid.uuid4()
+    _update_seats(sale, location, seats, reserve=True, hold_token=hold_token, hold_until=timezone.now() + timedelta(seconds=timeout))
+    return hold_token
+
+
+def release_expired_holds(now=None) -> int:
+    """
+    Удаляет просроченные удержания мест.
+
+    Удержания удаляются одним DELETE по индексу expires_at, версии затронутых карт мест
+    увеличиваются одним UPDATE. Места загружаются только для карт мест, у которых
+    в этом процессе есть подписчики: им после фиксации рассылается событие 'released'.
+
+    Args:
+        now (datetime): Текущее время; по умолчанию - timezone.now().
+
+    Returns:
+        int: Количество удаленных удержаний.
+    """
+    expired = SeatHold.objects.filter(expires_at__lte=now or timezone.now())
+    with transaction.atomic():
+        inventories = set(expired.values_list('inventory', flat=True))
+        if not inventories:
+            return 0
+        SeatInventory.objects.filter(pk__in=inventories).update(version=F('version') + 1)
+        released = dict()
+        subscribed = [inventory_id for inventory_id in inventories if seat_events.has_subscribers(inventory_id)]
+        if subscribed:
+            for inventory_id, location_id, row, column in expired.filter(inventory__in=subscribed).values_list(
+                'inventory', 'location', 'row', 'column'
+            ).order_by('inventory', 'location', 'row', 'column'):
+                released.setdefault((inventory_id, location_id), []).append((row, column))
+        deleted, _ = expired.delete()
+        for (inventory_id, location_id), seats in released.items():
+            _publish_seats(inventory_id, location_id, seats, 'released')
+    return deleted
+
+
+def release_seats(sale, location, seats) -> None:
+    """
+    Освобождает несколько мест одной локации в рамках одной транзакции.
+
+    Args:
+        sale (Sale): Продажа либо ее id.
+        location (Location): Локация либо ее id.
+        seats (list): Список пар (ряд, место).
+    """
+    _update_seats(sale, location, seats, reserve=False)
 
 
 @receiver(post_save, sender=Sale)
 def sale_ticket_availibily_creation(sender, instance, created, **kwargs):
     """
-    Сигнал для создания доступных билетов при создании продажи.
+    Сигнал для создания карты мест при первой продаже мероприятия.
 
-    При создании новой продажи генерируются ряды билетов для каждой локации мероприятия.
+    Карта мест общая для всех продаж мероприятия, поэтому ряды создаются только один раз.
     
     Args:
         sender: Отправитель сигнала.
@@ -244,34 +896,104 @@ def sale_ticket_availibily_creation(sender, instance, created, **kwargs):
         **kwargs: Дополнительные аргументы.
     """
     if created:
-        for location in instance.event.spaces.location_set.all():
-            rows = location.row
-            columns = location.amount
-            for row in range(rows):
-                TicketRow.objects.create(
-                    row_number=row+1,
-                    available_numbers=' '.join(map(str, range(1, columns+1))),
-                    location=location,
-                    sale=instance
-                )
-                # Для каждого ряда можно также создавать объекты TicketAvailable, если необходимо
-                # for column in range(columns):
-                #     TicketAvailable.objects.create(
-                #         column=column+1,
-                #         row=row+1,
-                #         location=location,
-                #         sale=instance,
-                #         availability=True
-                #     )
+        SeatInventory.for_event(instance.event_id)
+
+
+def ticket_prices_key(sale_id: int) -> str:
+    """
+    Ключ кэша цен на билеты продажи.
+    """
+    return f'session3:ticket-prices:{sale_id}'
+
+
+def ticket_prices(sale_id: int) -> dict:
+    """
+    Возвращает цены на билеты продажи по локациям.
+
+    Цены берутся из EventMoneyRelation мероприятия, к которому относится продажа; если для локации
+    задано несколько цен, действует первая. Результат кэшируется по продаже до изменения цен мероприятия.
+
+    Args:
+        sale_id (int): Идентификатор продажи.
+
+    Returns:
+        dict: Цены {идентификатор локации: цена}.
+    """
+    key = ticket_prices_key(sale_id)
+    prices = cache.get(key)
+    if prices is None:
+        prices = dict()
+        for location_id, cost in EventMoneyRelation.objects.filter(
+            money_event__event__sale=sale_id
+        ).order_by('pk').values_list('space_id', 'cost'):
+            prices.setdefault(location_id, cost)
+        cache.set(key, prices, TICKET_PRICES_CACHE_TIMEOUT)
+    return prices
+
+
+@receiver(pre_save, sender=EventMoneyRelation)
+def remember_price_money_event(sender, instance, **kwargs):
+    """
+    Сигнал для запоминания платного мероприятия, к которому цена относилась до изменения.
+
+    Если цену перенесли на другое мероприятие, reset_ticket_prices сбрасывает кэш цен
+    и прежнего мероприятия.
+
+    Args:
+        sender: Отправитель сигнала.
+        instance (EventMoneyRelation): Экземпляр цены.
+        **kwargs: Дополнительные аргументы.
+    """
+    instance._previous_money_event_id = None if instance._state.adding else EventMoneyRelation.objects.filter(
+        pk=instance.pk
+    ).values_list('money_event', flat=True).first()
+
+
+@receiver(post_save, sender=EventMoneyRelation)
+@receiver(post_delete, sender=EventMoneyRelation)
+def reset_ticket_prices(sender, instance, **kwargs):
+    """
+    Сигнал для сброса кэша цен на билеты при изменении цен мероприятия.
+
+    Сбрасываются цены продаж мероприятия, к которому цена относится, и мероприятия,
+    к которому она относилась до сохранения (см. remember_price_money_event).
+
+    Кэш сбрасывается сразу (для чтения цен в текущей транзакции) и еще раз после фиксации
+    транзакции: до фиксации параллельный запрос может снова положить в кэш старые цены.
+
+    Args:
+        sender: Отправитель сигнала.
+        instance (EventMoneyRelation): Экземпляр цены.
+        **kwargs: Дополнительные аргументы.
+    """
+    money_events = {instance.money_event_id, getattr(instance, '_previous_money_event_id', None)} - {None}
+    sales = Sale.objects.filter(event__moneyevent__in=money_events).values_list('pk', flat=True)
+    keys = [ticket_prices_key(sale_id) for sale_id in sales]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+@receiver(pre_save, sender=Ticket)
+def ticket_cost(sender, instance, **kwargs):
+    """
+    Сигнал для установки стоимости билета перед его созданием.
+
+    Цена берется по локации билета из цен мероприятия продажи, поэтому билет записывается одним INSERT.
+
+    Args:
+        sender: Отправитель сигнала.
+        instance (Ticket): Экземпляр билета.
+        **kwargs: Дополнительные аргументы.
+    """
+    if instance._state.adding and instance.cost is None and instance.location_id is not None:
+        instance.cost = ticket_prices(instance.sale_id).get(instance.location_id)
 
 
 @receiver(post_save, sender=Ticket)
 def create_ticket(sender, instance, created, *args, **kwargs):
     """
-    Сигнал для обновления информации о билете после его создания.
+    Сигнал для обновления доступности места после создания билета.
 
-    При создании билета автоматически устанавливается его стоимость и обновляется доступность места.
-    
     Args:
         sender: Отправитель сигнала.
         instance (Ticket): Экземпляр билета.
@@ -280,21 +1002,20 @@ def create_ticket(sender, instance, created, *args, **kwargs):
         **kwargs: Дополнительные аргументы.
     """
     if created:
-        location = instance.location
-        cost = EventMoneyRelation.objects.filter(space=location).first().cost
-        instance.cost = cost
-        instance.save()
-        rows_available = TicketRow.objects.get(row_number=instance.row, sale=instance.sale, location=instance.location)
-        rows_available.available_numbers = ' '.join(
-            filter(
-                lambda x: x != str(instance.column),
-                map(
-                    str,
-                    range(1, rows_available.location.amount+1)
-                )
-            )
-        )
-        rows_available.save()
+        reserve_seats(instance.sale_id, instance.location_id, [(instance.row, instance.column)])
+
+
+@receiver(post_delete, sender=Ticket)
+def delete_ticket(sender, instance, **kwargs):
+    """
+    Сигнал для освобождения места после удаления билета.
+
+    Args:
+        sender: Отправитель сигнала.
+        instance (Ticket): Экземпляр билета.
+        **kwargs: Дополнительные аргументы.
+    """
+    release_seats(instance.sale_id, instance.location_id, [(instance.row, instance.column)])
 
 
 @receiver(post_save, sender=Report)
@@ -303,6 +1024,8 @@ def create_report(sender, instance, created, **kwargs):
     Сигнал для создания строк отчета после его создания.
 
     При создании нового отчета собирается информация о продажах билетов за указанный период и создаются соответствующие строки отчета.
+    Данные берутся из дневных итогов продаж (SalesRollup), поэтому время построения
+    не зависит от истории продаж.
     
     Args:
         sender: Отправитель сигнала.
@@ -311,41 +1034,280 @@ def create_report(sender, instance, created, **kwargs):
         **kwargs: Дополнительные аргументы.
     """
     if created:
-        sales = Sale.objects.filter(
-            date_sell__gte=instance.date_started,
-            date_sell__lte=instance.date_end
-        )
+        groups = SalesRollup.objects.filter(
+            date__gte=instance.date_started,
+            date__lte=instance.date_end
+        ).values('event', 'cost').annotate(
+            tickets=Sum('amount'),
+            total=Sum('revenue')
+        ).order_by('event', 'cost')
         report_dict = dict()
-        for sale in sales:
-            if sale.event.id not in report_dict.keys():
-                report_dict.update({
-                    sale.event.id: [0, 0, dict()]
-                })
-            tickets_all = report_dict[sale.event.id][0]
-            tickets_sum = report_dict[sale.event.id][1]
-            amounts = report_dict[sale.event.id][2]
-            for ticket in sale.ticket_set.all():
-                tickets_all += 1
-                tickets_sum += ticket.cost
-                if ticket.cost not in amounts.keys():
-                    amounts.update({ticket.cost: 1})
-                else:
-                    amounts[ticket.cost] += 1
-            report_dict[sale.event.id] = [
-                tickets_all, 
-                tickets_sum,
+        for group in groups:
+            tickets_all, tickets_sum, amounts = report_dict.setdefault(group['event'], [0, 0, dict()])
+            if group['tickets']:
+                amounts[group['cost']] = group['tickets']
+            report_dict[group['event']] = [
+                tickets_all + group['tickets'],
+                tickets_sum + group['total'],
                 amounts
             ]
-        
-        for i in report_dict.keys():
-            rep_build = ''
-            temp = report_dict[i][2]
-            for value in temp.keys():
-                rep_build += f'Цена:{value} - Количество проданных билетов: {temp[value]}\n'
-            ReportRow.objects.create(
-                event=Event.objects.get(id=i),
-                amount=report_dict[i][0],
-                cost=report_dict[i][1],
-                description=rep_build,
+
+        ReportRow.objects.bulk_create([
+            ReportRow(
+                event_id=event_id,
+                amount=tickets_all,
+                cost=tickets_sum,
+                description=''.join(
+                    f'Цена:{value} - Количество проданных билетов: {amount}\n'
+                    for value, amount in amounts.items()
+                ),
                 report=instance
-            )
\ No newline at end of file
+            )
+            for event_id, (tickets_all, tickets_sum, amounts) in report_dict.items()
+        ])
+
+
+def sale_day(sale):
+    """
+    Возвращает день продажи в текущем часовом поясе.
+
+    Args:
+        sale (Sale): Экземпляр продажи.
+
+    Returns:
+        date: День продажи.
+    """
+    return local_day(sale.date_sell)
+
+
+def local_day(moment) -> date:
+    """
+    Возвращает день момента времени в текущем часовом поясе.
+
+    Args:
+        moment (datetime): Момент времени.
+
+    Returns:
+        date: День.
+    """
+    if timezone.is_aware(moment):
+        return timezone.localdate(moment)
+    return moment.date()
+
+
+def rollup_key(instance) -> tuple:
+    """
+    Возвращает строку дневных итогов, в которую входит билет либо обычная продажа.
+
+    Args:
+        instance (Ticket | BareSell): Экземпляр билета либо обычной продажи.
+
+    Returns:
+        tuple: Мероприятие, день продажи и цена.
+    """
+    if isinstance(instance, Ticket):
+        return instance.sale.event_id, sale_day(instance.sale), instance.cost
+    return instance.sell.event_id, sale_day(instance.sell), instance.money
+
+
+@receiver(pre_save, sender=Ticket)
+@receiver(pre_save, sender=BareSell)
+def remember_rollup_key(sender, instance, **kwargs):
+    """
+    Сигнал для запоминания строки дневных итогов, в которую билет входил до изменения.
+
+    Если у билета изменили цену либо продажу, ticket_rollup и bare_sell_rollup переносят его
+    из прежней строки итогов в новую.
+
+    Args:
+        sender: Отправитель сигнала.
+        instance (Ticket | BareSell): Экземпляр билета либо обычной продажи.
+        **kwargs: Дополнительные аргументы.
+    """
+    if instance._state.adding:
+        instance._previous_rollup_key = None
+        return
+    if sender is Ticket:
+        fields = ('sale__event', 'sale__date_sell', 'cost')
+    else:
+        fields = ('sell__event', 'sell__date_sell', 'money')
+    previous = sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+    instance._previous_rollup_key = previous and (previous[0], local_day(previous[1]), previous[2])
+
+
+def move_rollup(instance, created: bool) -> None:
+    """
+    Учитывает созданный либо измененный билет (обычную продажу) в дневных итогах продаж.
+
+    Args:
+        instance (Ticket | BareSell): Экземпляр билета либо обычной продажи.
+        created (bool): Флаг создания.
+    """
+    key = rollup_key(instance)
+    if created:
+        SalesRollup.add(*key, 1)
+        return
+    previous = getattr(instance, '_previous_rollup_key', None)
+    if previous is not None and previous != key:
+        SalesRollup.add(*previous, -1)
+        SalesRollup.add(*key, 1)
+
+
+@receiver(post_save, sender=Ticket)
+def ticket_rollup(sender, instance, created, **kwargs):
+    """
+    Сигнал для учета проданного либо измененного билета в дневных итогах продаж.
+
+    Args:
+        sender: Отправитель сигнала.
+        instance (Ticket): Экземпляр билета.
+        created (bool): Флаг создания.
+        **kwargs: Дополнительные аргументы.
+    """
+    move_rollup(instance, created)
+
+
+@receiver(pre_delete, sender=Ticket)
+def ticket_rollup_delete(sender, instance, **kwargs):
+    """
+    Сигнал для вычитания удаляемого билета из дневных итогов продаж.
+
+    Args:
+        sender: Отправитель сигнала.
+        instance (Ticket): Экземпляр билета.
+        **kwargs: Дополнительные аргументы.
+    """
+    SalesRollup.add(instance.sale.event_id, sale_day(instance.sale), instance.cost, -1)
+
+
+@receiver(post_save, sender=BareSell)
+def bare_sell_rollup(sender, instance, created, **kwargs):
+    """
+    Сигнал для учета созданной либо измененной обычной продажи в дневных итогах продаж.
+
+    Args:
+        sender: Отправитель сигнала.
+        instance (BareSell): Экземпляр обычной продажи.
+        created (bool): Флаг создания.
+        **kwargs: Дополнительные аргументы.
+    """
+    move_rollup(instance, created)
+
+
+@receiver(pre_delete, sender=BareSell)
+def bare_sell_rollup_delete(sender, instance, **kwargs):
+    """
+    Сигнал для вычитания удаляемой обычной продажи из дневных итогов продаж.
+
+    Args:
+        sender: Отправитель сигнала.
+        instance (BareSell): Экземпляр обычной продажи.
+        **kwargs: Дополнительные аргументы.
+    """
+    SalesRollup.add(instance.sell.event_id, sale_day(instance.sell), instance.money, -1)
+
+
+@receiver(pre_save, sender=Sale)
+def remember_sale_rollup_day(sender, instance, **kwargs):
+    """
+    Сигнал для запоминания мероприятия и дня продажи до ее изменения.
+
+    Args:
+        sender: Отправитель сигнала.
+        instance (Sale): Экземпляр продажи.
+        **kwargs: Дополнительные аргументы.
+    """
+    previous = None
+    if not instance._state.adding:
+        previous = Sale.objects.filter(pk=instance.pk).values_list('event', 'date_sell').first()
+    instance._previous_rollup_day = previous and (previous[0], local_day(previous[1]))
+
+
+@receiver(post_save, sender=Sale)
+def sale_rollup_move(sender, instance, created, **kwargs):
+    """
+    Сигнал для переноса билетов и обычных продаж в дневных итогах при смене мероприятия либо дня продажи.
+
+    Билеты переносятся по одной строке итогов на цену, независимо от количества билетов.
+
+    Args:
+        sender: Отправитель сигнала.
+        instance (Sale): Экземпляр продажи.
+        created (bool): Флаг создания.
+        **kwargs: Дополнительные аргументы.
+    """
+    previous = getattr(instance, '_previous_rollup_day', None)
+    current = (instance.event_id, sale_day(instance))
+    if created or previous is None or previous == current:
+        return
+    for queryset in (
+        Ticket.objects.filter(sale=instance).values(price=F('cost')),
+        BareSell.objects.filter(sell=instance).values(price=F('money')),
+    ):
+        for group in queryset.annotate(amount=Count('id')).order_by():
+            SalesRollup.add(*previous, group['price'], -group['amount'])
+            SalesRollup.add(*current, group['price'], group['amount'])
+
+
+@receiver(pre_save, sender=Ticket)
+@receiver(pre_save, sender=BareSell)
+def sold_counter(sender, instance, **kwargs):
+    """
+    Сигнал для учета нового билета в счетчике проданных билетов мероприятия.
+
+    Счетчик увеличивается до записи билета, поэтому билет сверх вместимости не сохраняется.
+
+    Args:
+        sender: Отправитель сигнала.
+        instance (Ticket | BareSell): Экземпляр билета либо обычной продажи.
+        **kwargs: Дополнительные аргументы.
+    """
+    if instance._state.adding:
+        sale = instance.sale if sender is Ticket else instance.sell
+        SeatInventory.add_sold(sale.event_id, 1)
+
+
+@receiver(post_delete, sender=Ticket)
+@receiver(post_delete, sender=BareSell)
+def sold_counter_delete(sender, instance, **kwargs):
+    """
+    Сигнал для вычитания удаленного билета из счетчика проданных билетов мероприятия.
+
+    Args:
+        sender: Отправитель сигнала.
+        instance (Ticket | BareSell): Экземпляр билета либо обычной продажи.
+        **kwargs: Дополнительные аргументы.
+    """
+    sale = instance.sale if sender is Ticket else instance.sell
+    SeatInventory.add_sold(sale.event_id, -1)
+
+
+@receiver(post_save, sender=Event)
+def event_capacity_update(sender, instance, created, **kwargs):
+    """
+    Сигнал для обновления вместимости в карте мест при изменении мероприятия.
+
+    Args:
+        sender: Отправитель сигнала.
+        instance (Event): Экземпляр мероприятия.
+        created (bool): Флаг создания.
+        **kwargs: Дополнительные аргументы.
+    """
+    if created:
+        return
+    volume = Prostranstvo.objects.filter(pk=instance.spaces_id).values_list('volume', flat=True).first()
+    SeatInventory.objects.filter(event=instance.pk).update(capacity=event_capacity(instance.users_amount, volume))
+
+
+@receiver(post_save, sender=Prostranstvo)
+def space_capacity_update(sender, instance, **kwargs):
+    """
+    Сигнал для обновления вместимости в картах мест мероприятий при изменении вместимости пространства.
+
+    Args:
+        sender: Отправитель сигнала.
+        instance (Prostranstvo): Экземпляр пространства.
+        **kwargs: Дополнительные аргументы.
+    """
+    for event_id, users_amount in Event.objects.filter(spaces=instance, seat_inventory__isnull=False).values_list('pk', 'users_amount'):
+        SeatInventory.objects.filter(event=event_id).update(capacity=event_capacity(users_amount, instance.volume))
@@ -0,0 +1,216 @@
+import uuid
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from .models import (
+    SEAT_HOLD_TIMEOUT, SEAT_UPDATE_ATTEMPTS, Sale, SeatHold, SeatInventory, SeatUnavailable, Ticket, TicketRow, SalesRollup,
+    hold_seats, reserve_seats, ticket_prices, sale_day
+)
+
+
+def group_by_location(seats: List[Tuple[int, int, int]]) -> Dict[int, List[Tuple[int, int]]]:
+    """
+    Группирует места (локация, ряд, место) по локациям.
+
+    Args:
+        seats (List[Tuple[int, int, int]]): Места.
+
+    Returns:
+        Dict[int, List[Tuple[int, int]]]: Пары (ряд, место) по идентификатору локации.
+
+    Raises:
+        ValidationError: Если места не выбраны либо повторяются.
+    """
+    if not seats:
+        raise ValidationError('Не выбрано ни одного места')
+    if len(set(seats)) != len(seats):
+        raise ValidationError('Одно и то же место выбрано несколько раз')
+    by_location = dict()
+    for location_id, row, column in seats:
+        by_location.setdefault(location_id, []).append((row, column))
+    return by_location
+
+
+def hold(sale: Sale, seats: Iterable[Tuple[int, int, int]], timeout: int = SEAT_HOLD_TIMEOUT) -> uuid.UUID:
+    """
+    Удерживает места продажи на время оплаты.
+
+    Все места удерживаются с одним идентификатором в одной транзакции: либо все, либо ни одно.
+    Идентификатор передается в checkout, чтобы продать удержанные места.
+
+    Args:
+        sale (Sale): Продажа.
+        seats (Iterable[Tuple[int, int, int]]): Места (локация, ряд, место).
+        timeout (int): Длительность удержания в секундах.
+
+    Returns:
+        UUID: Идентификатор удержания.
+
+    Raises:
+        ValidationError: Если места не выбраны, повторяются, заняты, удерживаются либо не существуют.
+    """
+    by_location = group_by_location([tuple(seat) for seat in seats])
+    token = uuid.uuid4()
+    with transaction.atomic():
+        for location_id, location_seats in by_location.items():
+            hold_seats(sale.pk, location_id, location_seats, token, timeout)
+    return token
+
+
+def checkout(sale: Sale, seats: Iterable[Tuple[int, int, int]], hold_token: Optional[uuid.UUID] = None) -> List[Ticket]:
+    """
+    Продает сразу несколько мест одной продажи (например, для группы).
+
+    Места проверяются и занимаются по карте мест (одна блокировка рядов на локацию),
+    цены берутся одним запросом (либо из кэша), билеты создаются одним bulk_create,
+    дневные итоги продаж обновляются по одной строке на цену. Все выполняется в одной
+    транзакции: либо продаются все места, либо ни одно.
+
+    Args:
+        sale (Sale): Продажа.
+        seats (Iterable[Tuple[int, int, int]]): Места (локация, ряд, место).
+        hold_token (Optional[UUID]): Удержание покупателя (см. hold); удержанные им места продаются,
+            а удержание снимается.
+
+    Returns:
+        List[Ticket]: Созданные билеты.
+
+    Raises:
+        ValidationError: Если места не выбраны, повторяются, заняты, удерживаются другим покупателем,
+            не существуют, превышают вместимость мероприятия либо для локации не задана цена.
+    """
+    seats = [tuple(seat) for seat in seats]
+    by_location = group_by_location(seats)
+    prices = ticket_prices(sale.pk)
+    missing = sorted({location_id for location_id, _, _ in seats if prices.get(location_id) is None})
+    if missing:
+        raise ValidationError(f'Для локаций {", ".join(map(str, missing))} не задана цена')
+
+    with transaction.atomic():
+        SeatInventory.add_sold(sale.event_id, len(seats))
+        for location_id, location_seats in by_location.items():
+            reserve_seats(sale.pk, location_id, location_seats, hold_token)
+        tickets = Ticket.objects.bulk_create([
+            Ticket(sale=sale, location_id=location_id, row=row, column=column, cost=prices[location_id])
+            for location_id, row, column in seats
+        ])
+        day = sale_day(sale)
+        for cost, amount in Counter(ticket.cost for ticket in tickets).items():
+            SalesRollup.add(sale.event_id, day, cost, amount)
+    return tickets
+
+
+def free_runs(seats: bytes, count: int, held: int = 0) -> int:
+    """
+    Ищет в ряду все отрезки из count свободных мест подряд.
+
+    Битовая карта ряда читается как одно число (место n - бит n - 1), после чего число
+    сдвигается и складывается по И с самим собой: после шагов 1, 2, 4, ... бит i остается
+    установленным, только если свободны места с i + 1 по i + count. Нужно O(log count)
+    операций над числом длиной в ряд вместо перебора мест.
+
+    Args:
+        seats (bytes): Битовая карта свободных мест ряда.
+        count (int): Количество мест подряд.
+        held (int): Маска удерживаемых мест ряда (место n - бит n - 1), они не считаются свободными.
+
+    Returns:
+        int: Маска начал отрезков: бит i установлен, если места с i + 1 по i + count свободны.
+    """
+    runs = int.from_bytes(seats, 'little') & ~held
+    length = 1
+    while length < count and runs:
+        step = min(length, count - length)
+        runs &= runs >> step
+        length += step
+    return runs
+
+
+def nearest_start(runs: int, target: int) -> int:
+    """
+    Выбирает из маски начал отрезков начало, ближайшее к target.
+
+    Args:
+        runs (int): Маска начал отрезков (не пустая).
+        target (int): Желаемое начало (номер бита).
+
+    Returns:
+        int: Номер бита начала отрезка.
+    """
+    below = runs & ((1 << (target + 1)) - 1)
+    above = runs >> target
+    left = below.bit_length() - 1 if below else None
+    right = target + (above & -above).bit_length() - 1 if above else None
+    if left is None or (right is not None and right - target < target - left):
+        return right
+    return left
+
+
+def find_best_seats(sale: Sale, count: int, location_id: Optional[int] = None, cost: Optional[int] = None) -> List[Tuple[int, int, int]]:
+    """
+    Подбирает count соседних свободных мест: лучший ряд (ближе к сцене) первым, в ряду - ближе к центру.
+
+    Ряды карты мест загружаются одним запросом, каждый ряд проверяется операциями над его
+    битовой картой (см. free_runs), поэтому ответ для зала на несколько тысяч мест считается в памяти
+    за десятки микросекунд. Удерживаемые места (SeatHold) не считаются свободными.
+
+    Args:
+        sale (Sale): Продажа.
+        count (int): Количество мест.
+        location_id (Optional[int]): Локация; по умолчанию - любая.
+        cost (Optional[int]): Ценовая категория (цена билета); по умолчанию - любая.
+
+    Returns:
+        List[Tuple[int, int, int]]: Места (локация, ряд, место) либо пустой список, если мест подряд нет.
+    """
+    if count < 1:
+        return []
+    ticket_rows = TicketRow.objects.filter(inventory__event__sale=sale.pk)
+    if location_id is not None:
+        ticket_rows = ticket_rows.filter(location=location_id)
+    if cost is not None:
+        ticket_rows = ticket_rows.filter(location__in=[
+            location for location, price in ticket_prices(sale.pk).items() if price == cost
+        ])
+    held = dict()
+    for location, row, column in SeatHold.active().filter(inventory__event__sale=sale.pk).values_list('location', 'row', 'column'):
+        held[location, row] = held.get((location, row), 0) | 1 << column - 1
+    for location, row, columns, seats in ticket_rows.order_by('row_number', 'location').values_list(
+        'location_id', 'row_number', 'location__amount', 'seats'
+    ):
+        runs = free_runs(bytes(seats), count, held.get((location, row), 0))
+        if runs:
+            start = nearest_start(runs, max(columns - count, 0) // 2)
+            return [(location, row, start + column + 1) for column in range(count)]
+    return []
+
+
+def checkout_best_seats(sale: Sale, count: int, location_id: Optional[int] = None, cost: Optional[int] = None) -> List[Ticket]:
+    """
+    Продает count соседних мест, подобранных через find_best_seats.
+
+    Если подобранные места успела занять либо удержать другая касса (SeatUnavailable), подбор
+    повторяется. Остальные ошибки (вместимость мероприятия, цены) возвращаются сразу.
+
+    Args:
+        sale (Sale): Продажа.
+        count (int): Количество мест.
+        location_id (Optional[int]): Локация; по умолчанию - любая.
+        cost (Optional[int]): Ценовая категория (цена билета); по умолчанию - любая.
+
+    Returns:
+        List[Ticket]: Созданные билеты.
+
+    Raises:
+        ValidationError: Если свободных мест подряд нет либо продать их не удалось.
+    """
+    for attempt in range(SEAT_UPDATE_ATTEMPTS):
+        seats = find_best_seats(sale, count, location_id, cost)
+        if not seats:
+            raise ValidationError(f'Нет {count} свободных мест подряд')
+        try:
+            return checkout(sale, seats)
+        except SeatUnavailable:
+            if attempt == SEAT_UPDATE_ATTEMPTS - 1:
+                raise
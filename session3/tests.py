@@ -1,9 +1,24 @@
-from django.test import TestCase
+import asyncio
+import base64
+import json
+import threading
+from io import StringIO
+from unittest import mock, skipIf
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection, transaction
+from django.contrib.auth.models import User
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
 from django.core.exceptions import ValidationError
-from .models import Report, ReportRow, Sale, BareSell, Ticket, TicketAvailable, TicketRow
-from session1.models import Event, Location, EventMoneyRelation
+from .models import Report, ReportRow, Sale, SeatHold, SeatInventory, BareSell, Ticket, TicketAvailable, TicketRow, SalesRollup, seats_bitmap, reserve_seats, release_seats, hold_seats, release_expired_holds, ticket_prices, ticket_prices_key
+from .broadcast import SeatBroadcast, seat_events
+from .services import checkout, hold, checkout_best_seats, find_best_seats, free_runs, nearest_start
+from session1.models import Event, EventType, Location, EventMoneyRelation, MoneyEvent, Prostranstvo
 from django.utils import timezone
-from datetime import date, timedelta
+from datetime import date, time, timedelta
 
 class ReportModelTest(TestCase):
     def setUp(self):
@@ -74,3 +89,823 @@ class BareSellModelTest(TestCase):
     def test_bare_sell_str(self):
         self.bare_sell.save()
         self.assertEqual(str(self.bare_sell), '')
+
+
+def create_hall(rows=3, columns=10, locations=1, cost=500):
+    """
+    Создает платное мероприятие в пространстве с локациями и ценами на места.
+
+    Кэш цен очищается: после отката транзакции теста идентификаторы продаж используются повторно.
+    """
+    cache.clear()
+    prostranstvo = Prostranstvo.objects.create(name="Main Hall", volume=rows * columns * locations, loc=True)
+    event = Event.objects.create(
+        date=date.today(),
+        name="Rock Night",
+        type=EventType.objects.create(name="Концерт"),
+        time_started=time(18, 0),
+        time_end=time(21, 0),
+        users_amount=rows * columns * locations,
+        spaces=prostranstvo,
+        is_money=True
+    )
+    money_event = MoneyEvent.objects.create(event=event)
+    for _ in range(locations):
+        location = Location.objects.create(type="Партер", row=rows, amount=columns)
+        location.space.add(prostranstvo)
+        EventMoneyRelation.objects.create(space=location, cost=cost, money_event=money_event)
+    return event
+
+
+class TicketRowSeatsTest(TestCase):
+    def setUp(self):
+        self.event = create_hall(rows=2, columns=10)
+        self.location = Location.objects.get()
+        self.sale = Sale.objects.create(event=self.event)
+
+    def test_seats_bitmap(self):
+        self.assertEqual(seats_bitmap(0), b'')
+        self.assertEqual(seats_bitmap(8), b'\xff')
+        self.assertEqual(seats_bitmap(10), b'\xff\x03')
+
+    def test_sale_creates_rows(self):
+        rows = TicketRow.objects.filter(inventory__event=self.event).order_by('row_number')
+        self.assertEqual([row.row_number for row in rows], [1, 2])
+        self.assertEqual(rows[0].available_numbers, ' '.join(map(str, range(1, 11))))
+
+    def test_reserve_and_release(self):
+        ticket_row = TicketRow.objects.filter(inventory__event=self.event).first()
+        ticket_row.reserve(3)
+        self.assertFalse(ticket_row.is_free(3))
+        self.assertTrue(ticket_row.is_free(4))
+        with self.assertRaises(ValidationError):
+            ticket_row.reserve(3)
+        with self.assertRaises(ValidationError):
+            ticket_row.reserve(11)
+        ticket_row.release(3)
+        self.assertTrue(ticket_row.is_free(3))
+
+    def test_ticket_reserves_seat(self):
+        Ticket.objects.create(sale=self.sale, location=self.location, row=1, column=5)
+        Ticket.objects.create(sale=self.sale, location=self.location, row=1, column=6)
+        ticket_row = TicketRow.objects.get(inventory__event=self.event, row_number=1)
+        self.assertFalse(ticket_row.is_free(5))
+        self.assertFalse(ticket_row.is_free(6))
+        self.assertTrue(ticket_row.is_free(7))
+
+    def test_ticket_clean(self):
+        Ticket.objects.create(sale=self.sale, location=self.location, row=1, column=5)
+        with self.assertRaises(ValidationError):
+            Ticket(sale=self.sale, location=self.location, row=1, column=5).clean()
+        with self.assertRaises(ValidationError):
+            Ticket(sale=self.sale, location=self.location, row=3, column=1).clean()
+        Ticket(sale=self.sale, location=self.location, row=2, column=5).clean()
+
+    def test_ticket_delete_releases_seat(self):
+        ticket = Ticket.objects.create(sale=self.sale, location=self.location, row=2, column=10)
+        ticket.delete()
+        self.assertTrue(TicketRow.objects.get(inventory__event=self.event, row_number=2).is_free(10))
+
+
+class SaleSeatMapCreationTest(TestCase):
+    def test_seat_map_created_with_constant_queries(self):
+        event = create_hall(rows=50, columns=40, locations=3)
+        with self.assertNumQueries(10):
+            Sale.objects.create(event=event)
+        self.assertEqual(TicketRow.objects.filter(inventory__event=event).count(), 150)
+        self.assertTrue(all(row.is_free(40) and not row.is_free(41) for row in TicketRow.objects.filter(inventory__event=event)))
+
+    def test_seat_map_shared_by_sales(self):
+        event = create_hall(rows=2, columns=10)
+        location = Location.objects.get()
+        sale = Sale.objects.create(event=event)
+        with self.assertNumQueries(4):
+            other_sale = Sale.objects.create(event=event)
+        self.assertEqual(TicketRow.objects.count(), 2)
+        Ticket.objects.create(sale=sale, location=location, row=1, column=5)
+        with self.assertRaises(ValidationError):
+            Ticket(sale=other_sale, location=location, row=1, column=5).clean()
+        with self.assertRaises(ValidationError):
+            reserve_seats(other_sale, location, [(1, 5)])
+        self.assertEqual(SeatInventory.objects.get(event=event).version, 1)
+
+
+class ReserveSeatsTest(TestCase):
+    def setUp(self):
+        self.event = create_hall(rows=2, columns=10)
+        self.location = Location.objects.get()
+        self.sale = Sale.objects.create(event=self.event)
+
+    def test_reserve_batch(self):
+        reserve_seats(self.sale, self.location, [(1, 1), (1, 2), (2, 1)])
+        rows = {row.row_number: row for row in TicketRow.objects.filter(inventory__event=self.event)}
+        self.assertEqual(rows[1].available_numbers, '3 4 5 6 7 8 9 10')
+        self.assertFalse(rows[2].is_free(1))
+        self.assertEqual(rows[1].version, 1)
+
+    def test_reserve_batch_is_atomic(self):
+        reserve_seats(self.sale, self.location, [(2, 5)])
+        with self.assertRaises(ValidationError):
+            reserve_seats(self.sale, self.location, [(1, 1), (2, 5)])
+        self.assertTrue(TicketRow.objects.get(inventory__event=self.event, row_number=1).is_free(1))
+
+    def test_reserve_duplicate_seat(self):
+        with self.assertRaises(ValidationError):
+            reserve_seats(self.sale, self.location, [(1, 1), (1, 1)])
+
+    def test_reserve_missing_row(self):
+        with self.assertRaises(ValidationError):
+            reserve_seats(self.sale, self.location, [(3, 1)])
+
+    def test_release(self):
+        reserve_seats(self.sale, self.location, [(1, 4)])
+        release_seats(self.sale, self.location, [(1, 4)])
+        self.assertTrue(TicketRow.objects.get(inventory__event=self.event, row_number=1).is_free(4))
+
+
+@skipIf(
+    connection.vendor == 'sqlite' and connection.is_in_memory_db(),
+    'Нужна файловая SQLite (WAL) либо PostgreSQL'
+)
+class ReserveSeatsConcurrencyTest(TransactionTestCase):
+    writers = 32
+
+    def setUp(self):
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode=WAL')
+        self.event = create_hall(rows=1, columns=16)
+        self.location = Location.objects.get()
+        self.sale = Sale.objects.create(event=self.event)
+
+    def test_no_double_sales(self):
+        barrier = threading.Barrier(self.writers)
+        sold = []
+
+        def writer(number):
+            seats = [(1, number % 16 + 1), (1, (number + 1) % 16 + 1)]
+            barrier.wait()
+            try:
+                reserve_seats(self.sale.id, self.location.id, seats)
+                sold.extend(seats)
+            except ValidationError:
+                pass
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=writer, args=(number,)) for number in range(self.writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        ticket_row = TicketRow.objects.get(inventory__event=self.event)
+        self.assertTrue(sold)
+        self.assertEqual(len(sold), len(set(sold)))
+        self.assertEqual(
+            {column for _, column in sold},
+            {column for column in range(1, 17) if not ticket_row.is_free(column)}
+        )
+
+
+class CreateReportTest(TestCase):
+    def setUp(self):
+        self.event = create_hall(rows=2, columns=10)
+        self.other_event = create_hall(rows=2, columns=10)
+        self.location = Location.objects.filter(space=self.event.spaces).get()
+        sales = [Sale.objects.create(event=self.event) for _ in range(3)]
+        Sale.objects.create(event=self.other_event)
+        Ticket.objects.bulk_create([
+            Ticket(sale=sale, location=self.location, row=1, column=column, cost=cost)
+            for sale in sales
+            for column, cost in [(1, 500), (2, 500), (3, 800)]
+        ])
+        SalesRollup.rebuild()
+
+    def test_report_rows(self):
+        with self.assertNumQueries(3):
+            report = Report.objects.create(
+                date_started=date.today() - timedelta(days=1),
+                date_end=date.today() + timedelta(days=1)
+            )
+        rows = {row.event_id: row for row in ReportRow.objects.filter(report=report)}
+        self.assertEqual(rows[self.event.id].amount, 9)
+        self.assertEqual(rows[self.event.id].cost, 3 * (500 + 500 + 800))
+        self.assertEqual(
+            rows[self.event.id].description,
+            'Цена:500 - Количество проданных билетов: 6\nЦена:800 - Количество проданных билетов: 3\n'
+        )
+        self.assertNotIn(self.other_event.id, rows)
+
+    def test_report_outside_period(self):
+        report = Report.objects.create(
+            date_started=date.today() + timedelta(days=1),
+            date_end=date.today() + timedelta(days=7)
+        )
+        self.assertFalse(ReportRow.objects.filter(report=report).exists())
+
+
+class TicketPriceTest(TestCase):
+    def setUp(self):
+        self.event = create_hall(rows=2, columns=10, cost=500)
+        self.location = Location.objects.get()
+        other = Event.objects.create(
+            date=date.today(), name='Jazz Night', type=self.event.type, time_started=time(10, 0),
+            time_end=time(12, 0), users_amount=20, spaces=self.event.spaces, is_money=True
+        )
+        EventMoneyRelation.objects.create(space=self.location, cost=900, money_event=MoneyEvent.objects.create(event=other))
+        self.sale = Sale.objects.create(event=self.event)
+        self.other_sale = Sale.objects.create(event=other)
+
+    def test_price_is_scoped_to_event(self):
+        self.assertEqual(Ticket.objects.create(sale=self.sale, location=self.location, row=1, column=1).cost, 500)
+        self.assertEqual(Ticket.objects.create(sale=self.other_sale, location=self.location, row=1, column=1).cost, 900)
+
+    def test_ticket_saved_once(self):
+        Ticket.objects.create(sale=self.sale, location=self.location, row=1, column=1)
+        with self.assertNumQueries(11):
+            ticket = Ticket.objects.create(sale=self.sale, location=self.location, row=1, column=2)
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.cost, 500)
+        self.assertEqual(SalesRollup.objects.get(event=self.event, cost=500).amount, 2)
+
+    def test_price_change_resets_cache(self):
+        Ticket.objects.create(sale=self.sale, location=self.location, row=1, column=1)
+        EventMoneyRelation.objects.filter(money_event__event=self.event).get().delete()
+        EventMoneyRelation.objects.create(space=self.location, cost=700, money_event=MoneyEvent.objects.get(event=self.event))
+        self.assertEqual(Ticket.objects.create(sale=self.sale, location=self.location, row=1, column=2).cost, 700)
+
+    def test_price_cache_reset_after_commit(self):
+        price = EventMoneyRelation.objects.get(money_event__event=self.event)
+        with self.captureOnCommitCallbacks(execute=True):
+            price.cost = 800
+            price.save()
+            # Параллельный запрос до фиксации транзакции видит старую цену и кладет ее в кэш.
+            cache.set(ticket_prices_key(self.sale.pk), {self.location.pk: 500})
+        self.assertEqual(ticket_prices(self.sale.pk), {self.location.pk: 800})
+
+    def test_moved_price_resets_both_events(self):
+        self.assertEqual(ticket_prices(self.other_sale.pk), {self.location.pk: 900})
+        EventMoneyRelation.objects.filter(money_event__event=self.event).get().delete()
+        self.assertEqual(ticket_prices(self.sale.pk), {})
+        price = EventMoneyRelation.objects.get()
+        price.money_event = MoneyEvent.objects.get(event=self.event)
+        price.save()
+        self.assertEqual(ticket_prices(self.other_sale.pk), {})
+        self.assertEqual(ticket_prices(self.sale.pk), {self.location.pk: 900})
+
+
+class CheckoutTest(TestCase):
+    def setUp(self):
+        self.event = create_hall(rows=5, columns=20, locations=2, cost=500)
+        self.locations = list(Location.objects.order_by('pk'))
+        EventMoneyRelation.objects.filter(space=self.locations[1]).update(cost=800)
+        self.sale = Sale.objects.create(event=self.event)
+
+    def test_group_checkout(self):
+        seats = [(self.locations[0].pk, row, column) for row in (1, 2, 3) for column in range(1, 21)]
+        seats.append((self.locations[1].pk, 1, 1))
+        with self.assertNumQueries(27):
+            tickets = checkout(self.sale, seats)
+        self.assertEqual(len(tickets), 61)
+        self.assertEqual(Ticket.objects.filter(sale=self.sale).count(), 61)
+        self.assertFalse(TicketRow.objects.get(inventory__event=self.event, location=self.locations[0], row_number=2).is_free(7))
+        self.assertEqual(SalesRollup.objects.get(event=self.event, cost=500).amount, 60)
+        self.assertEqual(SalesRollup.objects.get(event=self.event, cost=800).revenue, 800)
+
+    def test_checkout_is_atomic(self):
+        Ticket.objects.create(sale=self.sale, location=self.locations[1], row=1, column=1)
+        with self.assertRaises(ValidationError):
+            checkout(self.sale, [(self.locations[0].pk, 1, 1), (self.locations[1].pk, 1, 1)])
+        self.assertEqual(Ticket.objects.filter(sale=self.sale).count(), 1)
+        self.assertTrue(TicketRow.objects.get(inventory__event=self.event, location=self.locations[0], row_number=1).is_free(1))
+        with self.assertRaises(ValidationError):
+            checkout(self.sale, [(self.locations[0].pk, 1, 1), (self.locations[0].pk, 1, 1)])
+        with self.assertRaises(ValidationError):
+            checkout(self.sale, [(self.locations[0].pk, 6, 1)])
+
+    def test_checkout_endpoint(self):
+        url = reverse('session3:sale-checkout', args=[self.sale.pk])
+        body = json.dumps({'seats': [{'location': self.locations[0].pk, 'row': 1, 'column': column} for column in (1, 2)]})
+        self.assertEqual(self.client.post(url, body, content_type='application/json').status_code, 302)
+        self.client.force_login(User.objects.create_user('cashier', password='cashier', is_staff=True))
+        response = self.client.post(url, body, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['total'], 1000)
+        response = self.client.post(url, body, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], ['Место уже занято либо не существует'])
+        self.assertEqual(self.client.post(url, '{"seats": [{}]}', content_type='application/json').status_code, 400)
+
+
+class BestSeatsTest(TestCase):
+    def setUp(self):
+        self.event = create_hall(rows=3, columns=10, locations=2, cost=500)
+        self.locations = list(Location.objects.order_by('pk'))
+        EventMoneyRelation.objects.filter(space=self.locations[1]).update(cost=800)
+        self.sale = Sale.objects.create(event=self.event)
+
+    def test_free_runs_matches_scan(self):
+        for seats in (b'\xff\x03', b'\xf3\x01', b'\x00\x00', b'\x5b\x7e\x0f'):
+            free = [index * 8 + bit for index, byte in enumerate(seats) for bit in range(8) if byte >> bit & 1]
+            for count in range(1, 10):
+                expected = {start for start in free if all(start + shift in free for shift in range(count))}
+                runs = free_runs(seats, count)
+                self.assertEqual({bit for bit in range(runs.bit_length()) if runs >> bit & 1}, expected)
+
+    def test_nearest_start(self):
+        self.assertEqual(nearest_start(0b1000001, 4), 6)
+        self.assertEqual(nearest_start(0b1000001, 2), 0)
+        self.assertEqual(nearest_start(0b10000, 4), 4)
+
+    def test_best_row_and_center(self):
+        self.assertEqual(find_best_seats(self.sale, 2), [(self.locations[0].pk, 1, 5), (self.locations[0].pk, 1, 6)])
+        checkout(self.sale, [(self.locations[0].pk, 1, column) for column in (2, 5, 8)])
+        self.assertEqual(find_best_seats(self.sale, 2)[0], (self.locations[0].pk, 1, 6))
+        self.assertEqual(find_best_seats(self.sale, 3)[0], (self.locations[1].pk, 1, 4))
+        self.assertEqual(find_best_seats(self.sale, 3, cost=500)[0], (self.locations[0].pk, 2, 4))
+        self.assertEqual(find_best_seats(self.sale, 3, cost=800)[0], (self.locations[1].pk, 1, 4))
+        self.assertEqual(find_best_seats(self.sale, 3, location_id=self.locations[1].pk)[0][0], self.locations[1].pk)
+        self.assertEqual(find_best_seats(self.sale, 11), [])
+        self.assertEqual(find_best_seats(self.sale, 2, cost=100), [])
+
+    def test_checkout_best_seats(self):
+        tickets = checkout_best_seats(self.sale, 10, cost=500)
+        self.assertEqual([(ticket.row, ticket.column) for ticket in tickets], [(1, column) for column in range(1, 11)])
+        self.assertEqual(checkout_best_seats(self.sale, 10, cost=500)[0].row, 2)
+        with self.assertRaises(ValidationError):
+            checkout_best_seats(self.sale, 11)
+
+    def test_checkout_best_seats_retries_taken_seats(self):
+        location = self.locations[0].pk
+        checkout(self.sale, [(location, 1, 5)])
+        found = [[(location, 1, 5), (location, 1, 6)], [(location, 1, 6), (location, 1, 7)]]
+        with mock.patch('session3.services.find_best_seats', side_effect=found) as find:
+            tickets = checkout_best_seats(self.sale, 2)
+        self.assertEqual(find.call_count, 2)
+        self.assertEqual([ticket.column for ticket in tickets], [6, 7])
+
+    def test_checkout_best_seats_capacity_is_not_retried(self):
+        SeatInventory.objects.filter(event=self.event).update(sold=self.event.seat_inventory.capacity)
+        with self.assertNumQueries(7):
+            with self.assertRaisesMessage(ValidationError, 'Слишком много билетов продано'):
+                checkout_best_seats(self.sale, 2)
+        self.assertFalse(Ticket.objects.exists())
+
+    def test_admin_action(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='admin'))
+        response = self.client.post(reverse('admin:session3_sale_changelist'), {
+            'action': 'sell_best_seats',
+            '_selected_action': [self.sale.pk],
+            'seats_count': 4,
+            'location': self.locations[1].pk,
+        }, follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(Ticket.objects.filter(sale=self.sale).values_list('location', 'row', 'column')),
+            [(self.locations[1].pk, 1, column) for column in range(4, 8)]
+        )
+
+
+class SeatHoldTest(TestCase):
+    def setUp(self):
+        self.event = create_hall(rows=2, columns=10)
+        self.location = Location.objects.get()
+        self.sale = Sale.objects.create(event=self.event)
+        self.other_sale = Sale.objects.create(event=self.event)
+
+    def test_hold_blocks_other_buyers(self):
+        token = hold_seats(self.sale, self.location, [(1, 1), (1, 2)])
+        self.assertTrue(TicketRow.objects.get(inventory__event=self.event, row_number=1).is_free(1))
+        with self.assertRaises(ValidationError):
+            reserve_seats(self.other_sale, self.location, [(1, 2)])
+        with self.assertRaises(ValidationError):
+            hold_seats(self.other_sale, self.location, [(1, 2), (1, 3)])
+        with self.assertRaises(ValidationError):
+            Ticket(sale=self.other_sale, location=self.location, row=1, column=1).clean()
+        self.assertEqual(SeatHold.objects.count(), 2)
+        tickets = checkout(self.sale, [(self.location.pk, 1, 1), (self.location.pk, 1, 2)], token)
+        self.assertEqual(len(tickets), 2)
+        self.assertFalse(SeatHold.objects.exists())
+        self.assertFalse(TicketRow.objects.get(inventory__event=self.event, row_number=1).is_free(2))
+
+    def test_hold_is_atomic(self):
+        Ticket.objects.create(sale=self.sale, location=self.location, row=2, column=1)
+        with self.assertRaises(ValidationError):
+            hold(self.sale, [(self.location.pk, 1, 1), (self.location.pk, 2, 1)])
+        self.assertFalse(SeatHold.objects.exists())
+
+    def test_expired_hold(self):
+        hold_seats(self.sale, self.location, [(1, 5)], timeout=-1)
+        reserve_seats(self.other_sale, self.location, [(1, 6)])
+        token = hold_seats(self.other_sale, self.location, [(1, 5)])
+        self.assertEqual(list(SeatHold.objects.values_list('token', flat=True)), [token])
+
+    def test_sweep(self):
+        hold(self.sale, [(self.location.pk, 1, column) for column in range(1, 6)], timeout=-1)
+        hold(self.sale, [(self.location.pk, 2, 1)])
+        version = SeatInventory.objects.get(event=self.event).version
+        with self.assertNumQueries(5):
+            self.assertEqual(release_expired_holds(), 5)
+        self.assertEqual(SeatHold.objects.count(), 1)
+        self.assertEqual(SeatInventory.objects.get(event=self.event).version, version + 1)
+        out = StringIO()
+        call_command('sweep_seat_holds', stdout=out)
+        self.assertIn('0', out.getvalue())
+
+    def test_availability_respects_holds(self):
+        hold(self.sale, [(self.location.pk, 1, column) for column in range(4, 8)])
+        self.assertEqual(find_best_seats(self.sale, 3), [(self.location.pk, 1, 1), (self.location.pk, 1, 2), (self.location.pk, 1, 3)])
+        self.client.force_login(User.objects.create_user('cashier', password='cashier', is_staff=True))
+        data = self.client.get(reverse('session3:sale-seats', args=[self.sale.pk])).json()
+        self.assertEqual(base64.b64decode(data['locations'][0]['rows'][0]['seats']), b'\x87\x03')
+
+    def test_hold_endpoint(self):
+        self.client.force_login(User.objects.create_user('cashier', password='cashier', is_staff=True))
+        body = {'seats': [{'location': self.location.pk, 'row': 1, 'column': 1}]}
+        response = self.client.post(reverse('session3:sale-hold', args=[self.sale.pk]), json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        body['hold'] = response.json()['hold']
+        response = self.client.post(reverse('session3:sale-checkout', args=[self.other_sale.pk]), json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(SeatHold.objects.exists())
+
+
+class SoldCounterTest(TestCase):
+    def setUp(self):
+        self.event = create_hall(rows=2, columns=10)
+        self.location = Location.objects.get()
+        self.event.users_amount = 5
+        self.event.save()
+        self.sale = Sale.objects.create(event=self.event)
+
+    def inventory(self):
+        return SeatInventory.objects.get(event=self.event)
+
+    def test_capacity(self):
+        self.assertEqual(self.inventory().capacity, 5)
+        self.event.users_amount = 30
+        self.event.save()
+        self.assertEqual(self.inventory().capacity, 20)
+        self.event.spaces.volume = 3
+        self.event.spaces.save()
+        self.assertEqual(self.inventory().capacity, 3)
+
+    def test_tickets_and_bare_sells_share_capacity(self):
+        Ticket.objects.create(sale=self.sale, location=self.location, row=1, column=1)
+        checkout(self.sale, [(self.location.pk, 1, 2), (self.location.pk, 1, 3)])
+        BareSell.objects.create(sell=self.sale, money=100)
+        bare_sell = BareSell.objects.create(sell=self.sale, money=100)
+        self.assertEqual(self.inventory().sold, 5)
+        with self.assertRaises(ValidationError):
+            BareSell(sell=self.sale, money=100).clean()
+        with self.assertRaises(ValidationError):
+            BareSell.objects.create(sell=self.sale, money=100)
+        with self.assertRaises(ValidationError):
+            Ticket(sale=self.sale, location=self.location, row=2, column=1).clean()
+        with self.assertRaises(ValidationError):
+            checkout(self.sale, [(self.location.pk, 2, 1)])
+        self.assertEqual(BareSell.objects.count(), 2)
+        self.assertTrue(TicketRow.objects.get(inventory__event=self.event, row_number=2).is_free(1))
+        bare_sell.delete()
+        self.assertEqual(self.inventory().sold, 4)
+        BareSell(sell=self.sale, money=100).clean()
+
+    def test_counter_drift_is_logged(self):
+        bare_sell = BareSell.objects.create(sell=self.sale, money=100)
+        SeatInventory.objects.filter(event=self.event).update(sold=0)
+        with self.assertLogs('session3.models', 'WARNING') as logs:
+            bare_sell.delete()
+        self.assertIn(f'мероприятия {self.event.pk}', logs.output[0])
+        self.assertFalse(BareSell.objects.exists())
+        self.assertEqual(self.inventory().sold, 0)
+
+
+class SoldCounterAutocommitTest(TransactionTestCase):
+    def setUp(self):
+        self.event = create_hall(rows=1, columns=10)
+        self.location = Location.objects.get()
+        self.sale = Sale.objects.create(event=self.event)
+
+    def sold(self):
+        return SeatInventory.objects.get(event=self.event).sold
+
+    def test_taken_seat_rolls_back_ticket(self):
+        Ticket.objects.create(sale=self.sale, location=self.location, row=1, column=1)
+        with self.assertRaises(ValidationError):
+            Ticket.objects.create(sale=self.sale, location=self.location, row=1, column=1)
+        self.assertEqual(Ticket.objects.count(), 1)
+        self.assertEqual(self.sold(), 1)
+
+    def test_failed_bare_sell_rolls_back_counter(self):
+        with mock.patch.object(SalesRollup, 'add', side_effect=OperationalError):
+            with self.assertRaises(OperationalError):
+                BareSell.objects.create(sell=self.sale, money=100)
+        self.assertFalse(BareSell.objects.exists())
+        self.assertEqual(self.sold(), 0)
+
+
+@skipIf(
+    connection.vendor == 'sqlite' and connection.is_in_memory_db(),
+    'Нужна файловая SQLite (WAL) либо PostgreSQL'
+)
+class SoldCounterConcurrencyTest(TransactionTestCase):
+    writers = 32
+
+    def setUp(self):
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode=WAL')
+        self.event = create_hall(rows=1, columns=10)
+        self.sale = Sale.objects.create(event=self.event)
+
+    def test_no_oversell(self):
+        barrier = threading.Barrier(self.writers)
+
+        def writer():
+            barrier.wait()
+            for attempt in range(20):
+                try:
+                    with transaction.atomic():
+                        BareSell.objects.create(sell_id=self.sale.id, money=100)
+                    break
+                except ValidationError:
+                    break
+                except OperationalError:
+                    continue
+            connection.close()
+
+        threads = [threading.Thread(target=writer) for _ in range(self.writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(BareSell.objects.count(), 10)
+        self.assertEqual(SeatInventory.objects.get(event=self.event).sold, 10)
+
+
+class SeatMapViewTest(TestCase):
+    def setUp(self):
+        self.event = create_hall(rows=2, columns=10, locations=2)
+        self.locations = list(Location.objects.order_by('pk'))
+        self.sale = Sale.objects.create(event=self.event)
+        self.client.force_login(User.objects.create_user('cashier', password='cashier', is_staff=True))
+        self.url = reverse('session3:sale-seats', args=[self.sale.pk])
+
+    def test_seat_map(self):
+        Ticket.objects.create(sale=self.sale, location=self.locations[0], row=1, column=3)
+        data = self.client.get(self.url).json()
+        self.assertEqual(data['version'], 1)
+        self.assertEqual([location['location'] for location in data['locations']], [location.pk for location in self.locations])
+        first_row = data['locations'][0]['rows'][0]
+        self.assertEqual((first_row['row'], data['locations'][0]['columns']), (1, 10))
+        self.assertEqual(base64.b64decode(first_row['seats']), b'\xfb\x03')
+        data = self.client.get(reverse('session3:sale-location-seats', args=[self.sale.pk, self.locations[1].pk])).json()
+        self.assertEqual([location['location'] for location in data['locations']], [self.locations[1].pk])
+
+    def test_etag(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        checkout(self.sale, [(self.locations[0].pk, 1, 1), (self.locations[1].pk, 2, 2)])
+        self.assertEqual(SeatInventory.objects.get(event=self.event).version, 2)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_changes_when_hold_expires(self):
+        hold_seats(self.sale, self.locations[0], [(1, 1)], timeout=60)
+        hold_seats(self.sale, self.locations[0], [(1, 2)], timeout=120)
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(seconds=90)):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(base64.b64decode(response.json()['locations'][0]['rows'][0]['seats']), b'\xfd\x03')
+
+    def test_requires_staff(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+
+class SeatBroadcastTest(TestCase):
+    def test_publish_from_thread(self):
+        async def scenario():
+            broadcast = SeatBroadcast()
+            subscriptions = [broadcast.subscribe(1) for _ in range(300)]
+            other = broadcast.subscribe(2)
+            thread = threading.Thread(target=broadcast.publish, args=(1, 'message'))
+            thread.start()
+            thread.join()
+            messages = await asyncio.gather(*(subscription.get() for subscription in subscriptions))
+            self.assertEqual(set(messages), {'message'})
+            self.assertTrue(other.queue.empty())
+            for subscription in subscriptions:
+                broadcast.unsubscribe(subscription)
+            self.assertFalse(broadcast.has_subscribers(1))
+            self.assertEqual(broadcast.publish(1, 'message'), 0)
+        asyncio.run(scenario())
+
+    def test_overflow(self):
+        async def scenario():
+            subscription = SeatBroadcast().subscribe(1)
+            for number in range(subscription.queue.maxsize + 1):
+                subscription.put(str(number))
+            subscription.put('late')
+            self.assertIsNone(await subscription.get())
+            self.assertTrue(subscription.queue.empty())
+        asyncio.run(scenario())
+
+
+class SeatEventsTest(TestCase):
+    def setUp(self):
+        other_event = create_hall(rows=2, columns=10)
+        self.event = create_hall(rows=2, columns=10)
+        self.location = Location.objects.get(space=self.event.spaces)
+        # Карта мест другого мероприятия создается раньше продаж, чтобы идентификаторы
+        # карт мест и продаж не совпадали.
+        self.other_inventory_id = SeatInventory.for_event(other_event.pk).pk
+        self.sale = Sale.objects.create(event=self.event)
+        self.other_sale = Sale.objects.create(event=other_event)
+        self.inventory_id = SeatInventory.for_event(self.event.pk).pk
+        self.assertNotEqual(self.inventory_id, self.sale.pk)
+
+    def test_ticket_publishes_on_commit(self):
+        async def subscribe():
+            return seat_events.subscribe(self.inventory_id)
+        loop = asyncio.new_event_loop()
+        subscription = loop.run_until_complete(subscribe())
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                Ticket.objects.create(
+                    sale=self.other_sale, location=Location.objects.exclude(pk=self.location.pk).get(), row=1, column=3
+                )
+            self.assertTrue(subscription.queue.empty())
+            with self.captureOnCommitCallbacks(execute=True):
+                ticket = Ticket.objects.create(sale=self.sale, location=self.location, row=1, column=3)
+            with self.captureOnCommitCallbacks(execute=True):
+                ticket.delete()
+            messages = [loop.run_until_complete(asyncio.wait_for(subscription.get(), 1)) for _ in range(2)]
+            self.assertTrue(subscription.queue.empty())
+        finally:
+            seat_events.unsubscribe(subscription)
+            loop.close()
+        data = [json.loads(message.split('data: ')[1]) for message in messages]
+        self.assertEqual([item['action'] for item in data], ['reserved', 'released'])
+        self.assertEqual(data[0]['seats'], [[1, 3]])
+        self.assertEqual([item['version'] for item in data], [1, 2])
+        self.assertTrue(messages[0].startswith('id: 1\n'))
+
+    def test_expired_holds_publish_released(self):
+        async def subscribe():
+            return seat_events.subscribe(self.inventory_id)
+        loop = asyncio.new_event_loop()
+        subscription = loop.run_until_complete(subscribe())
+        other_location = Location.objects.exclude(pk=self.location.pk).get()
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                hold_seats(self.sale, self.location, [(1, 1), (2, 4)], timeout=60)
+                hold_seats(self.other_sale, other_location, [(1, 1)], timeout=60)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(release_expired_holds(timezone.now() + timedelta(seconds=61)), 3)
+            messages = [loop.run_until_complete(asyncio.wait_for(subscription.get(), 1)) for _ in range(2)]
+            self.assertTrue(subscription.queue.empty())
+        finally:
+            seat_events.unsubscribe(subscription)
+            loop.close()
+        held, released = [json.loads(message.split('data: ')[1]) for message in messages]
+        self.assertEqual((held['action'], held['seats']), ('held', [[1, 1], [2, 4]]))
+        self.assertIn('expires_at', held)
+        self.assertEqual((released['action'], released['seats']), ('released', [[1, 1], [2, 4]]))
+        self.assertEqual(released['version'], held['version'] + 1)
+
+    def test_no_subscribers_no_extra_queries(self):
+        with self.assertNumQueries(15):
+            Ticket.objects.create(sale=self.sale, location=self.location, row=1, column=3)
+
+    async def test_stream(self):
+        user = await sync_to_async(User.objects.create_user)('cashier', password='cashier', is_staff=True)
+        await self.async_client.aforce_login(user)
+        response = await self.async_client.get(reverse('session3:sale-seat-events', args=[self.sale.pk]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        self.assertIn(b'event: version', await anext(stream))
+        self.assertTrue(seat_events.has_subscribers(self.inventory_id))
+        self.assertFalse(seat_events.has_subscribers(self.other_inventory_id))
+        seat_events.publish(self.other_inventory_id, 'event: seats\ndata: {"other": true}\n\n')
+        seat_events.publish(self.inventory_id, 'event: seats\ndata: {}\n\n')
+        self.assertEqual(await anext(stream), b'event: seats\ndata: {}\n\n')
+        waiting = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        self.assertFalse(seat_events.has_subscribers(self.inventory_id))
+
+    async def test_stream_requires_staff(self):
+        response = await self.async_client.get(reverse('session3:sale-seat-events', args=[self.sale.pk]))
+        self.assertEqual(response.status_code, 403)
+
+
+class SalesRollupTest(TestCase):
+    def setUp(self):
+        self.event = create_hall(rows=2, columns=10, cost=500)
+        self.location = Location.objects.get()
+        self.sale = Sale.objects.create(event=self.event)
+
+    def test_ticket_updates_rollup(self):
+        ticket = Ticket.objects.create(sale=self.sale, location=self.location, row=1, column=1)
+        Ticket.objects.create(sale=self.sale, location=self.location, row=1, column=2)
+        rollup = SalesRollup.objects.get(event=self.event, cost=500)
+        self.assertEqual((rollup.date, rollup.amount, rollup.revenue), (date.today(), 2, 1000))
+        ticket.delete()
+        rollup.refresh_from_db()
+        self.assertEqual((rollup.amount, rollup.revenue), (1, 500))
+
+    def test_bare_sell_updates_rollup(self):
+        bare_sell = BareSell.objects.create(sell=self.sale, money=300)
+        self.assertEqual(SalesRollup.objects.get(event=self.event, cost=300).amount, 1)
+        bare_sell.delete()
+        self.assertEqual(SalesRollup.objects.get(event=self.event, cost=300).amount, 0)
+
+    def test_edit_then_delete_moves_rollup(self):
+        bare_sell = BareSell.objects.create(sell=self.sale, money=100)
+        ticket = Ticket.objects.create(sale=self.sale, location=self.location, row=1, column=1)
+        bare_sell.money = 200
+        bare_sell.save()
+        ticket.cost = 700
+        ticket.save()
+        amounts = dict(SalesRollup.objects.filter(event=self.event).values_list('cost', 'amount'))
+        self.assertEqual(amounts, {100: 0, 200: 1, 500: 0, 700: 1})
+        bare_sell.delete()
+        ticket.delete()
+        self.assertEqual(set(SalesRollup.objects.filter(event=self.event).values_list('amount', 'revenue')), {(0, 0)})
+        call_command('rebuild_sales_rollup', '--check', stdout=StringIO())
+
+    def test_sale_event_change_moves_rollup(self):
+        Ticket.objects.create(sale=self.sale, location=self.location, row=1, column=1)
+        BareSell.objects.create(sell=self.sale, money=300)
+        other = create_hall(rows=1, columns=10)
+        self.sale.event = other
+        self.sale.save()
+        self.assertEqual(set(SalesRollup.objects.filter(event=self.event).values_list('amount', flat=True)), {0})
+        self.assertEqual(dict(SalesRollup.objects.filter(event=other).values_list('cost', 'amount')), {300: 1, 500: 1})
+        call_command('rebuild_sales_rollup', '--check', stdout=StringIO())
+
+    def test_sale_delete_updates_rollup(self):
+        Ticket.objects.create(sale=self.sale, location=self.location, row=1, column=1)
+        self.sale.delete()
+        self.assertEqual(SalesRollup.objects.get(event=self.event, cost=500).amount, 0)
+
+    def test_report_includes_bare_sells(self):
+        Ticket.objects.create(sale=self.sale, location=self.location, row=1, column=1)
+        BareSell.objects.create(sell=self.sale, money=300)
+        report = Report.objects.create(date_started=date.today(), date_end=date.today())
+        row = ReportRow.objects.get(report=report)
+        self.assertEqual((row.amount, row.cost), (2, 800))
+
+    def test_rebuild_command(self):
+        Ticket.objects.create(sale=self.sale, location=self.location, row=1, column=1)
+        SalesRollup.objects.update(amount=5)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_sales_rollup', '--check', stdout=StringIO(), stderr=StringIO())
+        call_command('rebuild_sales_rollup', stdout=StringIO())
+        self.assertEqual(SalesRollup.objects.get(event=self.event).amount, 1)
+        call_command('rebuild_sales_rollup', '--check', stdout=StringIO())
+
+
+class AdminQueryBudgetTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='admin'))
+        for _ in range(2):
+            self.event = create_hall(rows=3, columns=10, locations=2)
+            locations = list(Location.objects.filter(space=self.event.spaces))
+            for column in range(1, 4):
+                self.sale = Sale.objects.create(event=self.event)
+                for location in locations:
+                    Ticket.objects.create(sale=self.sale, location=location, row=1, column=column)
+                BareSell.objects.create(sell=self.sale, money=300)
+        self.report = Report.objects.create(date_started=date.today(), date_end=date.today())
+
+    def assertPageQueries(self, number, url):
+        with self.assertNumQueries(number):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_changelists(self):
+        for model, number in [(Report, 5), (Sale, 7), (SeatInventory, 5)]:
+            with self.subTest(model=model.__name__):
+                self.assertPageQueries(number, reverse(f'admin:session3_{model._meta.model_name}_changelist'))
+
+    def test_change_forms(self):
+        for model, pk, number in [
+            (Report, self.report.pk, 7),
+            (Sale, self.sale.pk, 11),
+            (SeatInventory, self.event.seat_inventory.pk, 8),
+        ]:
+            with self.subTest(model=model.__name__):
+                self.assertPageQueries(number, reverse(f'admin:session3_{model._meta.model_name}_change', args=[pk]))
@@ -0,0 +1,12 @@
+from django.urls import path
+from . import views
+
+app_name = 'session3'
+
+urlpatterns = [
+    path('sales/<int:sale_id>/hold/', views.sale_hold, name='sale-hold'),
+    path('sales/<int:sale_id>/checkout/', views.sale_checkout, name='sale-checkout'),
+    path('sales/<int:sale_id>/seats/', views.sale_seats, name='sale-seats'),
+    path('sales/<int:sale_id>/seats/events/', views.sale_seat_events, name='sale-seat-events'),
+    path('sales/<int:sale_id>/locations/<int:location_id>/seats/', views.sale_seats, name='sale-location-seats'),
+]
@@ -1,3 +1,243 @@
-from django.shortcuts import render
+import asyncio
+import base64
+import json
+import uuid
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import ValidationError
+from django.db.models import Min, Q
+from django.http import Http404, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.views.decorators.http import condition, require_GET, require_POST
+from .broadcast import seat_events, sse_message
+from .models import Sale, SeatHold, SeatInventory, TicketRow
+from .services import checkout, hold
 
-# Create your views here.
+
+KEEPALIVE_INTERVAL = 15
+RECONNECT_DELAY = 3000
+SEATS_FORMAT_ERROR = 'Ожидается JSON со списком мест seats (location, row, column)'
+
+
+def read_seats(request):
+    """
+    Читает из JSON запроса список мест и идентификатор удержания.
+
+    Args:
+        request (HttpRequest): Запрос с JSON вида {"seats": [{"location": 1, "row": 2, "column": 5}, ...], "hold": "..."}.
+
+    Returns:
+        Tuple[list, Optional[UUID]]: Места (локация, ряд, место) и удержание, если оно передано.
+
+    Raises:
+        ValueError: Если JSON имеет неверный формат.
+    """
+    try:
+        payload = json.loads(request.body)
+        seats = [
+            (int(seat['location']), int(seat['row']), int(seat['column']))
+            for seat in payload['seats']
+        ]
+        hold_token = uuid.UUID(payload['hold']) if payload.get('hold') else None
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise ValueError(SEATS_FORMAT_ERROR)
+    return seats, hold_token
+
+
+@require_POST
+@staff_member_required
+def sale_hold(request, sale_id):
+    """
+    Удерживает места продажи на время оплаты.
+
+    Принимает JSON вида {"seats": [{"location": 1, "row": 2, "column": 5}, ...]}
+    и возвращает идентификатор удержания, который затем передается в оформление продажи.
+
+    Args:
+        request (HttpRequest): Запрос сотрудника.
+        sale_id (int): Идентификатор продажи.
+
+    Returns:
+        JsonResponse: Идентификатор удержания (201) либо ошибки (400).
+    """
+    sale = get_object_or_404(Sale, pk=sale_id)
+    try:
+        seats, _ = read_seats(request)
+        hold_token = hold(sale, seats)
+    except ValueError as e:
+        return JsonResponse({'errors': [str(e)]}, status=400)
+    except ValidationError as e:
+        return JsonResponse({'errors': e.messages}, status=400)
+    expires_at = SeatHold.objects.filter(token=hold_token).values_list('expires_at', flat=True).first()
+    return JsonResponse({'hold': str(hold_token), 'expires_at': expires_at.isoformat()}, status=201)
+
+
+@require_POST
+@staff_member_required
+def sale_checkout(request, sale_id):
+    """
+    Продает несколько мест одной продажи.
+
+    Принимает JSON вида {"seats": [{"location": 1, "row": 2, "column": 5}, ...], "hold": "..."}
+    (hold - необязательный идентификатор удержания) и возвращает созданные билеты либо список ошибок.
+
+    Args:
+        request (HttpRequest): Запрос сотрудника.
+        sale_id (int): Идентификатор продажи.
+
+    Returns:
+        JsonResponse: Билеты и итоговая сумма (201) либо ошибки (400).
+    """
+    sale = get_object_or_404(Sale, pk=sale_id)
+    try:
+        seats, hold_token = read_seats(request)
+    except ValueError as e:
+        return JsonResponse({'errors': [str(e)]}, status=400)
+    try:
+        tickets = checkout(sale, seats, hold_token)
+    except ValidationError as e:
+        return JsonResponse({'errors': e.messages}, status=400)
+    return JsonResponse({
+        'tickets': [
+            {'id': ticket.pk, 'location': ticket.location_id, 'row': ticket.row, 'column': ticket.column, 'cost': ticket.cost}
+            for ticket in tickets
+        ],
+        'total': sum(ticket.cost for ticket in tickets),
+    }, status=201)
+
+
+def seat_map_etag(request, sale_id, location_id=None):
+    """
+    ETag карты мест: идентификатор продажи, локация, версия карты мест мероприятия
+    и время окончания ближайшего действующего удержания.
+
+    Просроченное удержание освобождает место без изменения версии (версию увеличивает только
+    release_expired_holds), поэтому в ETag входит и ближайший expires_at: когда удержание
+    истекает, ближайшим становится следующее, и ETag меняется.
+
+    Args:
+        request (HttpRequest): Запрос.
+        sale_id (int): Идентификатор продажи.
+        location_id (Optional[int]): Идентификатор локации.
+
+    Returns:
+        Optional[str]: ETag либо None, если продажи (или карты мест) нет.
+    """
+    state = SeatInventory.objects.filter(event__sale=sale_id).annotate(
+        hold_expires=Min('seathold__expires_at', filter=Q(seathold__expires_at__gt=timezone.now()))
+    ).values_list('version', 'hold_expires').first()
+    if state is None:
+        return None
+    version, hold_expires = state
+    hold_expires = int(hold_expires.timestamp() * 1000000) if hold_expires else 0
+    return f'{sale_id}-{location_id or "all"}-{version}-{hold_expires}'
+
+
+@require_GET
+@staff_member_required
+@condition(etag_func=seat_map_etag)
+def sale_seats(request, sale_id, location_id=None):
+    """
+    Возвращает карту мест продажи (всех локаций либо одной).
+
+    Карта общая для всех продаж мероприятия, поэтому в ней видны места, проданные любой кассой.
+
+    Ряд передается битовой картой в base64: место n - бит (n - 1) % 8 байта (n - 1) // 8,
+    установленный бит означает свободное место (удерживаемые места свободными не считаются). Ответ помечается ETag (seat_map_etag),
+    поэтому повторный запрос с If-None-Match получает 304, пока не изменились места и удержания.
+
+    Args:
+        request (HttpRequest): Запрос сотрудника.
+        sale_id (int): Идентификатор продажи.
+        location_id (Optional[int]): Идентификатор локации.
+
+    Returns:
+        JsonResponse: Карта мест.
+    """
+    inventory = get_object_or_404(SeatInventory, event__sale=sale_id)
+    ticket_rows = TicketRow.objects.filter(inventory=inventory).select_related('location').order_by('location', 'row_number')
+    if location_id is not None:
+        ticket_rows = ticket_rows.filter(location=location_id)
+    held = dict()
+    for location, row, column in SeatHold.active().filter(inventory=inventory).values_list('location', 'row', 'column'):
+        held[location, row] = held.get((location, row), 0) | 1 << column - 1
+    locations = dict()
+    for ticket_row in ticket_rows:
+        location = locations.setdefault(ticket_row.location_id, {
+            'location': ticket_row.location_id,
+            'type': ticket_row.location.type,
+            'columns': ticket_row.location.amount,
+            'rows': [],
+        })
+        location['rows'].append({
+            'row': ticket_row.row_number,
+            'seats': base64.b64encode(ticket_row.free_seats(held.get((ticket_row.location_id, ticket_row.row_number), 0))).decode(),
+        })
+    return JsonResponse({
+        'sale': sale_id,
+        'event': inventory.event_id,
+        'version': inventory.version,
+        'locations': list(locations.values()),
+    })
+
+
+async def seat_event_stream(sale_id, inventory_id):
+    """
+    Поток событий об изменении мест в карте мест мероприятия продажи.
+
+    Сначала отправляется текущая версия карты мест (клиент сверяет ее со своей картой),
+    затем изменения мест. Если клиент не успевал читать сообщения, отправляется событие reset
+    и поток закрывается: клиент загружает карту мест заново и переподключается.
+
+    Args:
+        sale_id (int): Идентификатор продажи.
+        inventory_id (int): Идентификатор карты мест.
+
+    Yields:
+        str: Сообщения в формате text/event-stream.
+    """
+    subscription = seat_events.subscribe(inventory_id)
+    try:
+        version = await SeatInventory.objects.filter(pk=inventory_id).values_list('version', flat=True).afirst()
+        yield f'retry: {RECONNECT_DELAY}\n\n'
+        yield sse_message('version', {'sale': sale_id, 'version': version}, version)
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.get(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if message is None:
+                yield sse_message('reset', {'sale': sale_id})
+                return
+            yield message
+    finally:
+        seat_events.unsubscribe(subscription)
+
+
+@require_GET
+async def sale_seat_events(request, sale_id):
+    """
+    Передает кассам изменения мест продажи через server-sent events.
+
+    Вместо периодического опроса карты мест клиент открывает один поток (EventSource) и получает
+    события seats с занятыми и освобожденными местами. Представление асинхронное: под ASGI
+    подписчики ждут сообщений в цикле событий и не занимают по потоку каждый.
+
+    Args:
+        request (HttpRequest): Запрос сотрудника.
+        sale_id (int): Идентификатор продажи.
+
+    Returns:
+        StreamingHttpResponse: Поток событий.
+    """
+    user = await request.auser()
+    if not (user.is_active and user.is_staff):
+        return HttpResponseForbidden()
+    inventory_id = await SeatInventory.objects.filter(event__sale=sale_id).values_list('pk', flat=True).afirst()
+    if inventory_id is None:
+        raise Http404('Продажа не найдена')
+    response = StreamingHttpResponse(seat_event_stream(sale_id, inventory_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
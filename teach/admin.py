@@ -1,73 +1,89 @@
+from django import forms
 from django.contrib import admin
 from .models import StudioProxy, TeacherProxy, Day, StudioWorkReport, \
 TimeTableTeacher, Visitors, ReportToVisitStudio, ReportCenterState, \
 ReportStudentMapping, TableCellTeacher, CostAbonimentsCreateion, AbonimentSale, \
 AbonimentSaleReport, AbonimentReportMapping
 from session1.models import Studio
+from session1.related import RelatedModelAdmin, RelatedTabularInline
 
-class AbonimentSellMappingInline(admin.TabularInline):
+class AbonimentSellMappingInline(RelatedTabularInline):
     model = AbonimentReportMapping
     extra = 0
     readonly_fields = ['studio', 'aboniments_info', 'total_sum', 'report']
 
-class CostAbonimentsCreateionInline(admin.TabularInline):
+class CostAbonimentsCreateionInline(RelatedTabularInline):
     model = CostAbonimentsCreateion
     extra = 0
 
 @admin.register(CostAbonimentsCreateion)
-class CostAbonimentCreationAdmin(admin.ModelAdmin): 
+class CostAbonimentCreationAdmin(RelatedModelAdmin): 
     readonly_fields = ['month_type', 'year_type']
 
 @admin.register(AbonimentSale)
-class AbonimentSaleAdmin(admin.ModelAdmin): 
+class AbonimentSaleAdmin(RelatedModelAdmin): 
     readonly_fields = ['cost', 'report_studio', 'visitor']
 
 @admin.register(AbonimentSaleReport)
-class AbonimentSaleReportAdmin(admin.ModelAdmin): 
+class AbonimentSaleReportAdmin(RelatedModelAdmin): 
     inlines = [AbonimentSellMappingInline]
     readonly_fields = ['total_sum']
 
-class StudioMappingInline(admin.TabularInline):
+class StudioMappingInline(RelatedTabularInline):
     model = ReportStudentMapping
     extra = 0
     readonly_fields = ['studio', 'visitors']
 
 
-class ReportToVisitStudioInline(admin.TabularInline):
+class ReportToVisitStudioInline(RelatedTabularInline):
     model = ReportToVisitStudio
     extra = 0
     readonly_fields = ['date_created', 'working_report', 'visitor']
 
 
-class TableCellInline(admin.TabularInline):
+class TableCellInline(RelatedTabularInline):
     model = TableCellTeacher
     extra = 0
-    readonly_fields = ['days', 'timing', 'studio', 'timetable']
+    readonly_fields = ['days', 'timing', 'weekdays', 'date_start', 'date_end', 'time_start', 'time_end', 'studio', 'timetable']
+
+
+class StudioWorkReportForm(forms.ModelForm):
+    class Meta:
+        model = StudioWorkReport
+        fields = '__all__'
+
+    def clean(self):
+        # Рабочие дни сохраняются после модели, поэтому для проверки занятости
+        # преподавателя передаем в модель дни, выбранные в форме.
+        cleaned_data = super().clean()
+        self.instance.selected_work_days = cleaned_data.get('work_days')
+        return cleaned_data
 
 
 @admin.register(StudioWorkReport)
-class StudioWorkReportAdmin(admin.ModelAdmin): 
+class StudioWorkReportAdmin(RelatedModelAdmin): 
+    form = StudioWorkReportForm
     inlines = [ReportToVisitStudioInline, CostAbonimentsCreateionInline]
 
 @admin.register(TimeTableTeacher)
-class TimetableTeacherAdmin(admin.ModelAdmin): 
+class TimetableTeacherAdmin(RelatedModelAdmin): 
     inlines = [TableCellInline]
 
 @admin.register(Visitors)
-class VisitorsAdmin(admin.ModelAdmin): pass
+class VisitorsAdmin(RelatedModelAdmin): pass
 
 
 @admin.register(ReportToVisitStudio)
-class ReportToVisitStudioAdmin(admin.ModelAdmin): pass
+class ReportToVisitStudioAdmin(RelatedModelAdmin): pass
 
 
 @admin.register(ReportCenterState)
-class ReportCenterState(admin.ModelAdmin):
+class ReportCenterState(RelatedModelAdmin):
     inlines = [StudioMappingInline]
 
 
 @admin.register(StudioProxy)
-class StudioAdmin(admin.ModelAdmin): 
+class StudioAdmin(RelatedModelAdmin): 
     def get_queryset(self, request):
         return Studio.objects.all().exclude(name='Культурный центр')
 
@@ -0,0 +1,33 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from session1.models import Teacher
+from teach.models import TimeTableTeacher
+
+
+class Command(BaseCommand):
+    """
+    Команда для формирования расписаний преподавателей за период.
+
+    Создает расписания сразу для всех преподавателей (или только для переданных через --teacher)
+    и заполняет их строки по приказам о работе студий. Расписания за тот же период пересоздаются.
+    """
+    help = 'Формирует расписания преподавателей за период'
+
+    def add_arguments(self, parser):
+        parser.add_argument('date_start', type=date.fromisoformat, help='Дата начала периода (ГГГГ-ММ-ДД)')
+        parser.add_argument('date_end', type=date.fromisoformat, help='Дата окончания периода (ГГГГ-ММ-ДД)')
+        parser.add_argument(
+            '--teacher',
+            type=int,
+            action='append',
+            help='Идентификатор преподавателя; можно указать несколько раз'
+        )
+
+    def handle(self, *args, **options):
+        if options['date_end'] < options['date_start']:
+            raise CommandError('Дата окончания не может быть раньше даты начала')
+        teachers = None
+        if options['teacher']:
+            teachers = list(Teacher.objects.filter(pk__in=options['teacher']))
+        timetables = TimeTableTeacher.build_for_period(options['date_start'], options['date_end'], teachers)
+        self.stdout.write(self.style.SUCCESS(f'Сформировано расписаний: {len(timetables)}'))
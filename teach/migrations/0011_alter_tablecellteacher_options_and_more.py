@@ -0,0 +1,28 @@
+# Generated by Django 5.0.3 on 2026-10-18 14:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session1', '0010_fileupload_progress'),
+        ('teach', '0010_alter_abonimentsale_visitor'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='tablecellteacher',
+            options={'verbose_name': 'Строка отчета', 'verbose_name_plural': 'Строки отчета'},
+        ),
+        migrations.AlterField(
+            model_name='abonimentreportmapping',
+            name='aboniments_info',
+            field=models.TextField(null=True, verbose_name='Информация об абониментах'),
+        ),
+        migrations.AlterField(
+            model_name='abonimentsale',
+            name='aboniment_type',
+            field=models.CharField(choices=[('Разовый', 'Разовый'), ('Месячный', 'Месячный'), ('Годовой', 'Годовой')], max_length=200, verbose_name='Тип абонимента'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.3 on 2026-10-18 14:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('teach', '0011_alter_tablecellteacher_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studioworkreport',
+            index=models.Index(fields=['teacher', 'date_studio_work_start', 'date_studio_work_end'], name='teach_work_teacher_dates_idx'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+import re
+from datetime import date, time
+from django.db import migrations, models
+
+
+WEEKDAYS = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье']
+TIMING = re.compile(r'От (\S+) до (\S+) Во время (\S+) - (\S+)')
+
+
+def parse_schedule(apps, schema_editor):
+    TableCellTeacher = apps.get_model('teach', 'TableCellTeacher')
+    batch = []
+    for cell in TableCellTeacher.objects.only('id', 'days', 'timing').iterator():
+        cell.weekdays = 0
+        for name in cell.days.split():
+            if name in WEEKDAYS:
+                cell.weekdays |= 1 << WEEKDAYS.index(name)
+        match = TIMING.match(cell.timing)
+        if match:
+            try:
+                cell.date_start, cell.date_end = date.fromisoformat(match[1]), date.fromisoformat(match[2])
+                cell.time_start, cell.time_end = time.fromisoformat(match[3]), time.fromisoformat(match[4])
+            except ValueError:
+                pass
+        batch.append(cell)
+        if len(batch) >= 1000:
+            TableCellTeacher.objects.bulk_update(batch, ['weekdays', 'date_start', 'date_end', 'time_start', 'time_end'])
+            batch = []
+    TableCellTeacher.objects.bulk_update(batch, ['weekdays', 'date_start', 'date_end', 'time_start', 'time_end'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session1', '0010_fileupload_progress'),
+        ('teach', '0012_studioworkreport_teacher_dates_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tablecellteacher',
+            name='date_end',
+            field=models.DateField(blank=True, null=True, verbose_name='Дата окончания занятий'),
+        ),
+        migrations.AddField(
+            model_name='tablecellteacher',
+            name='date_start',
+            field=models.DateField(blank=True, null=True, verbose_name='Дата начала занятий'),
+        ),
+        migrations.AddField(
+            model_name='tablecellteacher',
+            name='time_end',
+            field=models.TimeField(blank=True, null=True, verbose_name='Время окончания занятий'),
+        ),
+        migrations.AddField(
+            model_name='tablecellteacher',
+            name='time_start',
+            field=models.TimeField(blank=True, null=True, verbose_name='Время начала занятий'),
+        ),
+        migrations.AddField(
+            model_name='tablecellteacher',
+            name='weekdays',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Маска рабочих дней'),
+        ),
+        migrations.AddIndex(
+            model_name='tablecellteacher',
+            index=models.Index(fields=['weekdays', 'time_start', 'time_end'], name='teach_cell_weekday_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tablecellteacher',
+            index=models.Index(fields=['date_start', 'date_end'], name='teach_cell_dates_idx'),
+        ),
+        migrations.RunPython(parse_schedule, migrations.RunPython.noop),
+    ]
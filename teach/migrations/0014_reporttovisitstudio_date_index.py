@@ -0,0 +1,17 @@
+# Generated by Django 5.0.3 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('teach', '0013_tablecellteacher_schedule'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reporttovisitstudio',
+            index=models.Index(fields=['date_created', 'working_report'], name='teach_visit_date_report_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.3 on 2026-10-18 14:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('teach', '0014_reporttovisitstudio_date_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='abonimentsale',
+            index=models.Index(fields=['date_sell', 'report_studio'], name='teach_sale_date_report_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.3 on 2026-10-18 14:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('teach', '0015_abonimentsale_date_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='costabonimentscreateion',
+            index=models.Index(fields=['report', 'date_created'], name='teach_cost_report_date_idx'),
+        ),
+    ]
@@ -1,9 +1,35 @@
-from django.db import models
-from session1.models import Studio, Teacher, ExhibitOwnerProxy
-from django.db.models.signals import post_save, m2m_changed
+from django.db import models, transaction
+from django.db.models import Count, Sum, Value
+from django.db.models.functions import Coalesce, Concat
+from session1.models import Studio, Teacher, ExhibitOwnerProxy, ProstrSutdioMapping
+from django.db.models.signals import post_save, pre_save, post_delete, m2m_changed
+from django.core.cache import cache
 from django.dispatch import receiver
 from django.core.exceptions import ValidationError
-from django.db.models import Q
+from datetime import date, time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from session1.intervals import IntervalTree
+from session1.occupancy import check_bookings, masks_with_weekday, studio_bookings, weekdays_mask
+
+
+PRICES_MISSING = object()
+PRICES_CACHE_TIMEOUT = 5 * 60
+
+
+class GroupConcat(models.Aggregate):
+    """
+    Агрегат, склеивающий строки группы через разделитель.
+
+    В SQLite это GROUP_CONCAT, в PostgreSQL - STRING_AGG. Порядок строк внутри группы не гарантируется.
+    """
+    function = 'GROUP_CONCAT'
+    output_field = models.TextField()
+
+    def __init__(self, expression, separator: str = '', **extra):
+        super().__init__(expression, models.Value(separator), **extra)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function='STRING_AGG', **extra_context)
 
 
 class StudioProxy(Studio):
@@ -86,28 +112,126 @@ class StudioWorkReport(models.Model):
     class Meta:
         verbose_name = 'Приказ о работе студий'
         verbose_name_plural = 'Приказы о работах студий'
-    
+        indexes = [
+            models.Index(fields=['teacher', 'date_studio_work_start', 'date_studio_work_end'], name='teach_work_teacher_dates_idx'),
+        ]
+
+    def day_names(self, work_days: Optional[Iterable[Day]] = None) -> Optional[Set[str]]:
+        """
+        Возвращает названия рабочих дней приказа.
+
+        Args:
+            work_days (Optional[Iterable[Day]]): Рабочие дни, еще не сохраненные в приказ (например, из формы).
+
+        Returns:
+            Optional[Set[str]]: Названия дней; None, если дни неизвестны (приказ еще не сохранен).
+        """
+        if work_days is not None:
+            return {day.name for day in work_days}
+        if self.pk is None:
+            return None
+        return {day.name for day in self.work_days.all()}
+
+    def conflicts(self, work_days: Optional[Iterable[Day]] = None) -> models.QuerySet:
+        """
+        Ищет приказы, в которых преподаватель занят одновременно с этим приказом.
+
+        Приказы конфликтуют, если пересекаются периоды работы (границы включаются),
+        пересекается время занятий (занятия встык не конфликтуют) и есть общий рабочий день.
+        Все условия проверяются одним запросом; если рабочие дни неизвестны, проверяются только
+        даты и время.
+
+        Args:
+            work_days (Optional[Iterable[Day]]): Рабочие дни, еще не сохраненные в приказ.
+
+        Returns:
+            QuerySet: Конфликтующие приказы.
+        """
+        reports = StudioWorkReport.objects.filter(
+            teacher_id=self.teacher_id,
+            date_studio_work_start__lte=self.date_studio_work_end,
+            date_studio_work_end__gte=self.date_studio_work_start,
+            time_start__lt=self.time_end,
+            time_end__gt=self.time_start
+        )
+        if self.pk is not None:
+            reports = reports.exclude(pk=self.pk)
+        days = self.day_names(work_days)
+        if days is not None:
+            reports = reports.filter(work_days__name__in=days).distinct()
+        return reports
+
     def clean(self):
         """
         Валидация информации о работе студии.
 
-        Проверяет, что время окончания не раньше времени начала и что преподаватель не занят в указанное время.
+        Проверяет, что время окончания не раньше времени начала, что преподаватель не занят в указанное время
+        и что пространства студии не заняты мероприятиями, выставками или другими студиями.
+        Рабочие дни, выбранные в форме, передаются через атрибут selected_work_days.
         """
         if self.time_end < self.time_start:
             raise ValidationError('Время начала не может быть больше Времени конца')
-        q1 = set(map(lambda x: x.id, StudioWorkReport.objects.filter(teacher=self.teacher).exclude(
-            Q(time_start__gte=self.time_end) | Q(time_end__lte=self.time_start) 
-        )))
-        q2 = set(map(lambda x: x.id, StudioWorkReport.objects.filter(teacher=self.teacher).exclude(
-            Q(date_studio_work_start__gte=self.date_studio_work_end) | Q(date_studio_work_end__lte=self.date_studio_work_start)
-        )))
-        q3 = q1 & q2
-        try:
-            q3.remove(self.id)
-        except: pass
-        if len(q3):
+        work_days = getattr(self, 'selected_work_days', None)
+        if self.conflicts(work_days).exists():
             raise ValidationError('Учитель занят в это время')
-    
+        check_bookings(studio_bookings(
+            self,
+            ProstrSutdioMapping.objects.filter(studio_id=self.studio_id, prostr__isnull=False).values_list('prostr_id', flat=True),
+            self.day_names(work_days),
+            self.studio.name if self.studio_id else ''
+        ))
+
+    @staticmethod
+    def find_conflicts(reports: List['StudioWorkReport'], work_days: Optional[Dict[int, Iterable[Day]]] = None) -> List[Tuple['StudioWorkReport', 'StudioWorkReport']]:
+        """
+        Проверяет на пересечения набор приказов (например, все приказы на семестр) целиком.
+
+        Приказы сверяются между собой и с уже сохраненными приказами тех же преподавателей.
+        Сохраненные приказы загружаются двумя запросами, дальше поиск идет в памяти по дереву отрезков
+        дат отдельно для каждого преподавателя.
+
+        Args:
+            reports (List[StudioWorkReport]): Проверяемые приказы, в том числе несохраненные.
+            work_days (Optional[Dict[int, Iterable[Day]]]): Рабочие дни несохраненных приказов
+                по индексу приказа в reports.
+
+        Returns:
+            List[Tuple[StudioWorkReport, StudioWorkReport]]: Пары конфликтующих приказов
+                (проверяемый приказ, приказ, с которым он пересекается).
+        """
+        work_days = work_days or dict()
+        if not reports:
+            return []
+        saved = StudioWorkReport.objects.filter(
+            teacher_id__in={report.teacher_id for report in reports},
+            date_studio_work_start__lte=max(report.date_studio_work_end for report in reports),
+            date_studio_work_end__gte=min(report.date_studio_work_start for report in reports)
+        ).exclude(pk__in=[report.pk for report in reports if report.pk is not None]).prefetch_related('work_days')
+
+        entries = [(report, report.day_names(work_days.get(index))) for index, report in enumerate(reports)]
+        entries += [(report, {day.name for day in report.work_days.all()}) for report in saved]
+        trees = dict()
+        for teacher_id in {report.teacher_id for report, _ in entries}:
+            trees[teacher_id] = IntervalTree(
+                (report.date_studio_work_start, report.date_studio_work_end, index)
+                for index, (report, _) in enumerate(entries) if report.teacher_id == teacher_id
+            )
+
+        found = []
+        for index, (report, days) in enumerate(entries[:len(reports)]):
+            for other in trees[report.teacher_id].overlap(report.date_studio_work_start, report.date_studio_work_end):
+                other_report, other_days = entries[other]
+                if other == index or (other < len(reports) and other < index):
+                    continue
+                if not (report.time_start < other_report.time_end and other_report.time_start < report.time_end):
+                    continue
+                if days is not None and other_days is not None and not days & other_days:
+                    continue
+                found.append((report, other_report))
+        return found
+
+    str_select_related = ('teacher',)
+
     def __str__(self):
         """
         Строковое представление приказа о работе студии.
@@ -133,7 +257,81 @@ class TimeTableTeacher(models.Model):
     class Meta:
         verbose_name = 'График работы преподавателя (Отчет)'
         verbose_name_plural = 'Графики работ преподавателей (Отчеты)'
+
+    @staticmethod
+    def build_cells(timetables: List['TimeTableTeacher']) -> List['TableCellTeacher']:
+        """
+        Создает строки для набора расписаний.
+
+        Приказы всех преподавателей за общий период загружаются одним запросом вместе со студиями,
+        рабочие дни - вторым, строки всех расписаний создаются одним bulk_create.
+
+        Args:
+            timetables (List[TimeTableTeacher]): Сохраненные расписания.
+
+        Returns:
+            List[TableCellTeacher]: Созданные строки.
+        """
+        if not timetables:
+            return []
+        reports = dict()
+        for studio_report in StudioWorkReport.objects.filter(
+            teacher_id__in={timetable.teacher_id for timetable in timetables},
+            date_studio_work_start__lte=max(timetable.date_end for timetable in timetables),
+            date_studio_work_end__gte=min(timetable.date_start for timetable in timetables)
+        ).select_related('studio').prefetch_related('work_days').order_by('pk'):
+            reports.setdefault(studio_report.teacher_id, []).append(studio_report)
+
+        cells = []
+        for timetable in timetables:
+            for studio_report in reports.get(timetable.teacher_id, []):
+                if studio_report.date_studio_work_start > timetable.date_end or studio_report.date_studio_work_end < timetable.date_start:
+                    continue
+                time_start = max(timetable.date_start, studio_report.date_studio_work_start)
+                time_end = min(timetable.date_end, studio_report.date_studio_work_end)
+                days = ''
+                for day in studio_report.work_days.all():
+                    days += f'{day.name} '
+                cells.append(TableCellTeacher(
+                    days=days,
+                    timing=f'От {time_start} до {time_end} Во время {studio_report.time_start} - {studio_report.time_end} ',
+                    weekdays=weekdays_mask(day.name for day in studio_report.work_days.all()),
+                    date_start=time_start,
+                    date_end=time_end,
+                    time_start=studio_report.time_start,
+                    time_end=studio_report.time_end,
+                    studio=studio_report.studio,
+                    timetable=timetable
+                ))
+        return TableCellTeacher.objects.bulk_create(cells)
+
+    @staticmethod
+    def build_for_period(date_start, date_end, teachers: Optional[Iterable[Teacher]] = None) -> List['TimeTableTeacher']:
+        """
+        Формирует расписания всех преподавателей за период одним проходом.
+
+        Расписания с тем же периодом у этих преподавателей пересоздаются.
+
+        Args:
+            date_start (date): Дата начала отчетного периода.
+            date_end (date): Дата окончания отчетного периода.
+            teachers (Optional[Iterable[Teacher]]): Преподаватели; по умолчанию - все.
+
+        Returns:
+            List[TimeTableTeacher]: Созданные расписания.
+        """
+        teacher_ids = [teacher.pk for teacher in teachers] if teachers is not None else list(Teacher.objects.values_list('pk', flat=True))
+        with transaction.atomic():
+            TimeTableTeacher.objects.filter(teacher_id__in=teacher_ids, date_start=date_start, date_end=date_end).delete()
+            timetables = TimeTableTeacher.objects.bulk_create([
+                TimeTableTeacher(date_start=date_start, date_end=date_end, teacher_id=teacher_id)
+                for teacher_id in teacher_ids
+            ])
+            TimeTableTeacher.build_cells(timetables)
+        return timetables
     
+    str_select_related = ('teacher',)
+
     def __str__(self):
         """
         Строковое представление расписания учителя.
@@ -147,17 +345,52 @@ class TableCellTeacher(models.Model):
     """
     Модель для хранения информации о строках расписания учителя.
 
+    Строки days и timing предназначены для отображения; для запросов используются
+    weekdays, date_start, date_end, time_start и time_end.
+
     Атрибуты:
         days (CharField): Рабочие дни недели.
         timing (CharField): Время занятий.
+        weekdays (PositiveSmallIntegerField): Битовая маска рабочих дней (понедельник - младший бит).
+        date_start (DateField): Дата начала занятий в периоде расписания.
+        date_end (DateField): Дата окончания занятий в периоде расписания.
+        time_start (TimeField): Время начала занятий.
+        time_end (TimeField): Время окончания занятий.
         studio (ForeignKey): Связь со студией.
         timetable (ForeignKey): Связь с расписанием.
     """
     days = models.CharField('Рабочие дни недели', max_length=200)
     timing = models.CharField("Время занятий", max_length=200)
+    weekdays = models.PositiveSmallIntegerField('Маска рабочих дней', default=0)
+    date_start = models.DateField('Дата начала занятий', null=True, blank=True)
+    date_end = models.DateField('Дата окончания занятий', null=True, blank=True)
+    time_start = models.TimeField('Время начала занятий', null=True, blank=True)
+    time_end = models.TimeField('Время окончания занятий', null=True, blank=True)
     studio = models.ForeignKey(Studio, on_delete=models.CASCADE, verbose_name='Студия')
     timetable = models.ForeignKey(TimeTableTeacher, verbose_name='Таблица', on_delete=models.CASCADE)
 
+    @staticmethod
+    def busy_at(weekday: int, at: time, on: Optional[date] = None) -> models.QuerySet:
+        """
+        Ищет строки расписания, по которым в указанный день недели и время идут занятия.
+
+        Args:
+            weekday (int): Номер дня недели (0 - понедельник).
+            at (time): Время.
+            on (Optional[date]): Дата; если указана, учитываются только строки, в период которых она входит.
+
+        Returns:
+            QuerySet: Строки расписания.
+        """
+        cells = TableCellTeacher.objects.filter(
+            weekdays__in=masks_with_weekday(weekday),
+            time_start__lte=at,
+            time_end__gt=at
+        )
+        if on is not None:
+            cells = cells.filter(date_start__lte=on, date_end__gte=on)
+        return cells
+
     def __str__(self):
         """
         Строковое представление строки расписания учителя.
@@ -169,6 +402,10 @@ class TableCellTeacher(models.Model):
     class Meta:
         verbose_name = 'Строка отчета'
         verbose_name_plural = 'Строки отчета'
+        indexes = [
+            models.Index(fields=['weekdays', 'time_start', 'time_end'], name='teach_cell_weekday_time_idx'),
+            models.Index(fields=['date_start', 'date_end'], name='teach_cell_dates_idx'),
+        ]
 
 
 class Visitors(models.Model):
@@ -209,7 +446,12 @@ class ReportToVisitStudio(models.Model):
     class Meta:
         verbose_name = 'Заявка на посещение студии'
         verbose_name_plural = 'Заявки на посещения студий'
+        indexes = [
+            models.Index(fields=['date_created', 'working_report'], name='teach_visit_date_report_idx'),
+        ]
     
+    str_select_related = ('visitor', 'working_report__studio')
+
     def __str__(self):
         """
         Строковое представление заявки.
@@ -291,7 +533,12 @@ class CostAbonimentsCreateion(models.Model):
     class Meta:
         verbose_name = 'Установка цены на абонемент'
         verbose_name_plural = 'Установка цен на абонемент'
+        indexes = [
+            models.Index(fields=['report', 'date_created'], name='teach_cost_report_date_idx'),
+        ]
     
+    str_select_related = ('report__teacher',)
+
     def __str__(self):
         """
         Строковое представление установки цен на абонементы.
@@ -300,6 +547,40 @@ class CostAbonimentsCreateion(models.Model):
         """
         return f'Установка цен на: {self.report}'
 
+    @staticmethod
+    def cache_key(report_id: int) -> str:
+        """
+        Ключ кэша текущих цен по приказу о работе студии.
+        """
+        return f'teach:aboniment-prices:{report_id}'
+
+    @staticmethod
+    def current_prices(report_id: int) -> Optional[Dict[str, Optional[int]]]:
+        """
+        Возвращает действующие цены на абонементы по приказу о работе студии.
+
+        Действуют цены из последней установки цен. Результат кэшируется до сохранения
+        или удаления установки цен по этому приказу.
+
+        Args:
+            report_id (int): Идентификатор приказа о работе студии.
+
+        Returns:
+            Optional[Dict[str, Optional[int]]]: Цены по типу абонемента ('Разовый', 'Месячный', 'Годовой')
+                или None, если цены не установлены.
+        """
+        key = CostAbonimentsCreateion.cache_key(report_id)
+        prices = cache.get(key, PRICES_MISSING)
+        if prices is PRICES_MISSING:
+            costs = CostAbonimentsCreateion.objects.filter(report_id=report_id).order_by('-date_created', '-id').values(
+                'one_type', 'month_type', 'year_type'
+            ).first()
+            prices = None
+            if costs is not None:
+                prices = {'Разовый': costs['one_type'], 'Месячный': costs['month_type'], 'Годовой': costs['year_type']}
+            cache.set(key, prices, PRICES_CACHE_TIMEOUT)
+        return prices
+
 
 class AbonimentSale(models.Model):
     """
@@ -331,7 +612,12 @@ class AbonimentSale(models.Model):
     class Meta:
         verbose_name = 'Продажа абониментов'
         verbose_name_plural = 'Продажи абониментов'
+        indexes = [
+            models.Index(fields=['date_sell', 'report_studio'], name='teach_sale_date_report_idx'),
+        ]
     
+    str_select_related = ('report_studio__teacher',)
+
     def __str__(self):
         """
         Строковое представление продажи абонемента.
@@ -388,6 +674,8 @@ class AbonimentReportMapping(models.Model):
         verbose_name = 'Информация о студии по абониментам'
         verbose_name_plural = 'Информации о студиях по абониментам'
     
+    str_select_related = ('studio',)
+
     def __str__(self):
         """
         Строковое представление сопоставления информации об абонементах.
@@ -425,18 +713,7 @@ def teacher_create(sender, instance, created, **kwargs):
         **kwargs: Дополнительные аргументы.
     """
     if created:
-        for studio_report in StudioWorkReport.objects.filter(teacher=instance.teacher, date_studio_work_start__lte=instance.date_end, date_studio_work_end__gte=instance.date_start):
-            time_start = max(instance.date_start, studio_report.date_studio_work_start)
-            time_end = min(instance.date_end, studio_report.date_studio_work_end)
-            days = ''
-            for day in studio_report.work_days.all():
-                days += f'{day.name} '
-            TableCellTeacher.objects.create(
-                days=days,
-                timing=f'От {time_start} до {time_end} Во время {studio_report.time_start} - {studio_report.time_end} ',
-                studio=studio_report.studio,
-                timetable=instance
-            )
+        TimeTableTeacher.build_cells([instance])
 
 
 @receiver(post_save, sender=ReportCenterState)
@@ -445,6 +722,7 @@ def report_create(sender, instance, created, **kwargs):
     Сигнал для создания сопоставлений студентов в отчете центра при его создании.
 
     Собирает информацию о посетителях, которые посетили студии в отчетном периоде, и создает соответствующие записи.
+    Имена посетителей склеиваются в базе одним запросом с группировкой по студии.
     
     Args:
         sender: Отправитель сигнала.
@@ -453,18 +731,15 @@ def report_create(sender, instance, created, **kwargs):
         **kwargs: Дополнительные аргументы.
     """
     if created:
-        studios = dict()
-        for visit_report in ReportToVisitStudio.objects.filter(date_created__gte=instance.date_start):
-            if not visit_report.working_report.studio.id in studios.keys():
-                studios.update({visit_report.working_report.studio.id: ''})
-            studios[visit_report.working_report.studio.id] += f'{visit_report.visitor} '
-        
-        for studio in studios.keys():
-            ReportStudentMapping.objects.create(
-                visitors=studios[studio],
-                studio=Studio.objects.get(id=studio),
-                report=instance
-            )
+        ReportStudentMapping.objects.bulk_create([
+            ReportStudentMapping(visitors=row['visitors'], studio_id=row['working_report__studio'], report=instance)
+            for row in ReportToVisitStudio.objects.filter(
+                date_created__gte=instance.date_start,
+                date_created__lte=instance.date_end
+            ).values('working_report__studio').annotate(
+                visitors=GroupConcat(Concat(Value('Посетитель центра '), 'visitor__visitor', Value(' ')))
+            ).order_by('working_report__studio')
+        ])
 
 
 @receiver(post_save, sender=CostAbonimentsCreateion)
@@ -493,69 +768,86 @@ def calculate_cost(sender, instance, created, **kwargs):
         instance.save()
 
 
-@receiver(post_save, sender=AbonimentSale)
-def aboniment_sale(sender, instance: AbonimentSale, created, **kwargs):
+@receiver(post_save, sender=CostAbonimentsCreateion)
+@receiver(post_delete, sender=CostAbonimentsCreateion)
+def reset_aboniment_prices(sender, instance: CostAbonimentsCreateion, **kwargs):
+    """
+    Сигнал для сброса кэша цен на абонементы при изменении установки цен.
+
+    Кэш сбрасывается сразу и еще раз после фиксации транзакции: до фиксации параллельный
+    запрос может снова положить в кэш старые цены.
+
+    Args:
+        sender: Отправитель сигнала.
+        instance (CostAbonimentsCreateion): Экземпляр установки цен.
+        **kwargs: Дополнительные аргументы.
+    """
+    key = CostAbonimentsCreateion.cache_key(instance.report_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+@receiver(pre_save, sender=AbonimentSale)
+def aboniment_sale(sender, instance: AbonimentSale, **kwargs):
     """
     Сигнал для установки стоимости абонемента при его продаже.
 
-    При создании новой продажи абонемента автоматически устанавливается его стоимость на основе типа абонемента.
+    При создании новой продажи абонемента стоимость устанавливается по типу абонемента до записи в базу,
+    поэтому продажа сохраняется одним INSERT. Цены берутся из кэша (CostAbonimentsCreateion.current_prices).
     
     Args:
         sender: Отправитель сигнала.
         instance (AbonimentSale): Экземпляр продажи абонемента.
-        created (bool): Флаг создания.
         **kwargs: Дополнительные аргументы.
     """
-    if created:
-        rep = instance.report_visitor.working_report
-        visitor = instance.report_visitor.visitor
-        instance.report_studio = rep
-        instance.visitor = visitor
-        costs = CostAbonimentsCreateion.objects.filter(report=instance.report_studio).order_by('-date_created').first()
-        if instance.aboniment_type == 'Разовый':
-            instance.cost = costs.one_type
-        elif instance.aboniment_type == 'Месячный':
-            instance.cost = costs.month_type
-        else:
-            instance.cost = costs.year_type
-        instance.save()
+    if not instance._state.adding:
+        return
+    if instance.report_visitor_id is not None:
+        instance.report_studio_id = instance.report_visitor.working_report_id
+        instance.visitor_id = instance.report_visitor.visitor_id
+    if instance.report_studio_id is None:
+        return
+    prices = CostAbonimentsCreateion.current_prices(instance.report_studio_id)
+    if prices is not None:
+        instance.cost = prices.get(instance.aboniment_type, prices['Годовой'])
 
 
 @receiver(m2m_changed, sender=AbonimentSaleReport.studios.through)
-def aboniment_sale_report(sender, instance: AbonimentSaleReport, **kwargs):
+def aboniment_sale_report(sender, instance: AbonimentSaleReport, action: str, **kwargs):
     """
     Сигнал для обновления отчета о продажах абонементов при изменении связанных студий.
 
     Собирает данные о продажах абонементов для выбранных студий и обновляет общий отчет.
+    Количество и сумма продаж считаются одним запросом с группировкой по студии и типу абонемента;
+    отчет пересчитывается только после изменения студий (post_add, post_remove, post_clear).
     
     Args:
         sender: Отправитель сигнала.
         instance (AbonimentSaleReport): Экземпляр отчета о продажах абонементов.
+        action (str): Тип изменения связи.
         **kwargs: Дополнительные аргументы.
     """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
     total = 0
-    stds = list(map(lambda x: x.id, instance.studios.all()))
+    stds = list(instance.studios.order_by('id').values_list('id', flat=True))
     report = dict()
     AbonimentReportMapping.objects.filter(report=instance).delete()
     for studio in stds:
         report.update({studio: [[0, 0, 0], [0, 0, 0]]})
-    for sale in AbonimentSale.objects.filter(
+    types = {'Разовый': 0, 'Месячный': 1, 'Годовой': 2}
+    for row in AbonimentSale.objects.filter(
         date_sell__gte=instance.date_started, 
         date_sell__lte=instance.date_end, 
         report_studio__studio__id__in=stds
-    ):
-        studio_id = sale.report_studio.studio.id
-        if studio_id not in report.keys():
-            report.update({studio_id: [[0,0,0], [0,0,0]]})
-        if sale.aboniment_type == 'Разовый':
-            report[studio_id][0][0] += 1
-            report[studio_id][1][0] += sale.cost
-        elif sale.aboniment_type == 'Месячный':
-            report[studio_id][0][1] += 1
-            report[studio_id][1][1] += sale.cost
-        else:
-            report[studio_id][0][2] += 1
-            report[studio_id][1][2] += sale.cost
+    ).values('report_studio__studio', 'aboniment_type').annotate(
+        amount=Count('id'),
+        total=Coalesce(Sum('cost'), 0)
+    ).order_by():
+        index = types.get(row['aboniment_type'], 2)
+        report[row['report_studio__studio']][0][index] += row['amount']
+        report[row['report_studio__studio']][1][index] += row['total']
+    mappings = []
     for cell in report.keys():
         info_str = f'''Разовые абонименты: {report[cell][0][0]} раз куплено на сумму {report[cell][1][0]} рублей
 Месячные абонементы: {report[cell][0][1]} раз куплено на сумму {report[cell][1][1]} рублей
@@ -563,11 +855,12 @@ def aboniment_sale_report(sender, instance: AbonimentSaleReport, **kwargs):
         '''
         local_total = report[cell][1][0] + report[cell][1][1] + report[cell][1][2]
         total += local_total
-        AbonimentReportMapping.objects.create(
-            studio=Studio.objects.get(id=cell),
+        mappings.append(AbonimentReportMapping(
+            studio_id=cell,
             aboniments_info=info_str,
             total_sum=local_total,
             report=instance
-        )
+        ))
+    AbonimentReportMapping.objects.bulk_create(mappings)
     instance.total_sum = total
-    instance.save()
\ No newline at end of file
+    instance.save(update_fields=['total_sum'])
\ No newline at end of file
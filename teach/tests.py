@@ -1,12 +1,19 @@
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
 from django.core.exceptions import ValidationError
 from .models import (
     Studio, Teacher, StudioWorkReport, Day, Visitors,
     ReportToVisitStudio, ReportCenterState, AbonimentSale,
-    CostAbonimentsCreateion
+    CostAbonimentsCreateion, TimeTableTeacher, TableCellTeacher, ReportStudentMapping,
+    AbonimentSaleReport, AbonimentReportMapping, StudioProxy, TeacherProxy
 )
+from django.contrib.auth.models import User
+from django.urls import reverse
 from django.utils import timezone
 from datetime import date, time
+from .admin import StudioWorkReportForm
 
 
 class StudioWorkReportModelTest(TestCase):
@@ -72,6 +79,267 @@ class StudioWorkReportModelTest(TestCase):
         self.assertIn('Учитель занят в это время', str(context.exception))
 
 
+class StudioWorkReportConflictTest(TestCase):
+    def setUp(self):
+        self.studio = Studio.objects.create(name='Студия Танцев')
+        self.teacher = Teacher.objects.create(full_name='Иванов Иван Иванович')
+        self.monday = Day.objects.create(name='Понедельник')
+        self.tuesday = Day.objects.create(name='Вторник')
+        self.existing = self.report(date(2024, 9, 1), date(2024, 12, 31), time(10, 0), time(12, 0), [self.monday])
+
+    def report(self, start, end, time_start, time_end, days=None, save=True, teacher=None):
+        report = StudioWorkReport(
+            date_created=timezone.now(),
+            studio=self.studio,
+            teacher=teacher or self.teacher,
+            date_studio_work_start=start,
+            date_studio_work_end=end,
+            time_start=time_start,
+            time_end=time_end
+        )
+        if save:
+            report.save()
+            report.work_days.set(days or [])
+        return report
+
+    def test_conflicts_single_query(self):
+        report = self.report(date(2024, 12, 31), date(2025, 5, 31), time(11, 0), time(13, 0), save=False)
+        with self.assertNumQueries(1):
+            self.assertEqual(list(report.conflicts([self.monday])), [self.existing])
+
+    def test_different_weekdays_do_not_conflict(self):
+        report = self.report(date(2024, 9, 1), date(2024, 12, 31), time(10, 0), time(12, 0), save=False)
+        self.assertFalse(report.conflicts([self.tuesday]).exists())
+        report.selected_work_days = [self.tuesday]
+        report.clean()
+
+    def test_adjacent_time_does_not_conflict(self):
+        report = self.report(date(2024, 9, 1), date(2024, 12, 31), time(12, 0), time(14, 0), save=False)
+        self.assertFalse(report.conflicts([self.monday]).exists())
+
+    def test_saved_report_uses_own_work_days(self):
+        report = self.report(date(2024, 10, 1), date(2024, 10, 31), time(9, 0), time(11, 0), [self.monday, self.tuesday])
+        with self.assertRaises(ValidationError):
+            report.clean()
+        report.work_days.set([self.tuesday])
+        report.clean()
+
+    def test_admin_form_passes_work_days(self):
+        form = StudioWorkReportForm(data={
+            'date_created_0': '2024-08-01',
+            'date_created_1': '10:00',
+            'studio': self.studio.pk,
+            'teacher': self.teacher.pk,
+            'work_days': [self.monday.pk],
+            'date_studio_work_start': '2024-10-01',
+            'date_studio_work_end': '2024-10-31',
+            'time_start': '11:00',
+            'time_end': '12:30'
+        })
+        self.assertFalse(form.is_valid())
+        self.assertIn('Учитель занят в это время', form.non_field_errors())
+
+    def test_find_conflicts(self):
+        other_teacher = Teacher.objects.create(full_name='Петров Петр Петрович')
+        reports = [
+            self.report(date(2024, 9, 1), date(2025, 5, 31), time(11, 0), time(13, 0), save=False),
+            self.report(date(2025, 1, 1), date(2025, 5, 31), time(12, 0), time(14, 0), save=False),
+            self.report(date(2024, 9, 1), date(2025, 5, 31), time(11, 0), time(13, 0), save=False, teacher=other_teacher),
+        ]
+        with self.assertNumQueries(2):
+            found = StudioWorkReport.find_conflicts(reports, {0: [self.monday], 1: [self.monday], 2: [self.monday]})
+        self.assertEqual(
+            {(first.time_start, second.time_start) for first, second in found},
+            {(time(11, 0), time(12, 0)), (time(11, 0), time(10, 0))}
+        )
+        self.assertEqual(StudioWorkReport.find_conflicts(reports, {0: [self.tuesday], 1: [self.monday], 2: [self.monday]}), [])
+
+
+class TimeTableBuildTest(TestCase):
+    def setUp(self):
+        self.studios = [Studio.objects.create(name=f'Студия {number}') for number in range(3)]
+        self.teachers = [Teacher.objects.create(full_name=f'Преподаватель {number}') for number in range(5)]
+        self.monday = Day.objects.create(name='Понедельник')
+        self.friday = Day.objects.create(name='Пятница')
+        for teacher in self.teachers:
+            for number, studio in enumerate(self.studios):
+                report = StudioWorkReport.objects.create(
+                    date_created=timezone.now(),
+                    studio=studio,
+                    teacher=teacher,
+                    date_studio_work_start=date(2024, 9, 1),
+                    date_studio_work_end=date(2024, 12, 31),
+                    time_start=time(10 + 2 * number, 0),
+                    time_end=time(11 + 2 * number, 0)
+                )
+                report.work_days.set([self.monday, self.friday])
+        StudioWorkReport.objects.create(
+            date_created=timezone.now(),
+            studio=self.studios[0],
+            teacher=self.teachers[0],
+            date_studio_work_start=date(2025, 1, 1),
+            date_studio_work_end=date(2025, 5, 31),
+            time_start=time(10, 0),
+            time_end=time(11, 0)
+        )
+
+    def test_signal_builds_cells(self):
+        with self.assertNumQueries(4):
+            timetable = TimeTableTeacher.objects.create(teacher=self.teachers[0], date_start=date(2024, 10, 1), date_end=date(2024, 10, 31))
+        cells = list(timetable.tablecellteacher_set.order_by('pk'))
+        self.assertEqual(len(cells), 3)
+        self.assertEqual(cells[0].days, 'Понедельник Пятница ')
+        self.assertEqual(cells[0].timing, 'От 2024-10-01 до 2024-10-31 Во время 10:00:00 - 11:00:00 ')
+
+    def test_build_for_period(self):
+        with self.assertNumQueries(8):
+            timetables = TimeTableTeacher.build_for_period(date(2024, 12, 1), date(2025, 1, 31))
+        self.assertEqual(len(timetables), 5)
+        self.assertEqual(TableCellTeacher.objects.count(), 16)
+        TimeTableTeacher.build_for_period(date(2024, 12, 1), date(2025, 1, 31), self.teachers[:1])
+        self.assertEqual(TimeTableTeacher.objects.count(), 5)
+        self.assertEqual(TableCellTeacher.objects.count(), 16)
+
+    def test_structured_schedule(self):
+        timetable = TimeTableTeacher.objects.create(teacher=self.teachers[0], date_start=date(2024, 12, 1), date_end=date(2025, 1, 31))
+        cell = timetable.tablecellteacher_set.order_by('pk').first()
+        self.assertEqual(cell.weekdays, 0b10001)
+        self.assertEqual((cell.date_start, cell.date_end), (date(2024, 12, 1), date(2024, 12, 31)))
+        self.assertEqual((cell.time_start, cell.time_end), (time(10, 0), time(11, 0)))
+
+    def test_busy_at(self):
+        TimeTableTeacher.build_for_period(date(2024, 9, 1), date(2024, 12, 31))
+        busy = TableCellTeacher.busy_at(4, time(12, 30))
+        self.assertEqual(set(busy.values_list('studio', flat=True)), {self.studios[1].pk})
+        self.assertEqual(busy.count(), 5)
+        self.assertFalse(TableCellTeacher.busy_at(3, time(12, 30)).exists())
+        self.assertFalse(TableCellTeacher.busy_at(4, time(13, 0)).exists())
+        self.assertFalse(TableCellTeacher.busy_at(0, time(10, 0), on=date(2025, 1, 6)).exists())
+        self.assertEqual(TableCellTeacher.busy_at(0, time(10, 0), on=date(2024, 12, 30)).count(), 5)
+
+    def test_build_timetables_command(self):
+        out = StringIO()
+        call_command('build_timetables', '2024-09-01', '2024-09-30', '--teacher', str(self.teachers[1].pk), stdout=out)
+        self.assertIn('Сформировано расписаний: 1', out.getvalue())
+        self.assertEqual(TableCellTeacher.objects.filter(timetable__teacher=self.teachers[1]).count(), 3)
+
+
+class ReportCenterStateTest(TestCase):
+    def setUp(self):
+        teacher = Teacher.objects.create(full_name='Иванов Иван Иванович')
+        self.studios = [Studio.objects.create(name=f'Студия {number}') for number in range(2)]
+        reports = [
+            StudioWorkReport.objects.create(
+                date_created=timezone.now(), studio=studio, teacher=teacher,
+                date_studio_work_start=date(2024, 1, 1), date_studio_work_end=date(2024, 12, 31),
+                time_start=time(10 + number, 0), time_end=time(11 + number, 0)
+            )
+            for number, studio in enumerate(self.studios)
+        ]
+        visitors = [Visitors.objects.create(visitor=name) for name in ('Анна', 'Борис', 'Вера')]
+        ReportToVisitStudio.objects.bulk_create([
+            ReportToVisitStudio(date_created=date(2024, 3, 1), working_report=reports[0], visitor=visitors[0]),
+            ReportToVisitStudio(date_created=date(2024, 3, 2), working_report=reports[0], visitor=visitors[1]),
+            ReportToVisitStudio(date_created=date(2024, 3, 3), working_report=reports[1], visitor=visitors[2]),
+            ReportToVisitStudio(date_created=date(2024, 5, 1), working_report=reports[1], visitor=visitors[0]),
+        ])
+
+    def test_report_create(self):
+        with self.assertNumQueries(3):
+            report = ReportCenterState.objects.create(date_start=date(2024, 3, 1), date_end=date(2024, 3, 31))
+        rows = {row.studio_id: row.visitors for row in ReportStudentMapping.objects.filter(report=report)}
+        self.assertEqual(set(rows), {studio.pk for studio in self.studios})
+        self.assertEqual(
+            sorted(rows[self.studios[0].pk].split('Посетитель центра ')),
+            ['', 'Анна ', 'Борис ']
+        )
+        self.assertEqual(rows[self.studios[1].pk], 'Посетитель центра Вера ')
+
+
+class AbonimentSaleReportTest(TestCase):
+    def setUp(self):
+        teacher = Teacher.objects.create(full_name='Иванов Иван Иванович')
+        self.studios = [Studio.objects.create(name=f'Студия {number}') for number in range(3)]
+        reports = [
+            StudioWorkReport.objects.create(
+                date_created=timezone.now(), studio=studio, teacher=teacher,
+                date_studio_work_start=date(2024, 1, 1), date_studio_work_end=date(2024, 12, 31),
+                time_start=time(10 + number, 0), time_end=time(11 + number, 0)
+            )
+            for number, studio in enumerate(self.studios)
+        ]
+        AbonimentSale.objects.bulk_create([
+            AbonimentSale(date_sell=date(2024, 3, 1), report_studio=reports[0], aboniment_type='Разовый', cost=500),
+            AbonimentSale(date_sell=date(2024, 3, 2), report_studio=reports[0], aboniment_type='Разовый', cost=500),
+            AbonimentSale(date_sell=date(2024, 3, 3), report_studio=reports[0], aboniment_type='Годовой', cost=30000),
+            AbonimentSale(date_sell=date(2024, 3, 4), report_studio=reports[1], aboniment_type='Месячный', cost=3700),
+            AbonimentSale(date_sell=date(2024, 6, 1), report_studio=reports[1], aboniment_type='Месячный', cost=3700),
+            AbonimentSale(date_sell=date(2024, 3, 5), report_studio=reports[2], aboniment_type='Разовый', cost=700),
+        ])
+        self.report = AbonimentSaleReport.objects.create(date_started=date(2024, 3, 1), date_end=date(2024, 3, 31))
+
+    def test_report_totals(self):
+        with self.assertNumQueries(7):
+            self.report.studios.add(self.studios[0], self.studios[1])
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.total_sum, 34700)
+        rows = {row.studio_id: row for row in AbonimentReportMapping.objects.filter(report=self.report)}
+        self.assertEqual(rows[self.studios[0].pk].total_sum, 31000)
+        self.assertIn('Разовые абонименты: 2 раз куплено на сумму 1000 рублей', rows[self.studios[0].pk].aboniments_info)
+        self.assertIn('Месячные абонементы: 1 раз куплено на сумму 3700 рублей', rows[self.studios[1].pk].aboniments_info)
+
+    def test_report_follows_studio_changes(self):
+        self.report.studios.add(*self.studios)
+        self.report.studios.remove(self.studios[0])
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.total_sum, 4400)
+        self.assertEqual(AbonimentReportMapping.objects.filter(report=self.report).count(), 2)
+        self.report.studios.clear()
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.total_sum, 0)
+        self.assertFalse(AbonimentReportMapping.objects.filter(report=self.report).exists())
+
+
+class AbonimentPriceTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        studio = Studio.objects.create(name='Студия Танцев')
+        self.work_report = StudioWorkReport.objects.create(
+            date_created=timezone.now(), studio=studio, teacher=Teacher.objects.create(full_name='Иванов Иван Иванович'),
+            date_studio_work_start=date(2024, 1, 1), date_studio_work_end=date(2024, 12, 31),
+            time_start=time(10, 0), time_end=time(11, 0)
+        )
+        self.visit = ReportToVisitStudio.objects.create(
+            date_created=date(2024, 3, 1), working_report=self.work_report, visitor=Visitors.objects.create(visitor='Анна')
+        )
+        CostAbonimentsCreateion.objects.create(report=self.work_report, one_type=500)
+
+    def sell(self, aboniment_type):
+        return AbonimentSale.objects.create(date_sell=date(2024, 3, 1), report_visitor=self.visit, aboniment_type=aboniment_type)
+
+    def test_sale_sets_cost_before_insert(self):
+        self.assertEqual(self.sell('Разовый').cost, 500)
+        with self.assertNumQueries(1):
+            sale = self.sell('Месячный')
+        sale.refresh_from_db()
+        self.assertEqual((sale.cost, sale.report_studio, sale.visitor), (3760, self.work_report, self.visit.visitor))
+
+    def test_new_prices_reset_cache(self):
+        self.assertEqual(self.sell('Разовый').cost, 500)
+        costs = CostAbonimentsCreateion.objects.create(report=self.work_report, one_type=700)
+        self.assertEqual(self.sell('Разовый').cost, 700)
+        costs.delete()
+        self.assertEqual(self.sell('Разовый').cost, 500)
+
+    def test_prices_cache_reset_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            CostAbonimentsCreateion.objects.create(report=self.work_report, one_type=700)
+            # Параллельный запрос до фиксации транзакции видит старые цены и кладет их в кэш.
+            cache.set(CostAbonimentsCreateion.cache_key(self.work_report.pk), {'Разовый': 500})
+        self.assertEqual(self.sell('Разовый').cost, 700)
+
+
 class CostAbonimentsCreateionModelTest(TestCase):
     def setUp(self):
         self.studio = Studio.objects.create(name="Студия Йоги")
@@ -173,3 +441,67 @@ class SignalTests(TestCase):
         self.assertEqual(sale.cost, cost_creation.year_type)
         self.assertEqual(sale.report_studio, report)
         self.assertEqual(sale.visitor, visitor)
+
+
+class AdminQueryBudgetTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='admin'))
+        self.day = Day.objects.create(name="Понедельник")
+        for number in range(3):
+            self.studio = Studio.objects.create(name=f"Студия {number}")
+            self.teacher = Teacher.objects.create(full_name=f"Преподаватель {number}")
+            self.report = StudioWorkReport.objects.create(
+                date_created=timezone.now(),
+                studio=self.studio,
+                teacher=self.teacher,
+                date_studio_work_start=date(2030, 1, 1),
+                date_studio_work_end=date(2030, 6, 1),
+                time_start=time(10, 0),
+                time_end=time(12, 0)
+            )
+            self.report.work_days.add(self.day)
+            self.prices = CostAbonimentsCreateion.objects.create(report=self.report, one_type=500)
+            for visitor_number in range(3):
+                self.visitor = Visitors.objects.create(visitor=f"Посетитель {number}-{visitor_number}")
+                self.visit = ReportToVisitStudio.objects.create(
+                    date_created=date(2030, 1, 1), working_report=self.report, visitor=self.visitor
+                )
+                self.sale = AbonimentSale.objects.create(
+                    date_sell=date(2030, 1, 1), report_visitor=self.visit, aboniment_type='Единоразовый'
+                )
+            self.timetable = TimeTableTeacher.objects.create(
+                date_start=date(2030, 1, 1), date_end=date(2030, 6, 1), teacher=self.teacher
+            )
+        self.center_report = ReportCenterState.objects.create(date_start=date(2030, 1, 1), date_end=date(2030, 6, 1))
+        self.sale_report = AbonimentSaleReport.objects.create(date_started=date(2030, 1, 1), date_end=date(2030, 6, 1))
+
+    def assertPageQueries(self, number, url):
+        with self.assertNumQueries(number):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_changelists(self):
+        for model, number in [
+            (CostAbonimentsCreateion, 5), (AbonimentSale, 5), (AbonimentSaleReport, 5), (StudioWorkReport, 5),
+            (TimeTableTeacher, 5), (Visitors, 5), (ReportToVisitStudio, 5), (ReportCenterState, 5),
+            (StudioProxy, 5), (TeacherProxy, 5), (Day, 5)
+        ]:
+            with self.subTest(model=model.__name__):
+                self.assertPageQueries(number, reverse(f'admin:teach_{model._meta.model_name}_changelist'))
+
+    def test_change_forms(self):
+        for model, pk, number in [
+            (CostAbonimentsCreateion, self.prices.pk, 7),
+            (AbonimentSale, self.sale.pk, 7),
+            (AbonimentSaleReport, self.sale_report.pk, 9),
+            (StudioWorkReport, self.report.pk, 12),
+            (TimeTableTeacher, self.timetable.pk, 8),
+            (Visitors, self.visitor.pk, 6),
+            (ReportToVisitStudio, self.visit.pk, 8),
+            (ReportCenterState, self.center_report.pk, 7),
+            (StudioProxy, self.studio.pk, 6),
+            (TeacherProxy, self.teacher.pk, 6),
+            (Day, self.day.pk, 6),
+        ]:
+            with self.subTest(model=model.__name__):
+                self.assertPageQueries(number, reverse(f'admin:teach_{model._meta.model_name}_change', args=[pk]))